@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2024-2026 Wind River Systems, Inc.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+''' This script updates the kubeadm, kube-proxy, calico and multus config to
+handle single or dual-stack.
+
+The selected components are reconfigured together, see dual_stack: their
+changes are applied concurrently and the script waits for the rollouts of
+the restarted DaemonSets and control-plane static pods.
+'''
+
+import argparse
+import functools
+import sys
+
+import netaddr
+
+import dual_stack
+
+
+def is_valid_ip(address):
+    try:
+        if netaddr.valid_ipv4(address):
+            return True
+        if netaddr.valid_ipv6(address):
+            return True
+    except netaddr.AddrFormatError:
+        pass
+    return False
+
+
+def is_valid_network(address):
+    """
+    This function checks if the provided string is a valid network address using netaddr.
+    """
+    try:
+        netaddr.IPNetwork(address)
+        return True
+    except (netaddr.AddrFormatError, TypeError, ValueError) as ex:
+        print(f"exception {str(ex)}")
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--kubeadm', action='store_true',
+                        help='Update the kubeadm networking and the control-plane')
+    parser.add_argument('--kubeproxy', action='store_true',
+                        help='Update the kube-proxy clusterCIDR')
+    parser.add_argument('--calico', action='store_true',
+                        help='Update the calico address assignment and autodetection')
+    parser.add_argument('--multus', action='store_true',
+                        help='Update the multus address assignment')
+    parser.add_argument('--protocol', type=str.lower, choices=['ipv4', 'ipv6'])
+    parser.add_argument('--state', type=str.lower, choices=['true', 'false'],
+                        help='Whether protocol is enabled')
+    parser.add_argument('--c0_address',
+                        help='controller-0 cluster-host address, for calico autodetection')
+    parser.add_argument('--pod_prim_subnet')
+    parser.add_argument('--pod_sec_subnet')
+    parser.add_argument('--svc_prim_subnet')
+    parser.add_argument('--svc_sec_subnet')
+    parser.add_argument('--advertise_address',
+                        help='kube-apiserver advertise address')
+    parser.add_argument('--timeout', type=int, default=dual_stack.ROLLOUT_MAX_TIMEOUT,
+                        help='Seconds to wait at most for the rollouts')
+    args = parser.parse_args()
+
+    if (args.kubeadm or args.kubeproxy) and not is_valid_network(args.pod_prim_subnet):
+        parser.error(f"invalid pod_prim_subnet '{args.pod_prim_subnet}'")
+    if args.kubeadm and not is_valid_network(args.svc_prim_subnet):
+        parser.error(f"invalid svc_prim_subnet '{args.svc_prim_subnet}'")
+    if args.kubeadm and not is_valid_ip(args.advertise_address):
+        parser.error(f"invalid advertise_address '{args.advertise_address}'")
+    if (args.calico or args.multus) and not (args.protocol and args.state):
+        parser.error("--protocol and --state are required")
+    if not is_valid_ip(args.c0_address):
+        if args.calico and args.state == "true":
+            parser.error(f"invalid c0_address '{args.c0_address}'")
+        args.c0_address = None
+
+    # 'undef' or empty when the secondary subnet is not configured
+    pod_sec_subnet = args.pod_sec_subnet if is_valid_network(args.pod_sec_subnet) else None
+    svc_sec_subnet = args.svc_sec_subnet if is_valid_network(args.svc_sec_subnet) else None
+
+    planners = dict()
+    if args.kubeadm:
+        planners['kubeadm'] = functools.partial(
+            dual_stack.plan_kubeadm, args.pod_prim_subnet, args.svc_prim_subnet,
+            pod_sec_subnet, svc_sec_subnet)
+    if args.kubeproxy:
+        planners['kubeproxy'] = functools.partial(
+            dual_stack.plan_kubeproxy, args.pod_prim_subnet, pod_sec_subnet)
+    if args.calico:
+        planners['calico'] = functools.partial(
+            dual_stack.plan_calico, args.protocol, args.state, args.c0_address)
+    if args.multus:
+        planners['multus'] = functools.partial(
+            dual_stack.plan_multus, args.protocol, args.state)
+    if not planners:
+        parser.error('no component selected')
+
+    print(f"dual-stack-reconfig {' '.join(planners)} {args.protocol} {args.state}"
+          f" pod={args.pod_prim_subnet},{pod_sec_subnet}"
+          f" svc={args.svc_prim_subnet},{svc_sec_subnet}")
+
+    try:
+        if not dual_stack.reconfigure(
+                planners,
+                advertise_address=args.advertise_address if args.kubeadm else None,
+                timeout=args.timeout):
+            return 1
+    except dual_stack.DualStackError as ex:
+        print(f"Error: {ex}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,515 @@
+#
+# Copyright (c) 2024-2026 Wind River Systems, Inc.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+''' Single or dual-stack reconfiguration of the kubernetes networking.
+
+Adding or removing the secondary address family changes the kubeadm
+networking (and so the kube-apiserver and kube-controller-manager static
+pods), the kube-proxy configmap, the calico configmap and calico-node
+environment, and the multus configmap. The changes are planned together:
+the objects are read and the patches computed concurrently, the patches
+of the different components are sent concurrently, and the control-plane
+manifests, which restart the kube-apiserver, are rewritten last.
+Instead of fixed sleeps, the rollouts of the patched DaemonSets and of
+the restarted static pods are watched concurrently, so the
+reconfiguration takes as long as the slowest rollout. A DaemonSet that
+is not rolled out in time is only reported, its controller goes on
+replacing the pods; a static pod that does not restart is a failure.
+'''
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import copy
+from datetime import datetime
+import itertools
+import json
+import math
+import os
+import re
+import subprocess
+import time
+
+import k8s_patch
+import k8s_yaml
+
+NAMESPACE = "kube-system"
+kubectl_config = "--kubeconfig=/etc/kubernetes/admin.conf"
+active_controller_puppet_path = '/opt/platform/puppet/'
+cluster_config_file = "/tmp/kubeadm-config-cluster.yaml"
+manifests_dir = "/etc/kubernetes/manifests"
+
+KUBE_APISERVER_INTERNAL_PORT = 16443
+INITCONFIG_BASE_TEMPLATE = '''---
+apiVersion: kubeadm.k8s.io/v1beta4
+kind: InitConfiguration
+localAPIEndpoint:
+  advertiseAddress: {}
+  bindPort: %s'''
+
+INITCONFIG_TEMPLATE = INITCONFIG_BASE_TEMPLATE % str(KUBE_APISERVER_INTERNAL_PORT)
+
+# Seconds to wait for a rollout. DaemonSets replace their pods one node at
+# a time, they get ROLLOUT_NODE_TIMEOUT more seconds per node. All the
+# rollouts are bounded by the --timeout of dual-stack-reconfig.py.
+ROLLOUT_TIMEOUT = 180
+ROLLOUT_NODE_TIMEOUT = 45
+ROLLOUT_MAX_TIMEOUT = 600
+ROLLOUT_POLL_INTERVAL = 2
+CRICTL_TIMEOUT = 10
+
+# Bare placeholders of the CNI configuration templates, e.g.
+# '"mtu": __CNI_MTU__', substituted by the calico install-cni container.
+CNI_PLACEHOLDER_RE = re.compile(r'(?<![\w"])(__[A-Z0-9_]+__)(?![\w"])')
+CNI_PLACEHOLDER_MARK = "__bare__"
+
+# A patch of a kube-system object, see k8s_patch.patch_object.
+Patch = namedtuple('Patch', ['kind', 'name', 'patch'])
+
+
+class DualStackError(Exception):
+    pass
+
+
+def prepend_timestamp_line(file_name):
+    timestamp_str = datetime.now().strftime(format="%Y-%m-%d %H:%M:%S")
+    with open(file_name, 'r') as read_file:
+        lines = read_file.readlines()
+    lines.insert(0, f"# generated at {timestamp_str}" + "\n")  # Add newline character
+    with open(file_name, 'w') as write_file:
+        write_file.writelines(lines)
+
+
+def get_object(kind, name):
+    """Returns a kube-system object, see k8s_patch.get_object.
+    Raise:
+     - DualStackError, the object could not be fetched.
+    """
+    try:
+        return k8s_patch.get_object(kind, name, NAMESPACE)
+    except k8s_patch.K8sFetchError as ex:
+        raise DualStackError(str(ex))
+
+
+def subnets(primary, secondary):
+    """Returns the comma separated subnets of the enabled address families."""
+    return f"{primary},{secondary}" if secondary else primary
+
+
+def _patches(*patches):
+    """Auxiliary function to drop the empty patches of a plan."""
+    return [patch for patch in patches if patch.patch]
+
+
+def plan_kubeadm(pod_prim_subnet, svc_prim_subnet, pod_sec_subnet, svc_sec_subnet):
+    """Plans the kubeadm networking change. The cluster configuration is
+    written to cluster_config_file for update_control_plane, the
+    kubeadm-config configmap is only patched on the active controller.
+    Return the patches.
+    """
+    yaml_data = get_object("configmap", "kubeadm-config")
+    cluster_cfg = k8s_yaml.get_configmap_document(yaml_data, "ClusterConfiguration")
+    networking = cluster_cfg["networking"]
+    pod_subnet = subnets(pod_prim_subnet, pod_sec_subnet)
+    svc_subnet = subnets(svc_prim_subnet, svc_sec_subnet)
+    configmap_reconfig = (networking["podSubnet"] != pod_subnet or
+                          networking["serviceSubnet"] != svc_subnet)
+    networking["podSubnet"] = pod_subnet
+    networking["serviceSubnet"] = svc_subnet
+
+    cluster_config_str = k8s_yaml.dump(cluster_cfg)
+    with open(cluster_config_file, 'w') as config_file:
+        config_file.write(cluster_config_str)
+
+    if not configmap_reconfig:
+        print("configmap kubeadm-config already updated")
+        return []
+    if not os.path.exists(active_controller_puppet_path):
+        return []
+    return _patches(Patch("configmap", "kubeadm-config", k8s_patch.configmap_data_patch(
+        yaml_data, {"ClusterConfiguration": cluster_config_str})))
+
+
+def plan_kubeproxy(pod_prim_subnet, pod_sec_subnet):
+    """Plans the kube-proxy clusterCIDR change, kube-proxy is only
+    restarted if its configuration changed.
+    Return the patches.
+    """
+    yaml_data = get_object("configmap", "kube-proxy")
+    proxy_cfg = k8s_yaml.get_configmap_document(yaml_data, "config.conf")
+    cluster_cidr = subnets(pod_prim_subnet, pod_sec_subnet)
+    if proxy_cfg.get("clusterCIDR") == cluster_cidr:
+        print("configmap kube-proxy already updated")
+        return []
+    proxy_cfg["clusterCIDR"] = cluster_cidr
+    return _patches(
+        Patch("configmap", "kube-proxy", k8s_patch.configmap_data_patch(
+            yaml_data, {"config.conf": k8s_yaml.dump(proxy_cfg)})),
+        Patch("daemonset", "kube-proxy", k8s_patch.restart_patch()))
+
+
+def load_cni_config(text):
+    """Parse a CNI network configuration (template). The bare placeholders
+    are turned into marked strings so that it parses as JSON, dump_cni_config
+    restores them.
+    Raise:
+     - ValueError, text is not a JSON CNI configuration.
+    """
+    return json.loads(CNI_PLACEHOLDER_RE.sub(rf'"{CNI_PLACEHOLDER_MARK}\1"', text))
+
+
+def dump_cni_config(cni_config):
+    """Serialize a CNI network configuration loaded with load_cni_config."""
+    return re.sub(rf'"{CNI_PLACEHOLDER_MARK}(__[A-Z0-9_]+__)"', r'\1',
+                  json.dumps(cni_config, indent=2))
+
+
+def set_cni_assign_ip(cni_config, protocol, state):
+    """Sets assign_ipv4/assign_ipv6 of protocol to state in the calico-ipam
+    sections of a CNI network configuration, wherever they are nested
+    (calico plugin, multus delegates).
+    Return True if a value changed.
+    """
+    changed = False
+    if isinstance(cni_config, dict):
+        if (cni_config.get("type") == "calico-ipam" and
+                cni_config.get(f"assign_{protocol}") != state):
+            cni_config[f"assign_{protocol}"] = state
+            changed = True
+        nested = cni_config.values()
+    elif isinstance(cni_config, list):
+        nested = cni_config
+    else:
+        return False
+    for value in nested:
+        if set_cni_assign_ip(value, protocol, state):
+            changed = True
+    return changed
+
+
+def assign_ip_data(configmap, protocol, state, keys=None):
+    """Returns the configmap data values (those of keys, if set) whose
+    calico-ipam assign_ipv4/assign_ipv6 setting of protocol changes when
+    set to state. The values are edited as JSON CNI configurations, the
+    ones that are not are left alone.
+    """
+    modified_data = dict()
+    for key, value in (configmap.get("data") or dict()).items():
+        if keys is not None and key not in keys:
+            continue
+        try:
+            cni_config = load_cni_config(value)
+        except ValueError:
+            if keys is not None:
+                print(f"{key} is not a JSON CNI configuration, not updated")
+            continue
+        if set_cni_assign_ip(cni_config, protocol, state):
+            modified_data[key] = dump_cni_config(cni_config)
+    return modified_data
+
+
+def set_calico_node_env(daemonset, protocol, state, c0_address):
+    """Sets the address autodetection of protocol in the calico-node
+    containers environment."""
+    for container in daemonset['spec']['template']['spec']['containers']:
+        ipv4_autodetect = False
+        ipv6_autodetect = False
+        for env in container['env']:
+            if protocol == "ipv4":
+                if env["name"] == "IP":
+                    env["value"] = "autodetect" if state == "true" else "none"
+                if env["name"] == "IP_AUTODETECTION_METHOD":
+                    ipv4_autodetect = True
+            if protocol == "ipv6":
+                if env["name"] == "IP6":
+                    env["value"] = "autodetect" if state == "true" else "none"
+                if env["name"] == "IP6_AUTODETECTION_METHOD":
+                    ipv6_autodetect = True
+        if not ipv4_autodetect and protocol == "ipv4" and state == "true":
+            container['env'].append({"name": "IP_AUTODETECTION_METHOD",
+                                     "value": f"can-reach={c0_address}"})
+        if not ipv6_autodetect and protocol == "ipv6" and state == "true":
+            container['env'].append({"name": "IP6_AUTODETECTION_METHOD",
+                                     "value": f"can-reach={c0_address}"})
+        if ipv4_autodetect and protocol == "ipv4" and state == "false":
+            container['env'] = [env for env in container['env']
+                                if not env["name"] == "IP_AUTODETECTION_METHOD"]
+        if ipv6_autodetect and protocol == "ipv6" and state == "false":
+            container['env'] = [env for env in container['env']
+                                if not env["name"] == "IP6_AUTODETECTION_METHOD"]
+
+
+def plan_calico(protocol, state, c0_address):
+    """Plans the calico CNI configuration and calico-node environment
+    changes. cni_network_config is only rewritten if its assign_ipv4/
+    assign_ipv6 setting changes and only the changed variables are
+    patched, so the calico-node pods are not restarted if calico already
+    has the wanted configuration.
+    Return the patches.
+    """
+    calico_config_map = get_object("configmap", "calico-config")
+    configmap_patch = k8s_patch.configmap_data_patch(
+        calico_config_map,
+        assign_ip_data(calico_config_map, protocol, state, keys=("cni_network_config",)))
+    if not configmap_patch:
+        print("configmap calico-config already updated")
+
+    calico_ds_current = get_object("daemonset", "calico-node")
+    calico_ds_data = copy.deepcopy(calico_ds_current)
+    set_calico_node_env(calico_ds_data, protocol, state, c0_address)
+    daemonset_patch = k8s_patch.pod_template_env_patch(calico_ds_current, calico_ds_data)
+    if not daemonset_patch:
+        print("daemonset calico-node already updated")
+
+    return _patches(Patch("configmap", "calico-config", configmap_patch),
+                    Patch("daemonset", "calico-node", daemonset_patch))
+
+
+def is_thick_plugin_mode():
+    """Detect if Multus is running in thick plugin mode.
+
+    Thick mode uses the multus-daemon-config ConfigMap and does not
+    require multus-cni-config.v1 for delegate configuration.
+    """
+    try:
+        k8s_patch.get_object("configmap", "multus-daemon-config", NAMESPACE)
+    except k8s_patch.K8sFetchError as ex:
+        if not ex.not_found:
+            raise DualStackError(str(ex))
+        return False
+    return True
+
+
+def plan_multus(protocol, state):
+    """Plans the multus CNI configuration change, multus is only restarted
+    if its configuration changed.
+
+    In thick plugin mode, Calico manages assign_ipv4/assign_ipv6 in its own
+    10-calico.conflist which the Multus daemon auto-discovers. The old
+    multus-cni-config.v1 ConfigMap is not used and nothing is changed.
+    Return the patches.
+    """
+    if is_thick_plugin_mode():
+        print("Multus thick plugin mode detected. Dual-stack configuration "
+              "is managed by Calico directly. No Multus ConfigMap update "
+              "needed.")
+        return []
+
+    multus_config_map = get_object("configmap", "multus-cni-config.v1")
+    configmap_patch = k8s_patch.configmap_data_patch(
+        multus_config_map, assign_ip_data(multus_config_map, protocol, state))
+    if not configmap_patch:
+        print("configmap multus-cni-config.v1 already updated")
+        return []
+    return _patches(Patch("configmap", "multus-cni-config.v1", configmap_patch),
+                    Patch("daemonset", "kube-multus-ds-amd64", k8s_patch.restart_patch()))
+
+
+def apply_patches(patches):
+    """Sends the patches of a component, in order.
+    Return the rollouts of the patched DaemonSets.
+    Raise:
+     - DualStackError, a patch failed.
+    """
+    rollouts = list()
+    for patch in patches:
+        try:
+            if k8s_patch.patch_object(patch.kind, patch.name, NAMESPACE, patch.patch):
+                if patch.kind == "daemonset":
+                    rollouts.append(DaemonSetRollout(patch.name))
+        except k8s_patch.K8sPatchError as ex:
+            raise DualStackError(str(ex))
+    return rollouts
+
+
+def _read_file(file_path):
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def get_static_pod_container_id(component):
+    """The function gets the running CRI container of a static pod.
+    Return:
+     - container ID, the static pod container is running.
+     - '', no running container was found or the CRI could not be queried.
+    """
+    cmd = ["crictl", "ps", "--quiet", "--state", "Running", "--name", f"^{component}$"]
+    try:
+        output = subprocess.check_output(cmd, stderr=subprocess.DEVNULL,
+                                         timeout=CRICTL_TIMEOUT, universal_newlines=True)
+    except Exception:
+        return ''
+    container_ids = output.split()
+    return container_ids[0] if container_ids else ''
+
+
+class DaemonSetRollout(object):
+    """Watches the rollout of a patched DaemonSet."""
+
+    # The patch is applied even if the rollout does not complete in time
+    required = False
+
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return f"daemonset/{self.name}"
+
+    def nodes(self):
+        """Returns the number of nodes running the DaemonSet, 0 if it could
+        not be read."""
+        try:
+            daemonset = get_object("daemonset", self.name)
+        except DualStackError:
+            return 0
+        return daemonset.get("status", {}).get("desiredNumberScheduled") or 0
+
+    def wait(self, deadline):
+        """Wait until all the pods run the patched template, as reported by
+        'kubectl rollout status'. The status is queried again if it could
+        not be watched, e.g. while the kube-apiserver restarts. The rollout
+        gets ROLLOUT_TIMEOUT seconds plus ROLLOUT_NODE_TIMEOUT per node.
+        Return:
+         - True, the rollout completed before the deadline (monotonic time).
+         - False, the rollout did not complete.
+        """
+        timeout = ROLLOUT_TIMEOUT + ROLLOUT_NODE_TIMEOUT * self.nodes()
+        deadline = min(deadline, time.monotonic() + timeout)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            cmd = ["kubectl", kubectl_config, "-n", NAMESPACE, "rollout", "status",
+                   str(self), f"--timeout={math.ceil(remaining)}s"]
+            res = subprocess.run(cmd, check=False, capture_output=True)
+            if res.returncode == 0:
+                return True
+            print(f"{self} rollout status: {res.stderr.decode().strip()}")
+            time.sleep(max(0, min(ROLLOUT_POLL_INTERVAL, deadline - time.monotonic())))
+
+
+class StaticPodRollout(object):
+    """Watches the restart of a control-plane static pod by the kubelet
+    after its manifest is rewritten. The manifest content and the running
+    container are recorded when the object is created, that is, before the
+    manifest is rewritten.
+    """
+
+    required = True
+
+    def __init__(self, component):
+        self.component = component
+        self.manifest = os.path.join(manifests_dir, f"{component}.yaml")
+        self.manifest_content = _read_file(self.manifest)
+        self.container_id = get_static_pod_container_id(component)
+
+    def __str__(self):
+        return f"static pod {self.component}"
+
+    def changed(self):
+        return _read_file(self.manifest) != self.manifest_content
+
+    def _ready(self):
+        if self.component != "kube-apiserver":
+            return True
+        cmd = ["kubectl", kubectl_config, "get", "--raw=/readyz"]
+        return subprocess.run(cmd, check=False, capture_output=True).returncode == 0
+
+    def wait(self, deadline):
+        """Wait until a new container replaced the one recorded (and, for
+        the kube-apiserver, until it is ready), at most ROLLOUT_TIMEOUT
+        seconds.
+        Return:
+         - True, the restart completed before the deadline (monotonic time).
+         - False, the restart could not be confirmed.
+        """
+        deadline = min(deadline, time.monotonic() + ROLLOUT_TIMEOUT)
+        while True:
+            container_id = get_static_pod_container_id(self.component)
+            if container_id and container_id != self.container_id and self._ready():
+                return True
+            if time.monotonic() + ROLLOUT_POLL_INTERVAL > deadline:
+                return False
+            time.sleep(ROLLOUT_POLL_INTERVAL)
+
+
+def _kubeadm_phase(component):
+    print(f"execute: kubeadm init phase control-plane {component} --config"
+          f" {cluster_config_file}")
+    result = subprocess.run(["kubeadm", "init", "phase", "control-plane", component,
+                             "--config", cluster_config_file],
+                            check=False, stdout=subprocess.PIPE)
+    print(result)
+    if result.returncode != 0:
+        raise DualStackError(f"kubeadm init phase control-plane {component} failed")
+
+
+def update_control_plane(advertise_address):
+    """Regenerates the kube-controller-manager and kube-apiserver manifests
+    from the cluster configuration written by plan_kubeadm.
+    Return the rollouts of the static pods whose manifest changed.
+    Raise:
+     - DualStackError, a kubeadm phase failed.
+    """
+    rollouts = [StaticPodRollout("kube-controller-manager"),
+                StaticPodRollout("kube-apiserver")]
+
+    _kubeadm_phase("controller-manager")
+
+    with open(cluster_config_file, 'a') as file:
+        file.write(INITCONFIG_TEMPLATE.format(advertise_address))
+    prepend_timestamp_line(cluster_config_file)
+    _kubeadm_phase("apiserver")
+
+    return [rollout for rollout in rollouts if rollout.changed()]
+
+
+def wait_rollouts(rollouts, timeout=ROLLOUT_MAX_TIMEOUT):
+    """Watches the rollouts concurrently, for at most timeout seconds.
+    The rollouts that are not required, see DaemonSetRollout, only get a
+    warning if they did not complete.
+    Return:
+     - True, all the required rollouts completed.
+     - False, a required rollout did not complete.
+    """
+    if not rollouts:
+        return True
+    deadline = time.monotonic() + timeout
+    print("wait for the rollouts: " + ", ".join(str(rollout) for rollout in rollouts))
+    with ThreadPoolExecutor(max_workers=len(rollouts)) as executor:
+        results = list(executor.map(lambda rollout: rollout.wait(deadline), rollouts))
+    rc = True
+    for rollout, completed in zip(rollouts, results):
+        if completed:
+            print(f"{rollout} rolled out")
+        elif rollout.required:
+            print(f"Error: {rollout} did not roll out")
+            rc = False
+        else:
+            print(f"Warning: {rollout} did not roll out yet, it goes on in the background")
+    return rc
+
+
+def reconfigure(planners, advertise_address=None, timeout=ROLLOUT_MAX_TIMEOUT):
+    """Applies the dual-stack changes of several components together.
+
+    planners maps each component to the function returning its patches,
+    the components are planned and patched concurrently. If
+    advertise_address is set, the control-plane manifests are then
+    regenerated from the kubeadm configuration (see plan_kubeadm).
+    Return:
+     - True, all the required rollouts completed, see wait_rollouts.
+     - False, a required rollout did not complete within timeout seconds.
+    Raise:
+     - DualStackError, a fetch, a patch or a kubeadm phase failed.
+    """
+    with ThreadPoolExecutor(max_workers=len(planners)) as executor:
+        plans = list(executor.map(lambda planner: planner(), planners.values()))
+        rollouts = list(itertools.chain.from_iterable(executor.map(apply_patches, plans)))
+    if advertise_address:
+        rollouts += update_control_plane(advertise_address)
+    return wait_rollouts(rollouts, timeout)
@@ -6,18 +6,33 @@
 #
 
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import json
 import os
+import select
+import socket
 import subprocess
 import sys
 import time
 import yaml
 
+import k8s_yaml
+
+SRIOV_CONFIG_KEY = "platform::network::interfaces::sriov::sriov_config"
 DRIVER_NONE = "NONE"
 DRIVER_VFIO = "vfio-pci"
 SRIOV_NUMVFS_FILE = "sriov_numvfs"
-MAX_UP_RETRIES = 10
+SYSFS_NET = "/sys/class/net"
+SYSFS_PCI = "/sys/bus/pci/devices"
+IFF_UP = 0x1
+RTMGRP_LINK = 0x1
+UP_WAIT_TIMEOUT = 2.0
 UP_RETRY_INTERVAL = 0.2
+MAX_UP_WORKERS = 16
+
+# libyaml based loader when available, it is much faster on large
+# hieradata files
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 
 def execute_command(command_to_run):
@@ -165,6 +180,22 @@ def sriov_bind(driver, addresses):
     if not res:
         return res
 
+    return _bind_vfs(driver, addresses)
+
+
+def _bind_vfs(driver, addresses):
+    """
+    Binds a list of SR-IOV VFs to an already loaded driver.
+
+    Args:
+        driver (str): Driver name to bind.
+        addresses (list): List of PCI addresses of VFs.
+
+    Returns:
+        bool: True if all bindings were successful, False otherwise.
+    """
+    res = True
+
     # No driver informed, ignore dpdk-devbind.py for these VFs
     if driver == DRIVER_NONE:
         for chunk in chunk_list(addresses, 15):
@@ -172,6 +203,17 @@ def sriov_bind(driver, addresses):
             print(f'IGNORE sriov_vf_bind for VFs:{addr_list}')
         return True
 
+    # Skip the VFs already on this driver. The driver is read again from
+    # sysfs, the index may predate a bind or unbind done since.
+    bound = [addr for addr in addresses
+             if SriovTopology.read_driver(addr) == driver]
+    if bound:
+        for chunk in chunk_list(bound, 15):
+            addr_list = " ".join(chunk)
+            print(f'sriov_vf_bind driver: {driver} - already bound VFs:{addr_list}')
+        bound = set(bound)
+        addresses = [addr for addr in addresses if addr not in bound]
+
     # Bind the VF to the driver
     # dpdk-devbind.py accepts multiple ADDR at same time
     # dpdk-devbind.py --bind=vfio-pci 0000:07:02.3 0000:07:02.4 0000:07:02.5
@@ -219,11 +261,156 @@ def set_max_tx_rate(port, vfnumber, max_tx_rate):
     return res
 
 
+def _list_pci_netdevs(pci_addr):
+    """
+    Return the netdevs of a PCI function from /sys/bus/pci/devices/<addr>/net.
+    """
+    net_dir = os.path.join(SYSFS_PCI, pci_addr, "net")
+    if not os.path.isdir(net_dir):
+        return []
+
+    try:
+        return sorted(os.listdir(net_dir))
+    except OSError:
+        return []
+
+
+class SriovTopology():
+    """
+    Index of the SR-IOV topology, built from a single pass over sysfs.
+
+    /sys/class/net is listed once to map every netdev to its PCI
+    function. For each of those functions that is a PF, sriov_numvfs and
+    the virtfn* links are read to map the PF to its VFs. The drivers are
+    not recorded, the binds read them right before binding, and so is
+    sriov_numvfs before it is written.
+
+    The index is shared by the whole run through get(). After an
+    operation that changes the topology (writing sriov_numvfs, binding
+    drivers) it must be invalidated, or the affected PF marked with
+    mark_stale() so only that PF is scanned again.
+    """
+
+    _instance = None
+
+    def __init__(self):
+        self.netdev_to_pci = {}
+        self.pci_to_netdevs = defaultdict(list)
+        self.pf_to_vfs = {}
+        self.numvfs = {}
+        self._stale_pfs = set()
+        self.scan_error = None
+        self._scan()
+
+    @classmethod
+    def get(cls):
+        """Return the shared index, scanning sysfs if needed."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @classmethod
+    def invalidate(cls):
+        """Drop the shared index, the next get() rescans sysfs."""
+        cls._instance = None
+
+    def _scan(self):
+        ifnames = []
+        if os.path.isdir(SYSFS_NET):
+            try:
+                ifnames = sorted(os.listdir(SYSFS_NET))
+            except OSError as e:
+                # reported by the callers that need the whole tree
+                self.scan_error = e
+        for ifname in ifnames:
+            device_link = os.path.join(SYSFS_NET, ifname, "device")
+            try:
+                pci_addr = os.path.basename(os.readlink(device_link))
+            except OSError:
+                # virtual interfaces have no backing device
+                continue
+            self.netdev_to_pci[ifname] = pci_addr
+            self.pci_to_netdevs[pci_addr].append(ifname)
+
+        for pci_addr in list(self.pci_to_netdevs):
+            self._scan_pf(pci_addr)
+
+    def _scan_pf(self, pci_addr):
+        """Record numvfs and VFs of a PF (no-op if not a PF)."""
+        dev_dir = os.path.join(SYSFS_PCI, pci_addr)
+        numvfs_path = os.path.join(dev_dir, SRIOV_NUMVFS_FILE)
+        if not os.path.isfile(numvfs_path):
+            return
+
+        self.numvfs[pci_addr] = _read_int_from_file(numvfs_path)
+
+        vfs = {}
+        try:
+            entries = os.listdir(dev_dir)
+        except OSError:
+            entries = []
+        for entry in entries:
+            if not entry.startswith("virtfn"):
+                continue
+            try:
+                index = int(entry[len("virtfn"):])
+                vf_addr = os.path.basename(
+                    os.readlink(os.path.join(dev_dir, entry)))
+            except (OSError, ValueError):
+                continue
+            vfs[index] = vf_addr
+
+        self.pf_to_vfs[pci_addr] = [vfs[i] for i in sorted(vfs)]
+
+    @staticmethod
+    def read_driver(pci_addr):
+        try:
+            return os.path.basename(
+                os.readlink(os.path.join(SYSFS_PCI, pci_addr, "driver")))
+        except OSError:
+            return None
+
+    @classmethod
+    def mark_stale(cls, pf_addr):
+        """
+        Mark a PF whose VFs changed, it is refreshed in place on the next
+        lookup instead of rescanning the whole tree. No-op if the index
+        was not built yet.
+        """
+        if cls._instance is not None:
+            cls._instance._stale_pfs.add(pf_addr)
+
+    def _refresh_stale_pfs(self):
+        stale_pfs = self._stale_pfs
+        self._stale_pfs = set()
+        for pf_addr in sorted(stale_pfs):
+            self._refresh_pf(pf_addr)
+
+    def _refresh_pf(self, pf_addr):
+        for vf_addr in self.pf_to_vfs.pop(pf_addr, []):
+            for ifname in self.pci_to_netdevs.pop(vf_addr, []):
+                self.netdev_to_pci.pop(ifname, None)
+        self.numvfs.pop(pf_addr, None)
+
+        self._scan_pf(pf_addr)
+
+        for vf_addr in self.pf_to_vfs.get(pf_addr, []):
+            for ifname in _list_pci_netdevs(vf_addr):
+                self.netdev_to_pci[ifname] = vf_addr
+                self.pci_to_netdevs[vf_addr].append(ifname)
+
+    def get_netdevs(self, pci_addr):
+        """Return the netdevs of a PCI function."""
+        self._refresh_stale_pfs()
+        return list(self.pci_to_netdevs.get(pci_addr, []))
+
+
 def _get_vf_netdev(vf_addr):
     """
     Get the network device name for a VF given its PCI address.
 
-    Looks up /sys/bus/pci/devices/<vf_addr>/net/ to find the netdev.
+    Looks up the VF in the SR-IOV topology index, then in
+    /sys/bus/pci/devices/<vf_addr>/net/.
 
     Args:
         vf_addr (str): PCI address of the VF (e.g., "0000:0d:02.0").
@@ -231,17 +418,13 @@ def _get_vf_netdev(vf_addr):
     Returns:
         str or None: The netdev name (e.g., "enp13s0f2v0"), or None if not found.
     """
-    net_dir = f"/sys/bus/pci/devices/{vf_addr}/net"
-    if not os.path.isdir(net_dir):
-        return None
-
-    try:
-        entries = os.listdir(net_dir)
-        if entries:
-            return entries[0]
-    except OSError:
-        pass
-
+    netdevs = SriovTopology.get().get_netdevs(vf_addr)
+    if not netdevs:
+        # The netdev shows up asynchronously after the driver is bound,
+        # it may be missing from the index
+        netdevs = _list_pci_netdevs(vf_addr)
+    if netdevs:
+        return netdevs[0]
     return None
 
 
@@ -311,41 +494,147 @@ def _get_pf_netdevs(pci_addr):
     """
     Return a list of net device names associated with a PCI function.
     """
-    net_dir = f"/sys/bus/pci/devices/{pci_addr}/net"
-    if not os.path.isdir(net_dir):
-        return []
+    return SriovTopology.get().get_netdevs(pci_addr)
+
 
-    devs = []
-    for entry in os.listdir(net_dir):
-        full = os.path.join(net_dir, entry)
-        if os.path.isdir(full):
-            devs.append(entry)
-    return devs
+def _read_iface_state(ifname):
+    """
+    Read the interface flags and operstate from sysfs.
+
+    Args:
+        ifname (str): Network interface name.
+
+    Returns:
+        tuple: (int flags or None, str operstate or None)
+    """
+    base = os.path.join(SYSFS_NET, ifname)
+    flags = None
+    operstate = None
+    try:
+        with open(os.path.join(base, "flags"), "r", encoding="utf-8") as f:
+            flags = int(f.read().strip(), 16)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(base, "operstate"), "r", encoding="utf-8") as f:
+            operstate = f.read().strip()
+    except OSError:
+        pass
+    return flags, operstate
 
 
 def _iface_is_up(ifname):
     """
-    Check if interface is UP by inspecting 'ip link show dev <ifname>'.
+    Check if interface is administratively UP (IFF_UP set in
+    /sys/class/net/<ifname>/flags).
+    """
+    flags, _ = _read_iface_state(ifname)
+    return flags is not None and bool(flags & IFF_UP)
+
 
-    The shell version did:
-      ip link show dev "${port_name}" | grep -q "<.*\\bUP\\b.*>"
+def _open_link_monitor():
     """
-    ok, output = execute_command(["ip", "link", "show", "dev", ifname])
-    if not ok or not output:
-        return False
+    Open a netlink socket subscribed to link (RTMGRP_LINK) notifications.
+
+    Returns:
+        socket or None: The socket, or None if netlink is not available.
+    """
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                             socket.NETLINK_ROUTE)
+    except (OSError, AttributeError):
+        return None
 
-    text = f" {output} "
-    if " UP " in text or "<UP," in output or ",UP>" in output:
+    try:
+        sock.bind((0, RTMGRP_LINK))
+        sock.setblocking(False)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def _wait_for_link_event(sock, timeout):
+    """
+    Block until a link notification arrives or the timeout expires.
+    Without a netlink socket, fall back to a short sleep.
+
+    The notification contents are discarded, the caller re-reads
+    the interface state from sysfs.
+    """
+    if sock is None:
+        time.sleep(min(timeout, UP_RETRY_INTERVAL))
+        return
+
+    readable, _, _ = select.select([sock], [], [], timeout)
+    if not readable:
+        return
+
+    try:
+        while sock.recv(65536):
+            pass
+    except OSError:
+        # BlockingIOError once the socket is drained
+        pass
+
+
+def _set_iface_up(ifname):
+    ok, msg = execute_command(["ip", "link", "set", "dev", ifname, "up"])
+    if not ok:
+        print(f"ERROR: Failed to set '{ifname}' up: {msg}")
+    return ok
+
+
+def _bring_up_netdevs(ifnames):
+    """
+    Bring up a set of netdevs in parallel and wait for all of them
+    to report IFF_UP, using a single deadline shared by all of them.
+
+    Args:
+        ifnames (list): Network interface names.
+
+    Returns:
+        bool: True if every interface is up, False otherwise.
+    """
+    pending = [ifname for ifname in ifnames if not _iface_is_up(ifname)]
+    if not pending:
         return True
-    return False
+
+    # Subscribe before changing the links so no notification is missed
+    sock = _open_link_monitor()
+    try:
+        workers = min(len(pending), MAX_UP_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_set_iface_up, pending))
+
+        waiting = {ifname for ifname, ok in zip(pending, results) if ok}
+        deadline = time.monotonic() + UP_WAIT_TIMEOUT
+        while waiting:
+            waiting = {ifname for ifname in waiting
+                       if not _iface_is_up(ifname)}
+            remaining = deadline - time.monotonic()
+            if not waiting or remaining <= 0:
+                break
+            _wait_for_link_event(sock, remaining)
+    finally:
+        if sock is not None:
+            sock.close()
+
+    for ifname in sorted(waiting):
+        _, operstate = _read_iface_state(ifname)
+        print("ERROR: Interface "
+              f"'{ifname}' did not go up in the allotted time "
+              f"(operstate: {operstate})")
+
+    return all(results) and not waiting
 
 
 def _ensure_pf_netdevs_up(pci_addr, up_requirement):
     """
     Bring up PF netdevs if up_requirement is True.
-    - iterate over /sys/bus/pci/devices/<addr>/net/*
-    - ip link set dev <port> up
-    - retry 10 times with 0.2s sleep
+    - iterate over the PF netdevs from the SR-IOV topology index
+    - ip link set dev <port> up, for all ports in parallel
+    - wait for link notifications, up to UP_WAIT_TIMEOUT
     """
     if not up_requirement:
         return True
@@ -354,29 +643,36 @@ def _ensure_pf_netdevs_up(pci_addr, up_requirement):
     if not netdevs:
         return True
 
-    for ifname in netdevs:
-        if _iface_is_up(ifname):
-            continue
+    _bring_up_netdevs(netdevs)
+    return True
+
 
-        ok, msg = execute_command(["ip", "link", "set", "dev", ifname, "up"])
-        if not ok:
-            print(f"ERROR: Failed to set '{ifname}' up: {msg}")
+def _get_netdevs_to_bring_up(sriov_configs):
+    """
+    Return the netdevs of all PFs with up_requirement whose
+    sriov_numvfs still has to be changed. sriov_numvfs is read from sysfs,
+    not from the SR-IOV topology index, as right before it is written.
+    """
+    netdevs = []
+    for cfg in sriov_configs.values():
+        if not isinstance(cfg, dict) or not cfg.get("up_requirement"):
             continue
 
-        port_is_up = False
-        for attempt in range(MAX_UP_RETRIES):
-            if _iface_is_up(ifname):
-                port_is_up = True
-                break
+        pci_addr = cfg.get("addr")
+        num_vfs = cfg.get("num_vfs")
+        if not pci_addr or num_vfs is None or num_vfs <= 0:
+            continue
 
-            if attempt < MAX_UP_RETRIES - 1:
-                time.sleep(UP_RETRY_INTERVAL)
+        pf_netdevs = _get_pf_netdevs(pci_addr)
+        if not pf_netdevs:
+            continue
 
-        if not port_is_up:
-            print("ERROR: Interface "
-                    f"'{ifname}' did not go up in the allotted time")
+        vf_path = f"{SYSFS_PCI}/{pci_addr}/{SRIOV_NUMVFS_FILE}"
+        if _read_int_from_file(vf_path) == num_vfs:
+            continue
 
-    return True
+        netdevs.extend(pf_netdevs)
+    return netdevs
 
 
 def _enable_sriov_for_pf(pci_addr, num_vfs, up_requirement, sriov_name=None):
@@ -396,7 +692,7 @@ def _enable_sriov_for_pf(pci_addr, num_vfs, up_requirement, sriov_name=None):
         print(f"Skipping PF {pci_addr}: num_vfs={num_vfs} is not > 0")
         return True
 
-    base_path = f"/sys/bus/pci/devices/{pci_addr}"
+    base_path = f"{SYSFS_PCI}/{pci_addr}"
     vf_path = os.path.join(base_path, SRIOV_NUMVFS_FILE)
 
     current_vfs = _read_int_from_file(vf_path)
@@ -408,14 +704,18 @@ def _enable_sriov_for_pf(pci_addr, num_vfs, up_requirement, sriov_name=None):
         if not _ensure_pf_netdevs_up(pci_addr, up_requirement):
             print(f"ERROR: failed to ensure PF {pci_addr} netdevs are up")
 
-    if not _write_int_to_file(vf_path, 0):
-        print(f"ERROR: Failed to write 0 to '{vf_path}' for PF {pci_addr}")
-        return False
-
-    if not _write_int_to_file(vf_path, num_vfs):
-        print(f"ERROR: Failed to write {num_vfs} to '{vf_path}' "
-              f"for PF {pci_addr}")
-        return False
+    try:
+        if not _write_int_to_file(vf_path, 0):
+            print(f"ERROR: Failed to write 0 to '{vf_path}' for PF {pci_addr}")
+            return False
+
+        if not _write_int_to_file(vf_path, num_vfs):
+            print(f"ERROR: Failed to write {num_vfs} to '{vf_path}' "
+                  f"for PF {pci_addr}")
+            return False
+    finally:
+        # The VFs of this PF and their netdevs changed
+        SriovTopology.mark_stale(pci_addr)
 
     label = pci_addr
     if sriov_name:
@@ -437,6 +737,10 @@ def enable_sriov_from_configs(sriov_configs):
     """
     result = True
 
+    # Bring up the netdevs of all PFs at once, so the link-up wait is
+    # shared instead of paid once per PF.
+    _bring_up_netdevs(_get_netdevs_to_bring_up(sriov_configs))
+
     for name, cfg in sriov_configs.items():
         if not isinstance(cfg, dict):
             print("ERROR: sriov_enable: config for "
@@ -473,9 +777,7 @@ def enable_sriov_from_data(data):
                 f"{type(data).__name__}")
         return False
 
-    sriov_configs = data.get(
-        "platform::network::interfaces::sriov::sriov_config", {}
-    )
+    sriov_configs = data.get(SRIOV_CONFIG_KEY, {})
 
     if not sriov_configs:
         return True
@@ -609,44 +911,38 @@ def reset_orphaned_sriov_vfs(sriov_configs):
         bool: True if all resets succeeded (or nothing to reset), False on error.
     """
     configured_addrs = _get_configured_pci_addrs(sriov_configs)
-    net_base = "/sys/class/net"
-    result = True
-
-    try:
-        if not os.path.isdir(net_base):
-            return True
+    topology = SriovTopology.get()
+    if topology.scan_error is not None:
+        print(f"ERROR: reset_orphaned_sriov_vfs: {topology.scan_error}")
+        return False
 
-        for ifname in os.listdir(net_base):
-            numvfs_path = os.path.join(net_base, ifname, "device",
-                                       SRIOV_NUMVFS_FILE)
-            if not os.path.isfile(numvfs_path):
-                continue
+    result = True
+    reset = False
 
-            current_vfs = _read_int_from_file(numvfs_path)
-            if current_vfs is None or current_vfs <= 0:
-                continue
+    for pci_addr, current_vfs in sorted(topology.numvfs.items()):
+        if current_vfs is None or current_vfs <= 0:
+            continue
 
-            # Resolve the PCI address for this interface
-            device_link = os.path.join(net_base, ifname, "device")
-            try:
-                pci_addr = os.path.basename(os.readlink(device_link))
-            except OSError:
-                continue
+        if pci_addr in configured_addrs:
+            continue
 
-            if pci_addr in configured_addrs:
-                continue
+        netdevs = topology.get_netdevs(pci_addr)
+        if not netdevs:
+            continue
 
-            # This PF has VFs but is not in the config - reset it
-            print(f"Resetting orphaned SR-IOV VFs on PF {pci_addr} "
-                  f"({ifname}): sriov_numvfs was {current_vfs}")
-            if not _write_int_to_file(numvfs_path, 0):
-                print(f"ERROR: Failed to reset sriov_numvfs for "
-                      f"PF {pci_addr} ({ifname})")
-                result = False
+        # This PF has VFs but is not in the config - reset it
+        ifname = ",".join(netdevs)
+        print(f"Resetting orphaned SR-IOV VFs on PF {pci_addr} "
+              f"({ifname}): sriov_numvfs was {current_vfs}")
+        reset = True
+        numvfs_path = os.path.join(SYSFS_PCI, pci_addr, SRIOV_NUMVFS_FILE)
+        if not _write_int_to_file(numvfs_path, 0):
+            print(f"ERROR: Failed to reset sriov_numvfs for "
+                  f"PF {pci_addr} ({ifname})")
+            result = False
 
-    except OSError as e:
-        print(f"ERROR: reset_orphaned_sriov_vfs: {e}")
-        result = False
+    if reset:
+        SriovTopology.invalidate()
 
     return result
 
@@ -674,7 +970,7 @@ def parse_and_process_sriov_config(data):
             print(f"Error: data is not a dictionary: {type(data).__name__}")
             return False, []
 
-        sriov_configs = data.get('platform::network::interfaces::sriov::sriov_config', {})
+        sriov_configs = data.get(SRIOV_CONFIG_KEY, {})
 
         # Reset orphaned VFs before processing the new config
         reset_orphaned_sriov_vfs(sriov_configs)
@@ -693,6 +989,9 @@ def parse_and_process_sriov_config(data):
             if sriov_bind(driver_name, addresses) is False:
                 res = False
 
+        # Binding creates or removes VF netdevs
+        SriovTopology.invalidate()
+
         for item in max_tx_rate_list:
             if set_max_tx_rate(item['port'],
                                item['vfnumber'],
@@ -711,6 +1010,28 @@ def parse_and_process_sriov_config(data):
         return False, []
 
 
+def _load_yaml_config(text):
+    """
+    Parse the SR-IOV entry of a YAML hieradata file.
+
+    Only the platform::network::interfaces::sriov::sriov_config entry is
+    parsed, the other top-level keys are skipped. The whole document is
+    parsed when that entry can't be isolated, so files without SR-IOV
+    config are still validated.
+    """
+    block = k8s_yaml.filter_top_level(text, lambda key: key == SRIOV_CONFIG_KEY)
+    if block:
+        try:
+            data = yaml.load(block, Loader=YAML_LOADER)
+            if isinstance(data, dict) and list(data) == [SRIOV_CONFIG_KEY]:
+                return data
+        except yaml.YAMLError:
+            # e.g. tags the loader rejects, see k8s_yaml.filter_top_level
+            pass
+
+    return yaml.load(text, Loader=YAML_LOADER)
+
+
 def _load_config_file(config_file):
     """
     Load JSON or YAML configuration file.
@@ -722,7 +1043,7 @@ def _load_config_file(config_file):
             if ext == ".json":
                 data = json.load(f)
             elif ext == ".yaml":
-                data = yaml.safe_load(f)
+                data = _load_yaml_config(f.read())
             else:
                 print(
                     "Error: Unsupported file extension: "
@@ -812,7 +1133,7 @@ def main():
     if not all_sriov_entries:
         print("No SRIOV entries found.")
 
-    print_dpdk_status("vfs")
+    print_dpdk_status(mode)
     sys.exit(0)
 
 
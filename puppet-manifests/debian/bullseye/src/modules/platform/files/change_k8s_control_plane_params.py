@@ -3,23 +3,32 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+import functools
+import hashlib
+import inspect
 import json
 import logging
 import os
+import random
+import re
 import requests
-import ruamel.yaml as yaml
-from ruamel.yaml.compat import StringIO
 import shutil
-import signal
 import subprocess
 from subprocess import CalledProcessError
 import sys
+import threading
 import time
 
+from kubernetes import client as kube_client  # pylint: disable=import-error
+from kubernetes import config as kube_config  # pylint: disable=import-error
+from kubernetes.client.rest import ApiException  # pylint: disable=import-error
 from sysinv.common import kubernetes  # pylint: disable=import-error
 from sysinv.common import service_parameter as sp  # pylint: disable=import-error
 
+import k8s_yaml
+
 # pylint: disable-msg=broad-except
 
 # Logging
@@ -47,22 +56,94 @@ SCHEDULER_TAG = 'platform::kubernetes::kube_scheduler::params::'
 ETCD_TAG = 'platform::kubernetes::params::etcd_'
 CONFIG_TAG = 'platform::kubernetes::config::params::'
 KUBELET_TAG = 'platform::kubernetes::kubelet::params::'
+K8S_MANIFESTS_DIR = '/etc/kubernetes/manifests'
 KUBE_APISERVER_CONFIG = '/etc/kubernetes/manifests/kube-apiserver.yaml'
 
 KUBE_APISERVER_VOLUMES_TAG = 'platform::kubernetes::kube_apiserver_volumes::params::'
 CONTROLLER_MANAGER_VOLUMES_TAG = 'platform::kubernetes::kube_controller_manager_volumes::params::'
 SCHEDULER_VOLUMES_TAG = 'platform::kubernetes::kube_scheduler_volumes::params::'
 
+# Common prefix of all the hieradata keys used by this script
+HIERADATA_PREFIX = 'platform::kubernetes::'
+
+# service_params section of each hieradata tag, matched with a single
+# regex. The order matters: ETCD_TAG keys also start with DEFAULT_TAG.
+SERVICE_PARAMETERS_ROUTES = (
+    (KUBE_APISERVER_TAG, 'apiServer'),
+    (KUBE_APISERVER_VOLUMES_TAG, 'apiServerVolumes'),
+    (CONTROLLER_MANAGER_TAG, 'controllerManager'),
+    (CONTROLLER_MANAGER_VOLUMES_TAG, 'controllerManagerVolumes'),
+    (SCHEDULER_TAG, 'scheduler'),
+    (SCHEDULER_VOLUMES_TAG, 'schedulerVolumes'),
+    (ETCD_TAG, 'etcd'),
+    (CONFIG_TAG, 'config'),
+    (KUBELET_TAG, 'kubelet'),
+    (DEFAULT_TAG, 'base'),
+)
+SERVICE_PARAMETERS_RE = re.compile('|'.join(
+    '({})'.format(re.escape(tag)) for tag, _ in SERVICE_PARAMETERS_ROUTES))
+
+# Loaded hieradata, keyed by file path, modification time and size
+_hieradata_cache = {}
+
 KUBE_APISERVER_PORT = 16443
 
 SCHEDULER_HEALTHZ_ENDPOINT = "https://127.0.0.1:10259/healthz"
 CONTROLLER_MANAGER_HEALTHZ_ENDPOINT = "https://127.0.0.1:10257/healthz"
 KUBELET_HEALTHZ_ENDPOINT = "http://localhost:10248/healthz"
 
+# ClusterConfiguration section of each control-plane component
+CONTROL_PLANE_SECTIONS = {
+    'apiserver': 'apiServer',
+    'controller-manager': 'controllerManager',
+    'scheduler': 'scheduler',
+}
+
 RECOVERY_TIMEOUT = 5
 RECOVERY_TRIES = 30
 RECOVERY_TRY_SLEEP = 5
 
+# Time budget of the update and of the restores, in seconds. The run has a
+# single deadline, their sum, below the timeout of the puppet exec running
+# this script (600s). The update stops RESTORE_TIMEOUT seconds before it,
+# the restores use that reserved tail.
+UPDATE_TIMEOUT = 420
+RESTORE_TIMEOUT = 150
+
+# First retry delay of the health checks, doubled on every retry up to
+# the configured try_sleep
+HEALTH_CHECK_MIN_SLEEP = 0.5
+
+# One pooled session per health endpoint, so TLS connections are reused
+# across probes
+_health_sessions = {}
+_health_sessions_lock = threading.Lock()
+
+KUBERNETES_ADMIN_CONF = '/etc/kubernetes/admin.conf'
+
+# KubeOperator and core API client shared by the whole process, so the k8s
+# API clients and their connection pools are created once
+_kube_operator = {}
+_kube_operator_lock = threading.Lock()
+
+# Configmaps read from the k8s API are cached for this long
+CONFIGMAP_CACHE_TTL = 30
+_configmap_cache = {}
+_configmap_cache_lock = threading.Lock()
+
+# Maximum number of configmaps read, created or exported at once
+MAX_CONFIGMAP_WORKERS = 8
+
+# JSON summary of the stages of the last run, saved to the puppet logs
+TIMELINE_DIR = '/var/log/puppet/latest'
+TIMELINE_FILE = 'k8s_update_timeline.json'
+
+# Time allowed for the kubelet to replace a static pod after its manifest
+# was rewritten, and the polling interval of the CRI container state
+STATIC_POD_RESTART_TIMEOUT = 60
+STATIC_POD_POLL_INTERVAL = 0.5
+CRICTL_TIMEOUT = 10
+
 INITCONFIG_BASE_TEMPLATE = '''---
 apiVersion: kubeadm.k8s.io/v1beta4
 kind: InitConfiguration
@@ -75,17 +156,205 @@ class TimeoutException(Exception):
     pass
 
 
-@contextmanager
-def time_limit(seconds):
-    """Auxiliary function to limit execution time of a block of code."""
-    def signal_handler(signum, frame):
-        raise TimeoutException("TIMEOUT")
-    signal.signal(signal.SIGALRM, signal_handler)
-    signal.alarm(seconds)
-    try:
-        yield
-    finally:
-        signal.alarm(0)
+class Deadline(object):
+    """Deadline of an operation. Every deadline is bounded by the deadline
+    of the run, so the retries of all the operations can't exceed it.
+    Unlike SIGALRM timeouts, deadlines can be nested and used from any
+    thread.
+    """
+    # Deadline of the run, and parent of the new operations: the run
+    # deadline less the reserved tail, until the tail is released
+    _budget = None
+    _operations = None
+    # Calls that timed out and are still running, see call_in_thread
+    _workers = []
+    _workers_lock = threading.Lock()
+
+    def __init__(self, seconds=None, parent=None):
+        self.expires = None if seconds is None else time.monotonic() + float(seconds)
+        if parent is not None and parent.expires is not None:
+            if self.expires is None or parent.expires < self.expires:
+                self.expires = parent.expires
+
+    @classmethod
+    def set_budget(cls, seconds, reserve=0):
+        """Sets the deadline of the run. Operations end reserve seconds
+        before it, until release_reserve is called."""
+        cls._budget = cls(seconds)
+        cls._operations = cls(max(0.0, float(seconds) - float(reserve)),
+                              parent=cls._budget)
+
+    @classmethod
+    def release_reserve(cls):
+        """Lets the operations use the reserved tail of the run, to restore
+        a failed update. The deadline of the run does not move, so chained
+        restores share the tail."""
+        cls._operations = cls._budget
+
+    @classmethod
+    def operation(cls, seconds=None):
+        """Returns the deadline of a new operation."""
+        return cls(seconds, parent=cls._operations)
+
+    @classmethod
+    def join_workers(cls):
+        """Waits, up to the deadline of the run, for the calls that timed
+        out. Returns the number of them still running."""
+        with cls._workers_lock:
+            workers, cls._workers = cls._workers, []
+        for worker in workers:
+            worker.join(cls._budget.remaining() if cls._budget else 0)
+        return sum(1 for worker in workers if worker.is_alive())
+
+    def remaining(self):
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def timeout(self, seconds):
+        """Returns the timeout of a single request: seconds, limited to
+        the remaining time."""
+        remaining = self.remaining()
+        if remaining is None:
+            return seconds
+        if seconds is None:
+            return remaining
+        return min(float(seconds), remaining)
+
+    def sleep(self, seconds):
+        """Sleeps up to the deadline.
+        Return:
+         - True, the deadline has not expired.
+         - False, the deadline has expired.
+        """
+        remaining = self.remaining()
+        time.sleep(seconds if remaining is None else min(seconds, remaining))
+        return not self.expired()
+
+    def call(self, func, timeout=None):
+        """Calls func(request_timeout), request_timeout being timeout
+        limited to the remaining time (see timeout). func passes it on to
+        its request, e.g. as the _request_timeout of a k8s client call or
+        the timeout of a subprocess, so the request ends at the deadline.
+        Raise:
+         - TimeoutException, the deadline has expired.
+        """
+        if self.expired():
+            raise TimeoutException("TIMEOUT")
+        return func(self.timeout(timeout))
+
+    def call_in_thread(self, func, timeout=None):
+        """Calls func(), which can't take a timeout, giving up after
+        timeout seconds or at the deadline. func runs in a daemon thread.
+        A thread can't be interrupted, on timeout it is kept to be joined
+        before exiting (see join_workers).
+        Raise:
+         - TimeoutException, func did not finish in time.
+        """
+        limit = self.timeout(timeout)
+        if limit is None:
+            return func()
+        result = {}
+
+        def _run():
+            try:
+                result['value'] = func()
+            except Exception as e:
+                result['error'] = e
+
+        worker = threading.Thread(target=_run, daemon=True)
+        worker.start()
+        worker.join(limit)
+        if worker.is_alive():
+            with Deadline._workers_lock:
+                Deadline._workers.append(worker)
+            raise TimeoutException("TIMEOUT")
+        if 'error' in result:
+            raise result['error']
+        return result['value']
+
+
+class Timeline(object):
+    """Timeline of the update process: duration of each stage, and counters
+    of k8s API calls, subprocess forks and health probes."""
+    _lock = threading.Lock()
+    _local = threading.local()
+    started = time.time()
+    stages = []
+    counters = {'api_calls': 0, 'forks': 0, 'health_probes': 0}
+
+    @classmethod
+    def count(cls, counter):
+        with cls._lock:
+            cls.counters[counter] += 1
+
+    @classmethod
+    @contextmanager
+    def stage(cls, name):
+        """Records the duration of the enclosed block as a stage."""
+        record = {'stage': name, 'start': round(time.time() - cls.started, 3)}
+        stack = cls._local.__dict__.setdefault('stack', [])
+        stack.append(record)
+        start = time.monotonic()
+        try:
+            yield record
+        finally:
+            stack.pop()
+            record['duration'] = round(time.monotonic() - start, 3)
+            with cls._lock:
+                cls.stages.append(record)
+            LOG.debug('Stage %s took %.3fs.', name, record['duration'])
+
+    @classmethod
+    def annotate(cls, **details):
+        """Adds details to the innermost stage of the calling thread."""
+        stack = getattr(cls._local, 'stack', None)
+        if stack:
+            stack[-1].update(details)
+
+    @classmethod
+    def save(cls, rc, target_dir=TIMELINE_DIR):
+        """Saves the JSON summary of the run."""
+        with cls._lock:
+            summary = {
+                'rc': rc,
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(cls.started)),
+                'duration': round(time.time() - cls.started, 3),
+                'counters': dict(cls.counters),
+                'stages': sorted(cls.stages, key=lambda record: record['start']),
+            }
+        LOG.debug('Update took %.3fs, counters: %s', summary['duration'], summary['counters'])
+        if not os.path.isdir(target_dir):
+            LOG.debug('%s not found, timeline not saved.', target_dir)
+            return
+        try:
+            _write_file_content(os.path.join(target_dir, TIMELINE_FILE),
+                                json.dumps(summary, indent=2, default=str))
+        except Exception as e:
+            LOG.warning('Saving timeline: %s', e)
+
+
+def timeline_stage(name, detail=None):
+    """Decorator recording each call of a function as a timeline stage.
+    detail is the name of an argument whose value is added to the stage
+    name."""
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stage = name
+            if detail:
+                arguments = signature.bind(*args, **kwargs)
+                arguments.apply_defaults()
+                stage = '{} {}'.format(name, arguments.arguments[detail])
+            with Timeline.stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
 
 
 def _exec_cmd(cmd, stdout=None, stderr=None):
@@ -100,6 +369,7 @@ def _exec_cmd(cmd, stdout=None, stderr=None):
         kwargs["stdout"] = stdout
     if stderr is not None:
         kwargs["stderr"] = stderr
+    Timeline.count('forks')
     try:
         subprocess.check_call(cmd, **kwargs)
     except CalledProcessError as e:
@@ -126,15 +396,62 @@ def _search_string_on_file(file_path, word):
     return False
 
 
+def _read_file_content(file_path):
+    """Auxiliary function to read a file, returns None if it can't be read"""
+    try:
+        with open(file_path, 'r') as f:
+            return f.read()
+    except Exception:
+        return None
+
+
+def _write_file_content(file_path, content):
+    """Auxiliary function to atomically replace the content of a file,
+    keeping the mode and ownership of the existing file"""
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        stat = None
+    tmp_file_path = file_path + '.tmp'
+    with open(tmp_file_path, 'w') as f:
+        f.write(content)
+    if stat:
+        os.chmod(tmp_file_path, stat.st_mode & 0o7777)
+        os.chown(tmp_file_path, stat.st_uid, stat.st_gid)
+    os.replace(tmp_file_path, file_path)
+
+
+def _copy_file_content(src_file_path, dst_file_path):
+    """Auxiliary function to atomically replace a file with a byte-for-byte
+    copy of another one. The temporary file is hidden, so the kubelet
+    ignores it when the target is a static pod manifest."""
+    tmp_file_path = os.path.join(os.path.dirname(dst_file_path),
+                                 '.{}.tmp'.format(os.path.basename(dst_file_path)))
+    shutil.copyfile(src_file_path, tmp_file_path)
+    shutil.copymode(src_file_path, tmp_file_path)
+    os.replace(tmp_file_path, dst_file_path)
+
+
+def _remove_file(file_path):
+    """Auxiliary function to remove a file that may not exist"""
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        LOG.error('Removing %s: %s', file_path, e)
+
+
 def get_kubeadm_initconfig_template():
     return INITCONFIG_BASE_TEMPLATE % str(KUBE_APISERVER_PORT)
 
 
+@timeline_stage('kubeadm control-plane', detail='target_component')
 def update_k8s_control_plane_components(config_filename, cluster_host_addr,
                                         target_component='apiserver'):
     """The function updates a k8s control-plane component."""
     LOG.debug('Updating %s ...', target_component)
-    tmp_config_filename = config_filename + '.tmp'
+    tmp_config_filename = '{}.{}.tmp'.format(config_filename, target_component)
 
     # Copy the original file.
     try:
@@ -159,6 +476,7 @@ def update_k8s_control_plane_components(config_filename, cluster_host_addr,
     return rc
 
 
+@timeline_stage('kubeadm kubelet-start')
 def update_k8s_kubelet(config_filename, error_log_file):
     """The function updates k8s kubelet.
     Return:
@@ -231,9 +549,38 @@ def get_api_server_readyz_endpoint():
 
 
 def get_kube_operator():
-    return kubernetes.KubeOperator(host=get_api_server_endpoint())
-
-
+    with _kube_operator_lock:
+        kube_operator = _kube_operator.get('operator')
+        if kube_operator is None:
+            kube_operator = kubernetes.KubeOperator(host=get_api_server_endpoint())
+            _kube_operator['operator'] = kube_operator
+        return kube_operator
+
+
+def get_k8s_core_client():
+    """Returns the core API client of the local kube-apiserver, for the
+    calls that need a request timeout: the KubeOperator calls take none."""
+    with _kube_operator_lock:
+        core_client = _kube_operator.get('core_client')
+        if core_client is None:
+            api_client = kube_config.new_client_from_config(
+                config_file=KUBERNETES_ADMIN_CONF)
+            api_client.configuration.host = get_api_server_endpoint()
+            core_client = kube_client.CoreV1Api(api_client)
+            _kube_operator['core_client'] = core_client
+        return core_client
+
+
+def invalidate_k8s_configmap_cache(namespace='kube-system'):
+    """The function drops the cached configmaps of a namespace, it must be
+    called after a configmap of that namespace is created, patched or
+    deleted."""
+    with _configmap_cache_lock:
+        for key in [key for key in _configmap_cache if key[0] == namespace]:
+            del _configmap_cache[key]
+
+
+@timeline_stage('configmap sync kubeadm-config')
 def patch_kubeadmin_configmap(new_data, is_controller_active):
     """The function patch the kubeadm-config configmap on the active controller.
     Return:
@@ -245,14 +592,14 @@ def patch_kubeadmin_configmap(new_data, is_controller_active):
         return 0
     try:
         configmap_name = 'kubeadm-config'
-        newyaml = yaml.YAML()
-        outstream = StringIO()
-        newyaml.dump(new_data, outstream)
-        configmap_data = {'data': {'ClusterConfiguration': outstream.getvalue()}}
+        configmap_data = {'data': {
+            'ClusterConfiguration': k8s_yaml.dump(new_data, roundtrip=True)}}
 
+        Timeline.count('api_calls')
         get_kube_operator().kube_patch_config_map(configmap_name,
                                                   'kube-system',
                                                   configmap_data)
+        invalidate_k8s_configmap_cache('kube-system')
         LOG.debug('Successfully patched kubeadm configmap.')
     except Exception as e:
         LOG.error("Unable to patch kubeadm config_map: %s", e)
@@ -272,8 +619,8 @@ def get_k8s_cluster_configuration():
         if not configmap:
             LOG.error('Getting kubeadm-config configmap.')
             return False
-        cluster_config = yaml.load(
-            configmap.data['ClusterConfiguration'], Loader=yaml.RoundTripLoader)
+        cluster_config = k8s_yaml.get_configmap_document(
+            configmap, 'ClusterConfiguration', roundtrip=True)
         return cluster_config
     except Exception as e:
         LOG.error("Getting cluster-config. %s", e)
@@ -292,8 +639,7 @@ def export_k8s_cluster_configuration(target_filename, cluster_cfg=None):
         if not cluster_cfg:
             return 1
     try:
-        with open(target_filename, 'w') as file:
-            yaml.dump(cluster_cfg, file, Dumper=yaml.RoundTripDumper, default_flow_style=False)
+        k8s_yaml.dump_file(cluster_cfg, target_filename, roundtrip=True)
     except Exception as e:
         LOG.error('Saving cluster-config file. %s', e)
         return 1
@@ -317,21 +663,67 @@ def export_k8s_kubeadm_configmap(target_filename):
         return 1
 
 
-def export_volume_configmap(volume_dict, section):
-    """The function exports a configmap data to a file.
+@timeline_stage('volume configmaps export')
+def export_volume_configmaps(volumes):
+    """The function exports the configmaps of extra volumes to their host
+    files. Only volumes with 'File' type have a configmap.
+    The configmaps are read by name, concurrently and through the configmap
+    cache (see get_k8s_configmaps), the exports run concurrently and a host
+    file is only rewritten if its content changed.
+    Args:
+        volumes: list of (volume_dict, section) tuples.
     Return:
      - rc = 0, export process successful.
      - rc = 1, export process failed.
     """
-    # only export configmap in case of volume with 'File' type
-    if volume_dict['pathType'] != 'File':
+    targets = {}
+    for volume_dict, section in volumes:
+        if volume_dict['pathType'] != 'File':
+            continue
+        _vol = volume_dict.copy()
+        _vol['section'] = section
+        targets[sp.get_k8s_configmap_name(_vol)] = volume_dict['hostPath']
+    if not targets:
         return 0
-    _vol = volume_dict.copy()
-    _vol['section'] = section
-    configmap_name = sp.get_k8s_configmap_name(_vol)
-    target_filename = volume_dict['hostPath']
 
-    if export_k8s_configmap(target_filename, configmap_name) != 0:
+    configmaps = get_k8s_configmaps(list(targets))
+    if configmaps is False:
+        LOG.error('Getting volume configmaps.')
+        return 1
+
+    def _export(item):
+        configmap_name, target_filename = item
+        return _write_configmap_to_file(
+            target_filename, configmap_name, configmaps[configmap_name])
+
+    workers = min(len(targets), MAX_CONFIGMAP_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        rcs = list(executor.map(_export, targets.items()))
+    return 1 if any(rcs) else 0
+
+
+def _write_configmap_to_file(target_filename, configmap_name, configmap):
+    """Auxiliary function to write the single value of a configmap to a
+    file, only if the file content differs"""
+    if not configmap:
+        LOG.error('Getting %s configmap.', configmap_name)
+        return 1
+
+    if not (isinstance(configmap.data, dict) and len(configmap.data) == 1):
+        LOG.error('Configmap format not expected.')
+        return 1
+    # Extracting the first (and expected to be the only) value
+    # from the configmap's data.
+    _, value = next(iter(configmap.data.items()))
+
+    if _read_file_content(target_filename) == value:
+        LOG.debug('%s is up to date with %s configmap.', target_filename, configmap_name)
+        return 0
+    try:
+        # Assuming the values are valid YAML strings
+        _write_file_content(target_filename, value)
+    except Exception as e:
+        LOG.error('Saving cluster-config file. %s', e)
         return 1
     return 0
 
@@ -345,43 +737,121 @@ def export_k8s_configmap(target_filename, configmap_name, namespace='kube-system
     LOG.debug('Exporting %s configmap.', configmap_name)
     try:
         configmap = get_k8s_configmap(configmap_name, namespace=namespace)
-        if not configmap:
-            LOG.error('Getting %s configmap.', configmap_name)
-            return 1
+        return _write_configmap_to_file(target_filename, configmap_name, configmap)
+    except Exception as e:
+        LOG.error("Exporting cluster-config. %s", e)
+        return 1
 
-        if not (isinstance(configmap.data, dict) and len(configmap.data) == 1):
-            LOG.error('Configmap format not expected.')
-            return 1
-        # Extracting the first (and expected to be the only) value
-        # from the configmap's data.
-        _, value = next(iter(configmap.data.items()))
 
-        try:
-            # Assuming the values are valid YAML strings
-            with open(target_filename, 'w') as file:
-                file.write(value)
-        except Exception as e:
-            LOG.error('Saving cluster-config file. %s', e)
-            return 1
+def get_static_pod_container_id(component, timeout=CRICTL_TIMEOUT):
+    """The function gets the running CRI container of a static pod, within
+    timeout seconds.
+    Return:
+     - container ID, the static pod container is running.
+     - '', no running container was found.
+     - None, the CRI could not be queried.
+    """
+    cmd = ["crictl", "ps", "--quiet", "--state", "Running",
+           "--name", "^{}$".format(component)]
+    Timeline.count('forks')
+    try:
+        output = subprocess.check_output(
+            cmd, stderr=subprocess.DEVNULL, timeout=timeout,
+            universal_newlines=True)
+    except Exception as e:
+        LOG.debug('Unable to get %s container: %s', component, e)
+        return None
+    container_ids = output.split()
+    return container_ids[0] if container_ids else ''
 
-        return 0
 
-    except Exception as e:
-        LOG.error("Exporting cluster-config. %s", e)
-        return 1
+class StaticPodRestartWaiter(object):
+    """Detects that the kubelet restarted a control-plane static pod after
+    its manifest was rewritten.
+    The manifest content and the running CRI container are recorded when
+    the object is created, that is, before the manifest is updated.
+    """
+
+    def __init__(self, component):
+        self.component = 'kube-' + component
+        self.manifest = get_control_plane_manifest(component)
+        self.manifest_content = _read_file_content(self.manifest)
+        self.container_id = get_static_pod_container_id(self.component)
+
+    def wait(self, timeout=STATIC_POD_RESTART_TIMEOUT):
+        """Wait until a new container replaced the one recorded.
+        Return:
+         - True, the new manifest took effect or the manifest is unchanged.
+         - False, the restart could not be confirmed.
+        """
+        if _read_file_content(self.manifest) == self.manifest_content:
+            LOG.debug('%s manifest is unchanged.', self.component)
+            return True
+        if self.container_id is None:
+            return False
+
+        with Timeline.stage('restart wait ' + self.component) as record:
+            deadline = Deadline.operation(timeout)
+            while True:
+                container_id = get_static_pod_container_id(
+                    self.component, timeout=deadline.timeout(CRICTL_TIMEOUT))
+                if container_id and container_id != self.container_id:
+                    LOG.debug('%s restarted, new container %s.',
+                              self.component, container_id)
+                    record['restarted'] = True
+                    return True
+                if not deadline.sleep(STATIC_POD_POLL_INTERVAL):
+                    LOG.debug('Timeout waiting for %s to restart.', self.component)
+                    record['restarted'] = False
+                    return False
+
+
+def _get_health_session(endpoint):
+    """Auxiliary function to get the pooled session of a health endpoint."""
+    with _health_sessions_lock:
+        session = _health_sessions.get(endpoint)
+        if session is None:
+            session = requests.Session()
+            session.verify = False
+            _health_sessions[endpoint] = session
+        return session
+
+
+def _probe_health(endpoint, timeout):
+    """Auxiliary function to probe a health endpoint once."""
+    Timeline.count('health_probes')
+    try:
+        r = _get_health_session(endpoint).get(endpoint, timeout=timeout)
+        return r.status_code == 200
+    except requests.exceptions.Timeout:
+        LOG.error('Timeout while checking k8s control-plane component health')
+    except Exception:
+        pass
+    return False
 
 
-def k8s_health_check(timeout, tries, try_sleep, healthz_endpoint):
+def _backoff_delays(try_sleep):
+    """Auxiliary generator of retry delays: exponential backoff with jitter,
+    starting at HEALTH_CHECK_MIN_SLEEP and capped at try_sleep.
+    """
+    delay = min(HEALTH_CHECK_MIN_SLEEP, try_sleep)
+    while True:
+        yield random.uniform(delay / 2, delay)
+        delay = min(delay * 2, try_sleep)
+
+
+@timeline_stage('health', detail='healthz_endpoint')
+def k8s_health_check(timeout, tries, try_sleep, healthz_endpoint,
+                     initial_delay=0, deadline=None):
     """The function checks a k8s control-plane component health.
     It uses the health endpoints provided by the control-plane pods.
+    The first probe is sent right away (after initial_delay, if set), the
+    following ones use exponential backoff capped at try_sleep. Probing
+    stops at the deadline, by default the time budget of the process.
     Return:
      - rc = True, k8s component health check ok.
      - rc = False, k8s component health check failed.
     """
-    # pylint: disable-msg=broad-except
-    rc = False
-    _tries = tries
-
     valid_endpoints = {
         get_api_server_readyz_endpoint(): 'apiserver',
         SCHEDULER_HEALTHZ_ENDPOINT: 'scheduler',
@@ -391,29 +861,201 @@ def k8s_health_check(timeout, tries, try_sleep, healthz_endpoint):
     if healthz_endpoint not in valid_endpoints:
         msg = "Invalid endpoint: {}".format(healthz_endpoint)
         LOG.error(msg)
-        return rc
+        return False
     endpoint_name = valid_endpoints.get(healthz_endpoint)
+    deadline = Deadline.operation() if deadline is None else deadline
 
-    while _tries:
-        time.sleep(try_sleep)
-        msg = "Checking {} healthz (Remaining tries: {}".format(endpoint_name, _tries)
-        LOG.debug(msg)
+    if initial_delay:
+        deadline.sleep(initial_delay)
 
-        try:
-            with time_limit(timeout):
-                try:
-                    kwargs = {"verify": False, "timeout": 15}
-                    r = requests.get(healthz_endpoint, **kwargs)
-                    if r.status_code == 200:
-                        rc = True
-                        break
-                except Exception:
-                    rc = False
-        except TimeoutException:
-            LOG.error('Timeout while checking k8s control-plane component health')
-            rc = False
+    delays = _backoff_delays(try_sleep)
+    _tries = tries
+    while _tries and not deadline.expired():
+        msg = "Checking {} healthz (Remaining tries: {})".format(endpoint_name, _tries)
+        LOG.debug(msg)
+        if _probe_health(healthz_endpoint, deadline.timeout(timeout)):
+            Timeline.annotate(tries=tries - _tries + 1, healthy=True)
+            return True
         _tries -= 1
-    return rc
+        if _tries:
+            deadline.sleep(next(delays))
+    if deadline.expired():
+        LOG.error('Time budget exhausted while checking %s health.', endpoint_name)
+    Timeline.annotate(tries=tries - _tries, healthy=False)
+    return False
+
+
+def k8s_health_check_all(timeout, tries, try_sleep, healthz_endpoints):
+    """The function checks several k8s components health concurrently.
+    Return:
+     - dict, health check result (True/False) per endpoint.
+    """
+    with ThreadPoolExecutor(max_workers=len(healthz_endpoints)) as executor:
+        futures = {
+            endpoint: executor.submit(
+                k8s_health_check, timeout=timeout, tries=tries,
+                try_sleep=try_sleep, healthz_endpoint=endpoint)
+            for endpoint in healthz_endpoints}
+    return {endpoint: future.result() for endpoint, future in futures.items()}
+
+
+def k8s_static_pod_health_check(waiter, timeout, tries, try_sleep,
+                                healthz_endpoint):
+    """The function waits for the new static pod of a control-plane
+    component to be running, then checks its health. The health endpoint
+    is only probed once the restart is confirmed, otherwise the old pod
+    could still answer. If the restart can't be confirmed the first probe
+    is delayed by try_sleep.
+    Return:
+     - rc = True, k8s component health check ok.
+     - rc = False, k8s component health check failed.
+    """
+    initial_delay = 0 if waiter.wait() else try_sleep
+    return k8s_health_check(
+        timeout=timeout, try_sleep=try_sleep, tries=tries,
+        initial_delay=initial_delay, healthz_endpoint=healthz_endpoint)
+
+
+def get_control_plane_manifest(component):
+    """Auxiliary function to get the static pod manifest of a control-plane
+    component."""
+    return os.path.join(K8S_MANIFESTS_DIR, 'kube-{}.yaml'.format(component))
+
+
+def get_control_plane_healthz_endpoint(component):
+    """Auxiliary function to get the health endpoint of a control-plane
+    component."""
+    if component == 'apiserver':
+        return get_api_server_readyz_endpoint()
+    if component == 'controller-manager':
+        return CONTROLLER_MANAGER_HEALTHZ_ENDPOINT
+    return SCHEDULER_HEALTHZ_ENDPOINT
+
+
+def update_and_check_k8s_control_plane_component(
+        config_filename, cluster_host_addr, target_component, **kwargs):
+    """The function updates a k8s control-plane component and waits for
+    its new static pod to be healthy.
+    Return:
+     - rc = True, k8s component updated and healthy.
+     - rc = False, k8s component health check failed.
+    """
+    waiter = StaticPodRestartWaiter(target_component)
+    update_k8s_control_plane_components(
+        config_filename, cluster_host_addr, target_component=target_component)
+
+    LOG.debug('Waiting for kube-%s be online.', target_component)
+    return k8s_static_pod_health_check(
+        waiter, timeout=kwargs.get('timeout'), tries=kwargs.get('tries'),
+        try_sleep=kwargs.get('try_sleep'),
+        healthz_endpoint=get_control_plane_healthz_endpoint(target_component))
+
+
+def update_and_check_k8s_control_plane_components(
+        config_filename, cluster_host_addr, target_components, **kwargs):
+    """The function updates independent k8s control-plane components
+    concurrently, see update_and_check_k8s_control_plane_component.
+    Return:
+     - dict, health check result (True/False) per component.
+    """
+    if not target_components:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(target_components)) as executor:
+        futures = {
+            component: executor.submit(
+                update_and_check_k8s_control_plane_component,
+                config_filename, cluster_host_addr, component, **kwargs)
+            for component in target_components}
+    return {component: future.result() for component, future in futures.items()}
+
+
+def get_control_plane_fingerprint(cluster_cfg, cluster_host_addr, component):
+    """The function computes the fingerprint of the configuration the
+    static manifest of a control-plane component is generated from, that is,
+    the ClusterConfiguration without the sections of the other components
+    and the advertise address.
+    """
+    other_sections = [section for name, section in CONTROL_PLANE_SECTIONS.items()
+                      if name != component]
+    cfg = {key: value for key, value in cluster_cfg.items()
+           if key not in other_sections}
+    data = json.dumps([cluster_host_addr, cfg], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def get_applied_config_hash(cluster_cfg, kubelet_cfg, cluster_host_addr):
+    """The function computes the hash of the whole configuration applied by
+    this script: the ClusterConfiguration, the KubeletConfiguration built
+    from service-parameters and the advertise address.
+    """
+    data = json.dumps([cluster_host_addr, cluster_cfg, kubelet_cfg],
+                      sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def load_control_plane_fingerprints(fingerprints_file):
+    """The function loads the fingerprints of the configuration applied to
+    each control-plane component by the last successful update.
+    Return:
+     - dict, fingerprint per component, empty if unknown.
+    """
+    try:
+        with open(fingerprints_file, 'r') as file:
+            fingerprints = json.load(file)
+        if isinstance(fingerprints, dict):
+            return fingerprints
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        LOG.debug('Loading control-plane fingerprints: %s', e)
+    return {}
+
+
+def save_control_plane_fingerprints(fingerprints_file, fingerprints):
+    """The function saves the control-plane fingerprints.
+    Return:
+     - rc = 0, fingerprints saved.
+     - rc = 1, failed to save the fingerprints.
+    """
+    try:
+        _write_file_content(fingerprints_file, json.dumps(fingerprints, sort_keys=True))
+    except Exception as e:
+        LOG.error('Saving control-plane fingerprints: %s', e)
+        return 1
+    return 0
+
+
+def snapshot_control_plane_manifest(snapshot_dir, component):
+    """The function saves a byte-for-byte copy of the static pod manifest of
+    a healthy control-plane component, its last-known-good manifest.
+    Return:
+     - rc = 0, snapshot process successful.
+     - rc = 1, snapshot process failed.
+    """
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        _copy_file_content(get_control_plane_manifest(component),
+                           os.path.join(snapshot_dir, 'kube-{}.yaml'.format(component)))
+    except Exception as e:
+        LOG.error('Saving kube-%s last-known-good manifest. %s', component, e)
+        return 1
+    LOG.debug('Saved kube-%s last-known-good manifest.', component)
+    return 0
+
+
+def snapshot_healthy_control_plane_manifests(snapshot_dir, timeout):
+    """The function saves the last-known-good manifest of every healthy
+    control-plane component. The snapshots are refreshed on each run, so
+    they follow the manifests rewritten outside of this script, e.g. by
+    kubeadm upgrade. Each component is probed once.
+    """
+    endpoints = {get_control_plane_healthz_endpoint(component): component
+                 for component in CONTROL_PLANE_SECTIONS}
+    health = k8s_health_check_all(timeout=timeout, tries=1, try_sleep=0,
+                                  healthz_endpoints=list(endpoints))
+    for endpoint, is_healthy in health.items():
+        if is_healthy:
+            snapshot_control_plane_manifest(snapshot_dir, endpoints[endpoint])
 
 
 def pre_k8s_updating_tasks(post_tasks):
@@ -450,6 +1092,63 @@ def post_k8s_updating_tasks(post_tasks=None):
     LOG.debug('Running mandatory tasks after updating proccess has finished.')
 
 
+@timeline_stage('restore control-plane manifests', detail='components')
+def restore_k8s_control_plane_manifests(snapshot_dir, components, **kwargs):
+    """The function restores the last-known-good manifests of the failed
+    k8s control-plane components. The manifests are swapped atomically,
+    then the restarted components are checked concurrently.
+    Return:
+     - 0, There is no snapshot for some component, nothing was restored.
+     - 1, Snapshot manifests have been restored successfully.
+     - 2, Restore process has failed.
+    """
+    snapshots = {component: os.path.join(snapshot_dir, 'kube-{}.yaml'.format(component))
+                 for component in components}
+    missing = [component for component, snapshot in snapshots.items()
+               if not os.path.isfile(snapshot)]
+    if missing:
+        LOG.debug('No last-known-good manifest for %s.', ', '.join(missing))
+        return 0
+    LOG.debug('Restoring last-known-good manifests of %s', ', '.join(components))
+
+    tries = kwargs.get('tries')
+    try_sleep = kwargs.get('try_sleep')
+    timeout = kwargs.get('timeout')
+
+    # The update may have used all its time, restore within the reserved
+    # tail of the run
+    Deadline.release_reserve()
+
+    waiters = {component: StaticPodRestartWaiter(component) for component in components}
+    for component, snapshot in snapshots.items():
+        try:
+            _copy_file_content(snapshot, get_control_plane_manifest(component))
+        except Exception as e:
+            LOG.error('Restoring kube-%s manifest. %s', component, e)
+            return 2
+
+    if 'apiserver' in components:
+        post_k8s_updating_tasks(post_k8s_tasks)
+
+    # See restore_k8s_control_plane_config
+    if restart_kubelet_service() != 0:
+        return 2
+
+    with ThreadPoolExecutor(max_workers=len(components)) as executor:
+        futures = [
+            executor.submit(
+                k8s_static_pod_health_check, waiter, timeout=timeout,
+                tries=tries, try_sleep=try_sleep,
+                healthz_endpoint=get_control_plane_healthz_endpoint(component))
+            for component, waiter in waiters.items()]
+    if not all(future.result() for future in futures):
+        return 2
+
+    LOG.debug("Automatic k8s control-plane recovery completed successfully.")
+    return 1
+
+
+@timeline_stage('restore control-plane')
 def restore_k8s_control_plane_config(cluster_config_bak_file,
                                      cluster_host_addr, **kwargs):
     """The function restores the k8s control-plane configuration.
@@ -463,11 +1162,22 @@ def restore_k8s_control_plane_config(cluster_config_bak_file,
     tries = kwargs.get('tries')
     try_sleep = kwargs.get('try_sleep')
     timeout = kwargs.get('timeout')
+    fingerprints_file = kwargs.get('fingerprints_file')
+
+    # The update may have used all its time, restore within the reserved
+    # tail of the run
+    Deadline.release_reserve()
+
+    # The manifests are going to be generated from the backup configuration,
+    # so the next update must regenerate all of them.
+    if fingerprints_file:
+        _remove_file(fingerprints_file)
 
     # -------------------------------------------------------------------------
     # Restore kube-apiserver with backup configuration
     # -------------------------------------------------------------------------
     # First we need to restore apiserver with saved cluster_configuration
+    waiter = StaticPodRestartWaiter('apiserver')
     update_k8s_control_plane_components(
         cluster_config_bak_file, cluster_host_addr, target_component='apiserver')
 
@@ -483,34 +1193,36 @@ def restore_k8s_control_plane_config(cluster_config_bak_file,
         return 2
 
     # Wait for kube-apiserver to be up before executing next steps
-    k8s_apiserver_healthy = k8s_health_check(
-        timeout=timeout, try_sleep=try_sleep, tries=tries,
+    k8s_apiserver_healthy = k8s_static_pod_health_check(
+        waiter, timeout=timeout, try_sleep=try_sleep, tries=tries,
         healthz_endpoint=get_api_server_readyz_endpoint())
     if not k8s_apiserver_healthy:
         return 2
 
     # Restore controller_manager
+    waiter = StaticPodRestartWaiter('controller-manager')
     update_k8s_control_plane_components(
         cluster_config_bak_file, cluster_host_addr, target_component='controller-manager')
 
     if restart_kubelet_service() != 0:
         return 2
 
-    k8s_component_healthy = k8s_health_check(
-        timeout=timeout, try_sleep=try_sleep, tries=tries,
+    k8s_component_healthy = k8s_static_pod_health_check(
+        waiter, timeout=timeout, try_sleep=try_sleep, tries=tries,
         healthz_endpoint=CONTROLLER_MANAGER_HEALTHZ_ENDPOINT)
     if not k8s_component_healthy:
         return 2
 
     # Restore scheduler
+    waiter = StaticPodRestartWaiter('scheduler')
     update_k8s_control_plane_components(
         cluster_config_bak_file, cluster_host_addr, target_component='scheduler')
 
     if restart_kubelet_service() != 0:
         return 2
 
-    k8s_component_healthy = k8s_health_check(
-        timeout=timeout, try_sleep=try_sleep, tries=tries,
+    k8s_component_healthy = k8s_static_pod_health_check(
+        waiter, timeout=timeout, try_sleep=try_sleep, tries=tries,
         healthz_endpoint=SCHEDULER_HEALTHZ_ENDPOINT)
     if not k8s_component_healthy:
         return 2
@@ -519,6 +1231,7 @@ def restore_k8s_control_plane_config(cluster_config_bak_file,
     return 1
 
 
+@timeline_stage('restore kubelet')
 def restore_k8s_kubelet_config(config_bak_file, **kwargs):
     """The function restores the k8s kubelet configuration and updates the
     kubelet configmap with the backup configuration to keep it sync.
@@ -531,6 +1244,10 @@ def restore_k8s_kubelet_config(config_bak_file, **kwargs):
     timeout = kwargs.get('timeout')
     error_log_file = kwargs.get('error_log_file')
 
+    # The update may have used all its time, restore within the reserved
+    # tail of the run
+    Deadline.release_reserve()
+
     # Restore kubelet from backup configuration
     if update_k8s_kubelet(config_bak_file, error_log_file=error_log_file) != 0:
         is_k8s_kubelet_healthy = False
@@ -575,9 +1292,8 @@ def generates_kubeadm_config_file(
             try:
                 _cluster_cm_aux = get_k8s_configmap(
                     'kubeadm-config', namespace='kube-system')
-                cluster_cfg = yaml.load(
-                    _cluster_cm_aux.data['ClusterConfiguration'],
-                    Loader=yaml.RoundTripLoader)
+                cluster_cfg = k8s_yaml.get_configmap_document(
+                    _cluster_cm_aux, 'ClusterConfiguration', roundtrip=True)
             except Exception as e:
                 LOG.error('Getting cluster-config configmap: %s', e)
                 return 1
@@ -598,8 +1314,7 @@ def generates_kubeadm_config_file(
 
     # Intialize KubeletConfiguration
     try:
-        with open(kubelet_bak_config_file, 'r') as file:
-            bak_kubelet_cfg = yaml.load(file, Loader=yaml.RoundTripLoader)
+        bak_kubelet_cfg = k8s_yaml.load_file(kubelet_bak_config_file, roundtrip=True)
     except FileNotFoundError:
         LOG.error('Kubelet bak config file not found.')
         return 1
@@ -623,14 +1338,52 @@ def generates_kubeadm_config_file(
     # Updating kubeadm config file
     try:
         with open(kubeadm_config_file, 'a') as file:
-            yaml.dump(_kubelet_cfg, file, Dumper=yaml.RoundTripDumper,
-                      default_flow_style=False)
+            file.write(k8s_yaml.dump(_kubelet_cfg, roundtrip=True))
         return 0
     except Exception as e:
         LOG.error('Updating kubeadm config file with KubeletConfiguration: %s', e)
         return 1
 
 
+def load_hieradata(hieradata_file):
+    """The function loads the k8s entries of a hieradata file.
+    Only the top-level keys starting with HIERADATA_PREFIX are parsed,
+    the whole document is parsed if they can't be isolated. The result is
+    cached until the file changes.
+    Return:
+     - hieradata : dict
+    """
+    stat = os.stat(hieradata_file)
+    cache_key = (hieradata_file, stat.st_mtime_ns, stat.st_size)
+    hieradata = _hieradata_cache.get(cache_key)
+    if hieradata is not None:
+        return hieradata
+
+    with open(hieradata_file, 'r') as _hieradata:
+        text = _hieradata.read()
+    text = k8s_yaml.filter_top_level(
+        text, lambda key: key.startswith(HIERADATA_PREFIX))
+    if text is not None:
+        try:
+            hieradata = k8s_yaml.load(text) or {}
+        except Exception as e:
+            LOG.debug('Parsing filtered hieradata, loading the whole file. %s', e)
+    if hieradata is None:
+        hieradata = k8s_yaml.load_file(hieradata_file)
+
+    _hieradata_cache.clear()
+    _hieradata_cache[cache_key] = hieradata
+    return hieradata
+
+
+def _flatten_schema(schema):
+    """Auxiliary function to map legacy names to k8s names across all the
+    sections of a schema"""
+    return {legacy_name: name
+            for section in schema.values()
+            for legacy_name, name in section.items()}
+
+
 def get_service_parameters_from_hieradata(
         hieradata_file, apiserver_schema, controller_manager_schema,
         scheduler_schema, kubelet_schema, etcd_schema):
@@ -644,10 +1397,8 @@ def get_service_parameters_from_hieradata(
        Dictionary with k8s service parameters.
     """
     # pylint: disable-msg=too-many-arguments
-    # pylint: disable-msg=too-many-branches
     try:
-        with open(hieradata_file, 'r') as _hieradata:
-            hieradata = yaml.load(_hieradata, Loader=yaml.Loader)
+        hieradata = load_hieradata(hieradata_file)
     except Exception as e:
         LOG.error('ERROR loading hieradata. %s', e)
         raise
@@ -659,66 +1410,28 @@ def get_service_parameters_from_hieradata(
                       'schedulerVolumes': {}, 'kubeletVolumes': {},
                       'base': {}}
 
+    # translate from legacy to valid k8s format
+    translations = {
+        'apiServer': _flatten_schema(apiserver_schema),
+        'controllerManager': _flatten_schema(controller_manager_schema),
+        'scheduler': _flatten_schema(scheduler_schema),
+        'etcd': _flatten_schema(etcd_schema),
+        'kubelet': _flatten_schema(kubelet_schema),
+    }
+
     for param_key, value in hieradata.items():
-        if param_key.startswith(KUBE_APISERVER_TAG):
-            param_name = param_key.split(KUBE_APISERVER_TAG)[1]
-            # translate from legacy to valid k8s format
-            for sect in apiserver_schema.keys():
-                if param_name in apiserver_schema[sect].keys():
-                    param_name = apiserver_schema[sect][param_name]
-            service_params['apiServer'][param_name] = value
-
-        elif param_key.startswith(KUBE_APISERVER_VOLUMES_TAG):
-            param_name = param_key.split(KUBE_APISERVER_VOLUMES_TAG)[1]
-            service_params['apiServerVolumes'][param_name] = value
-
-        elif param_key.startswith(CONTROLLER_MANAGER_TAG):
-            param_name = param_key.split(CONTROLLER_MANAGER_TAG)[1]
-            # translate from legacy to valid k8s format
-            for sect in controller_manager_schema.keys():
-                if param_name in controller_manager_schema[sect].keys():
-                    param_name = controller_manager_schema[sect][param_name]
-            service_params['controllerManager'][param_name] = value
-
-        elif param_key.startswith(CONTROLLER_MANAGER_VOLUMES_TAG):
-            param_name = param_key.split(CONTROLLER_MANAGER_VOLUMES_TAG)[1]
-            service_params['controllerManagerVolumes'][param_name] = value
-
-        elif param_key.startswith(SCHEDULER_TAG):
-            param_name = param_key.split(SCHEDULER_TAG)[1]
-            # translate from legacy to valid k8s format
-            for sect in scheduler_schema.keys():
-                if param_name in scheduler_schema[sect].keys():
-                    param_name = scheduler_schema[sect][param_name]
-            service_params['scheduler'][param_name] = value
-
-        elif param_key.startswith(SCHEDULER_VOLUMES_TAG):
-            param_name = param_key.split(SCHEDULER_VOLUMES_TAG)[1]
-            service_params['schedulerVolumes'][param_name] = value
-
-        elif param_key.startswith(ETCD_TAG):
-            param_name = param_key.split(DEFAULT_TAG)[1]
-            # translate from legacy to valid k8s format
-            for sect in etcd_schema.keys():
-                if param_name in etcd_schema[sect].keys():
-                    param_name = etcd_schema[sect][param_name]
-            service_params['etcd'][param_name] = value
-
-        elif param_key.startswith(CONFIG_TAG):
-            param_name = param_key.split(CONFIG_TAG)[1]
-            service_params['config'][param_name] = value
-
-        elif param_key.startswith(KUBELET_TAG):
-            param_name = param_key.split(KUBELET_TAG)[1]
-            # translate from legacy to valid k8s format
-            for sect in kubelet_schema.keys():
-                if param_name in kubelet_schema[sect].keys():
-                    param_name = kubelet_schema[sect][param_name]
-            service_params['kubelet'][param_name] = value
-
-        elif param_key.startswith(DEFAULT_TAG):
-            param_name = param_key.split(DEFAULT_TAG)[1]
-            service_params['base'][param_name] = value
+        match = SERVICE_PARAMETERS_RE.match(param_key)
+        if not match:
+            continue
+        section = SERVICE_PARAMETERS_ROUTES[match.lastindex - 1][1]
+        if section == 'etcd':
+            # etcd parameters keep their 'etcd_' prefix
+            param_name = param_key[len(DEFAULT_TAG):]
+        else:
+            param_name = param_key[match.end():]
+        if section in translations:
+            param_name = translations[section].get(param_name, param_name)
+        service_params[section][param_name] = value
 
     return service_params
 
@@ -778,73 +1491,125 @@ def get_kubelet_cfg_from_service_parameters(service_params):
     return kubelet_cfg
 
 
-def get_k8s_version(timeout=None, tries=None, try_sleep=None):
-    """The function gets the k8s version using the kubernetes API.
+def _retry_k8s_api_call(func, description,
+                        timeout=None, tries=None, try_sleep=None, deadline=None):
+    """Auxiliary function to call the k8s API until it succeeds.
+    func takes the timeout of its request, see Deadline.call.
+    Each call is limited to timeout seconds, retries use exponential
+    backoff with jitter, capped at try_sleep, and stop at the deadline.
     Return:
-     - k8s_version : str or False.
-       str: returning k8s_version value.
-       False: k8s version get process failed.
+     - the result of func.
+     - False, all the tries failed.
     """
     timeout = RECOVERY_TIMEOUT if timeout is None else timeout
     tries = RECOVERY_TRIES if tries is None else tries
     try_sleep = RECOVERY_TRY_SLEEP if try_sleep is None else try_sleep
+    deadline = Deadline.operation() if deadline is None else deadline
+
+    def _call():
+        Timeline.count('api_calls')
+        return deadline.call(func, timeout)
+
     try:
-        return get_kube_operator().kube_get_kubernetes_version()
+        return _call()
     except Exception:
         _tries = tries
-        LOG.debug('Retrying to get k8s version ...')
-        while _tries:
-            time.sleep(try_sleep)
+        delays = _backoff_delays(try_sleep)
+        LOG.debug('Retrying to get %s ...', description)
+        while _tries and deadline.sleep(next(delays)):
             try:
-                with time_limit(timeout):
-                    try:
-                        return get_kube_operator().kube_get_kubernetes_version()
-                    except Exception:
-                        pass
-            except TimeoutException:
+                return _call()
+            except Exception:
                 pass
             _tries -= 1
             LOG.debug("Remaining tries: %s.", _tries)
-        LOG.error('Getting k8s version.')
+        LOG.error('Getting %s.', description)
         return False
 
 
+def get_k8s_version(timeout=None, tries=None, try_sleep=None, deadline=None):
+    """The function gets the k8s version using the kubernetes API.
+    Return:
+     - k8s_version : str or False.
+       str: returning k8s_version value.
+       False: k8s version get process failed.
+    """
+    # The KubeOperator call takes no timeout, it is bounded from a thread
+    return _retry_k8s_api_call(
+        lambda request_timeout: Deadline(request_timeout).call_in_thread(
+            lambda: get_kube_operator().kube_get_kubernetes_version()),
+        'k8s version', timeout=timeout, tries=tries, try_sleep=try_sleep,
+        deadline=deadline)
+
+
+def _read_k8s_configmap(configmap, namespace, request_timeout):
+    """Auxiliary function to read a configmap within request_timeout
+    seconds. Returns None if it does not exist, as
+    KubeOperator.kube_read_config_map."""
+    try:
+        return get_k8s_core_client().read_namespaced_config_map(
+            configmap, namespace, _request_timeout=request_timeout)
+    except ApiException as e:
+        if e.status == 404:
+            return None
+        raise
+
+
 def get_k8s_configmap(configmap, namespace='kube-system',
-                      timeout=None, tries=None, try_sleep=None):
+                      timeout=None, tries=None, try_sleep=None, deadline=None):
     """The function gets a configmap from k8s API.
+    The configmap is served from cache for CONFIGMAP_CACHE_TTL seconds.
     Return:
-     - k8s configmap : str or False.
+     - k8s configmap : str, None or False.
        str: returning k8s configmap.
+       None: k8s configmap does not exist.
        False: k8s configmap get process failed.
     """
-    timeout = RECOVERY_TIMEOUT if timeout is None else timeout
-    tries = RECOVERY_TRIES if tries is None else tries
-    try_sleep = RECOVERY_TRY_SLEEP if try_sleep is None else try_sleep
-    try:
-        return get_kube_operator().kube_read_config_map(
-            name=configmap, namespace=namespace)
-    except Exception:
-        _tries = tries
-        LOG.debug('Retrying to get k8s configmap %s', configmap)
-        while _tries:
-            time.sleep(try_sleep)
-            try:
-                with time_limit(timeout):
-                    try:
-                        k8s_configmap = \
-                            get_kube_operator().kube_read_config_map(
-                                name=configmap, namespace=namespace)
-                        return k8s_configmap
-                    except Exception:
-                        pass
-            except TimeoutException:
-                pass
-            _tries -= 1
-            LOG.debug("Remaining tries: %s.", _tries)
-        LOG.error('Getting k8s configmap %s', configmap)
+    key = (namespace, configmap)
+    with _configmap_cache_lock:
+        cached = _configmap_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+    k8s_configmap = _retry_k8s_api_call(
+        functools.partial(_read_k8s_configmap, configmap, namespace),
+        'k8s configmap %s' % configmap,
+        timeout=timeout, tries=tries, try_sleep=try_sleep, deadline=deadline)
+    if k8s_configmap is False:
+        return False
+
+    with _configmap_cache_lock:
+        _configmap_cache[key] = (time.monotonic() + CONFIGMAP_CACHE_TTL, k8s_configmap)
+    return k8s_configmap
+
+
+def get_k8s_configmaps(configmaps, namespace='kube-system',
+                       timeout=None, tries=None, try_sleep=None, deadline=None):
+    """The function gets several configmaps of a namespace from k8s API.
+    Only the named configmaps are read, concurrently (see
+    get_k8s_configmap).
+    Return:
+     - dict, k8s configmap per name, None if it does not exist.
+     - False, k8s configmaps get process failed.
+    """
+    configmaps = list(configmaps)
+    if not configmaps:
+        return {}
+
+    def _get(configmap):
+        return get_k8s_configmap(
+            configmap, namespace=namespace,
+            timeout=timeout, tries=tries, try_sleep=try_sleep, deadline=deadline)
+
+    workers = min(len(configmaps), MAX_CONFIGMAP_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        result = dict(zip(configmaps, executor.map(_get, configmaps)))
+    if any(k8s_configmap is False for k8s_configmap in result.values()):
         return False
+    return result
 
 
+@timeline_stage('configmap sync kubelet-config')
 def update_kubelet_configmap(latest_config, is_controller_active):
     """The function updates the k8s configmap for kubelet component on the active controller.
     Return:
@@ -855,30 +1620,43 @@ def update_kubelet_configmap(latest_config, is_controller_active):
         LOG.debug('Skipping kubelet configmap update on non-active controller')
         return 0
 
+    namespace = 'kube-system'
+    configmap_name = 'kubelet-config'
+
+    # skip the update if the configmap already has the latest applied config
+    current_kubelet_configmap = get_k8s_configmap(configmap_name, namespace=namespace)
+    if current_kubelet_configmap and \
+            (current_kubelet_configmap.data or {}).get('kubelet') == \
+            _read_file_content(latest_config):
+        LOG.debug('Kubelet configmap is up to date')
+        return 0
+
     LOG.debug('Updating kubelet configmap')
 
-    namespace = 'kube-system'
     k8s_version = get_k8s_version()
     if not k8s_version:
         return 1
-    configmap_name = 'kubelet-config'
 
     # delete current kubelet configmap
     try:
         current_kubelet_configmap = get_k8s_configmap(
             configmap_name, namespace=namespace)
         if current_kubelet_configmap:
+            Timeline.count('api_calls')
             get_kube_operator().kube_delete_config_map(
                 name=configmap_name, namespace=namespace)
+            invalidate_k8s_configmap_cache(namespace)
     except Exception as e:
         LOG.error('Deleting current kubelet confimap: %s', e)
         return 1
 
     # create new kubelet configmap from latest applied config
     try:
+        Timeline.count('api_calls')
         get_kube_operator().kube_create_config_map_from_file(
             namespace, configmap_name, latest_config,
             data_section_name='kubelet')
+        invalidate_k8s_configmap_cache(namespace)
     except Exception as e:
         LOG.error('Creating new kubelet confimap: %s', e)
         return 1
@@ -908,6 +1686,65 @@ def update_kubelet_bak_config_files(
     return 0
 
 
+def _load_yaml_documents(file_path):
+    """Auxiliary function to load all the documents of a YAML file"""
+    with open(file_path, 'r') as file:
+        return k8s_yaml.load_all(file.read())
+
+
+def get_kubelet_config_changes(new_kubelet_cfg, kubelet_config_file,
+                               kubeadm_kubelet_config_bak_file):
+    """The function compares the KubeletConfiguration built from
+    service-parameters with the configuration kubelet is running.
+    The changes can be written straight to the kubelet configuration file
+    only if all of them are parameters already present in that file and no
+    parameter was removed since the last update (kubeadm would reset it
+    to its default value).
+    Return:
+     - (changes, needs_kubeadm)
+       changes: dict with the parameters whose value differs.
+       needs_kubeadm: True if kubeadm must regenerate the configuration.
+    """
+    try:
+        current_cfg = _load_yaml_documents(kubelet_config_file)[0]
+        previous_cfg = next(
+            (doc for doc in _load_yaml_documents(kubeadm_kubelet_config_bak_file)
+             if doc.get('kind') == 'KubeletConfiguration'), None)
+    except Exception as e:
+        LOG.debug('Loading kubelet configuration: %s', e)
+        return dict(new_kubelet_cfg), True
+
+    changes = {param: value for param, value in new_kubelet_cfg.items()
+               if current_cfg.get(param) != value}
+    if previous_cfg is None:
+        return changes, True
+    removed = set(previous_cfg) - set(new_kubelet_cfg) - {'kind', 'apiVersion'}
+    if removed:
+        LOG.debug('Kubelet parameters removed: %s', sorted(removed))
+    unknown = [param for param in changes if param not in current_cfg]
+    return changes, bool(removed or unknown)
+
+
+@timeline_stage('kubelet apply changes')
+def apply_kubelet_config_changes(kubelet_config_file, changes):
+    """The function writes changed parameters to the kubelet configuration
+    file and restarts kubelet, without regenerating the file with kubeadm.
+    Return:
+     - rc = 0, update process successful.
+     - rc = 1, update process failed.
+    """
+    LOG.debug('Applying kubelet parameters %s ...', sorted(changes))
+    try:
+        kubelet_config = k8s_yaml.load_file(kubelet_config_file, roundtrip=True)
+        kubelet_config.update(changes)
+        _write_file_content(kubelet_config_file,
+                            k8s_yaml.dump(kubelet_config, roundtrip=True))
+    except Exception as e:
+        LOG.error('Updating kubelet config file: %s', e)
+        return 1
+    return restart_kubelet_service()
+
+
 def restart_kubelet_service():
     """Restart Kubelet Service
     Return:
@@ -936,33 +1773,30 @@ def _validate_admission_plugins(custom_plugins):
     return custom_plugins
 
 
-def _check_if_configmap_exist(
-        configmap_name, tries=RECOVERY_TRIES, try_sleep=RECOVERY_TRY_SLEEP):
-    msg = 'Checking if configmap exists [%s].' % (configmap_name)
-    LOG.debug(msg)
-    while tries:
-        try:
-            configmap_exists = get_k8s_configmap(configmap_name)
-            if configmap_exists:
-                LOG.debug('Configmap exists, skipping.')
-                return True
-            if configmap_exists is None:
-                LOG.debug('Configmap does not exist.')
-                return False
-        except Exception as e:
-            msg = "Checking configmap [%s]: %s" % (tries, e)
-            LOG.error(msg)
-            tries -= 1
-            time.sleep(try_sleep)
-    raise Exception("Failed to check if configmap exists.")
+def _create_volume_configmap(configmap_name, hostPath):
+    """Auxiliary function to create the configmap of an extra volume from
+    its host file"""
+    LOG.debug('Creating configmap %s ...', configmap_name)
+    try:
+        cmd = ["kubectl", "--kubeconfig=/etc/kubernetes/admin.conf",
+               "create", "configmap", "-n", "kube-system",
+               configmap_name, "--from-file", hostPath]
+        _ = _exec_cmd(cmd)
+    except Exception as exc:
+        LOG.error('Creating configmap: %s', exc)
+        raise
 
 
+@timeline_stage('configmap init')
 def initialize_k8s_configmaps(
         hieradata_file, k8s_configmaps_init_flag,
         apiserver_schema, controller_manager_schema,
         scheduler_schema, kubelet_schema, etcd_schema):
     """The function ensures the k8s configmap exists for all the
     extra-volumes service parameters.
+    The configmaps of the volumes of all the components are read by name,
+    concurrently and through the configmap cache (see get_k8s_configmaps),
+    and the missing ones are created concurrently.
     """
     # pylint: disable-msg=too-many-locals
     # pylint: disable-msg=too-many-arguments
@@ -978,6 +1812,7 @@ def initialize_k8s_configmaps(
         hieradata_file, apiserver_schema, controller_manager_schema,
         scheduler_schema, kubelet_schema, etcd_schema)
 
+    volumes = {}
     for kubeadm_section in sysinv_k8s_sections:
         for param_name, value in service_params[kubeadm_section].items():
             volume, _ = sp.parse_volume_string_to_dict({'name': param_name, 'value': value})
@@ -993,37 +1828,42 @@ def initialize_k8s_configmaps(
             # hostPath is an optional value in 22.06
             hostPath = volume.get('hostPath', mounthPath)
             volume['section'] = sysinv_k8s_sections.get(kubeadm_section)
-            configmap_name = sp.get_k8s_configmap_name(volume)
-
-            # verify if configmap exists
-            configmap_exists = _check_if_configmap_exist(configmap_name)
-            if configmap_exists:
-                continue
-
-            # verifying configuration file
-            if not os.path.isfile(hostPath):
-                msg = ("File not found: %s" % (hostPath))
-                LOG.error(msg)
-                raise ValueError(msg)
+            volumes[sp.get_k8s_configmap_name(volume)] = hostPath
+
+    # verify which configmaps exist
+    LOG.debug('Checking if configmaps exist %s.' % (list(volumes)))
+    configmaps = get_k8s_configmaps(list(volumes))
+    if configmaps is False:
+        raise Exception("Failed to check if configmap exists.")
+
+    missing_volumes = [(configmap_name, hostPath)
+                       for configmap_name, hostPath in volumes.items()
+                       if configmaps[configmap_name] is None]
+
+    for _, hostPath in missing_volumes:
+        # verifying configuration file
+        if not os.path.isfile(hostPath):
+            msg = ("File not found: %s" % (hostPath))
+            LOG.error(msg)
+            raise ValueError(msg)
 
-            # Updating kubeadm config file
-            try:
-                with open(hostPath, 'r'):
-                    pass
-            except Exception as e:
-                LOG.error('Loading config file: %s. %s' % (hostPath, e))
-                raise
+        # Updating kubeadm config file
+        try:
+            with open(hostPath, 'r'):
+                pass
+        except Exception as e:
+            LOG.error('Loading config file: %s. %s' % (hostPath, e))
+            raise
 
-            # create configmap
-            LOG.debug('Creating configmap ...')
-            try:
-                cmd = ["kubectl", "--kubeconfig=/etc/kubernetes/admin.conf",
-                       "create", "configmap", "-n", "kube-system",
-                       configmap_name, "--from-file", hostPath]
-                _ = _exec_cmd(cmd)
-            except Exception as exc:
-                LOG.error('Creating configmap: %s' % (exc))
-                raise
+    # create configmaps
+    if missing_volumes:
+        workers = min(len(missing_volumes), MAX_CONFIGMAP_WORKERS)
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(lambda volume: _create_volume_configmap(*volume),
+                                  missing_volumes))
+        finally:
+            invalidate_k8s_configmap_cache('kube-system')
 
     # create k8s_configmaps_init flag
     try:
@@ -1207,6 +2047,10 @@ def main():
     parser.add_argument("--kubeadm_cm_bak_file", default="configmap.yaml")
     parser.add_argument("--cluster_config_file", default="/tmp/cluster_config.yaml")
     parser.add_argument("--cluster_config_bak_file", default="cluster_config.yaml")
+    parser.add_argument("--control_plane_fingerprints_file",
+                        default="control_plane_fingerprints.json")
+    parser.add_argument("--applied_config_hash_file", default="applied_config.sha256")
+    parser.add_argument("--manifests_snapshot_dir", default="manifests")
     parser.add_argument("--kubeadm_kubelet_config_file", default="/tmp/kubeadm_kubelet_config.yaml")
     parser.add_argument("--kubeadm_kubelet_config_bak_file",
                         default="/etc/kubernetes/backup/kubeadm_kubelet_config.yaml")
@@ -1220,6 +2064,8 @@ def main():
     parser.add_argument("--timeout", default=RECOVERY_TIMEOUT)
     parser.add_argument("--tries", default=RECOVERY_TRIES)
     parser.add_argument("--try_sleep", default=RECOVERY_TRY_SLEEP)
+    parser.add_argument("--update_timeout", type=float, default=UPDATE_TIMEOUT)
+    parser.add_argument("--restore_timeout", type=float, default=RESTORE_TIMEOUT)
 
     parser.add_argument("--etcd_cafile", default='')
     parser.add_argument("--etcd_certfile", default='')
@@ -1236,6 +2082,9 @@ def main():
     kubeadm_cm_bak_file = os.path.join(args.backup_path, args.kubeadm_cm_bak_file)
     cluster_config_file = args.cluster_config_file
     cluster_config_bak_file = os.path.join(args.backup_path, args.cluster_config_bak_file)
+    fingerprints_file = os.path.join(args.backup_path, args.control_plane_fingerprints_file)
+    applied_config_hash_file = os.path.join(args.backup_path, args.applied_config_hash_file)
+    manifests_snapshot_dir = os.path.join(args.backup_path, args.manifests_snapshot_dir)
 
     kubeadm_kubelet_config_file = args.kubeadm_kubelet_config_file
     kubeadm_kubelet_config_bak_file = args.kubeadm_kubelet_config_bak_file
@@ -1259,6 +2108,11 @@ def main():
 
     rc = 2
 
+    # All the retries and health checks of the run share one deadline, the
+    # last restore_timeout seconds of it are kept for the restores
+    Deadline.set_budget(args.update_timeout + args.restore_timeout,
+                        reserve=args.restore_timeout)
+
     # -----------------------------------------------------------------------------
     # Backup k8s cluster and kubelet configuration
     # -----------------------------------------------------------------------------
@@ -1268,31 +2122,36 @@ def main():
         timeout=timeout, try_sleep=try_sleep, tries=tries,
         healthz_endpoint=get_api_server_readyz_endpoint())
 
-    # K8s control-plane backup config files
-    if not os.path.isfile(kubeadm_cm_bak_file) or\
-            not os.path.isfile(cluster_config_bak_file):
-        LOG.debug("No backup files founded for K8s control-plane components.")
+    with Timeline.stage('backup'):
+        # K8s control-plane backup config files
+        if not os.path.isfile(kubeadm_cm_bak_file) or\
+                not os.path.isfile(cluster_config_bak_file):
+            LOG.debug("No backup files founded for K8s control-plane components.")
+            if is_k8s_apiserver_up:
+                LOG.debug("Creating backup from current k8s config.")
+                export_k8s_kubeadm_configmap(kubeadm_cm_bak_file)
+                export_k8s_cluster_configuration(cluster_config_bak_file)
+            else:
+                msg = "Apiserver is down and there is not backup file."
+                LOG.error(msg)
+                return 2
+
+        # Last-known-good manifests of the control-plane components
         if is_k8s_apiserver_up:
-            LOG.debug("Creating backup from current k8s config.")
-            export_k8s_kubeadm_configmap(kubeadm_cm_bak_file)
-            export_k8s_cluster_configuration(cluster_config_bak_file)
-        else:
-            msg = "Apiserver is down and there is not backup file."
-            LOG.error(msg)
-            return 2
+            snapshot_healthy_control_plane_manifests(manifests_snapshot_dir, timeout)
 
-    # Kubeadm with Kubelet backup config file
-    if not os.path.isfile(kubeadm_kubelet_config_bak_file):
-        LOG.debug("No backup file founded for Kubelet.")
-        try:
-            shutil.copyfile(kubelet_latest_config_file, kubelet_bak_config_file)
-        except Exception as e:
-            LOG.error('Creating kubelet bak config file. %s', e)
-            return 3
-        if generates_kubeadm_config_file(
-                kubeadm_config_file=kubeadm_kubelet_config_bak_file,
-                kubelet_bak_config_file=kubelet_bak_config_file) != 0:
-            return 3
+        # Kubeadm with Kubelet backup config file
+        if not os.path.isfile(kubeadm_kubelet_config_bak_file):
+            LOG.debug("No backup file founded for Kubelet.")
+            try:
+                shutil.copyfile(kubelet_latest_config_file, kubelet_bak_config_file)
+            except Exception as e:
+                LOG.error('Creating kubelet bak config file. %s', e)
+                return 3
+            if generates_kubeadm_config_file(
+                    kubeadm_config_file=kubeadm_kubelet_config_bak_file,
+                    kubelet_bak_config_file=kubelet_bak_config_file) != 0:
+                return 3
 
     # -----------------------------------------------------------------------------
     # Initialize k8s configmaps
@@ -1310,10 +2169,9 @@ def main():
     if not cluster_cfg:
         LOG.debug('Loading cluster_cfg from bak file.')
         try:
-            with open(kubeadm_cm_bak_file, 'r') as file:
-                _kubeadm_cfg = yaml.load(file, Loader=yaml.RoundTripLoader)
-                cluster_cfg = yaml.load(_kubeadm_cfg['data']['ClusterConfiguration'],
-                                        Loader=yaml.RoundTripLoader)
+            _kubeadm_cfg = k8s_yaml.load_file(kubeadm_cm_bak_file)
+            cluster_cfg = k8s_yaml.get_configmap_document(
+                _kubeadm_cfg, 'ClusterConfiguration', roundtrip=True)
         except Exception as e:
             msg = str('Loading cluster_cfg from bak file. {}'.format(e))
             LOG.error(msg)
@@ -1375,6 +2233,9 @@ def main():
     filter_extra_args(cluster_cfg['apiServer'], service_params['apiServer'])
 
     # apiserver_volumes section
+    # The configmaps of the volumes of all the components are exported
+    # together once the sections are built
+    volumes = []
     if cluster_cfg['apiServer'] and 'extraVolumes' in cluster_cfg['apiServer']:
         cluster_cfg['apiServer'].pop('extraVolumes')
     for param, value in service_params['apiServerVolumes'].items():
@@ -1382,9 +2243,7 @@ def main():
             cluster_cfg['apiServer']['extraVolumes'] = []
         volume_dict, _ = sp.parse_volume_string_to_dict({'name': param, 'value': value})
         cluster_cfg['apiServer']['extraVolumes'].append(volume_dict)
-        if export_volume_configmap(volume_dict, 'kube_apiserver_volumes') != 0:
-            LOG.error('Exporting configmap from volume: %s', str(volume_dict))
-            return 3
+        volumes.append((volume_dict, 'kube_apiserver_volumes'))
 
     # controller manager section --------------------------------------------------
     for param, value in service_params['controllerManager'].items():
@@ -1412,9 +2271,7 @@ def main():
             cluster_cfg['controllerManager']['extraVolumes'] = []
         volume_dict, _ = sp.parse_volume_string_to_dict({'name': param, 'value': value})
         cluster_cfg['controllerManager']['extraVolumes'].append(volume_dict)
-        if export_volume_configmap(volume_dict, 'kube_controller_manager_volumes') != 0:
-            LOG.error('Exporting configmap from volume: %s', str(volume_dict))
-            return 3
+        volumes.append((volume_dict, 'kube_controller_manager_volumes'))
 
     # scheduler section -----------------------------------------------------------
     for param, value in service_params['scheduler'].items():
@@ -1438,9 +2295,7 @@ def main():
             cluster_cfg['scheduler']['extraVolumes'] = []
         volume_dict, _ = sp.parse_volume_string_to_dict({'name': param, 'value': value})
         cluster_cfg['scheduler']['extraVolumes'].append(volume_dict)
-        if export_volume_configmap(volume_dict, 'kube_scheduler_volumes') != 0:
-            LOG.error('Exporting configmap from volume: %s', str(volume_dict))
-            return 3
+        volumes.append((volume_dict, 'kube_scheduler_volumes'))
 
     # etcd section ----------------------------------------------------------------
     for param, value in service_params['etcd'].items():
@@ -1461,98 +2316,150 @@ def main():
             else:
                 cluster_cfg['etcd']['external'][param] = value
 
+    # Export the volume configmaps to their host files
+    if export_volume_configmaps(volumes) != 0:
+        LOG.error('Exporting configmaps from volumes: %s', str(volumes))
+        return 3
+
     # Export the updated k8s cluster configuration
     if export_k8s_cluster_configuration(cluster_config_file, cluster_cfg) != 0:
         LOG.error('Exporting k8s cluster configuration.')
         return 3
 
+    # Building kubelet_cfg from service-parameters (hieradata)
+    kubelet_cfg = get_kubelet_cfg_from_service_parameters(service_params)
+    if not isinstance(kubelet_cfg, dict):
+        return 3
+
     # -----------------------------------------------------------------------------
-    # Update k8s kube-apiserver
+    # Skip the update if this configuration is already applied
     # -----------------------------------------------------------------------------
-    update_k8s_control_plane_components(
-        cluster_config_file, cluster_host_addr, target_component='apiserver')
-
-    # Wait for kube-apiserver to be up before executing next steps
-    is_k8s_apiserver_healthy = k8s_health_check(
-        timeout=timeout, try_sleep=try_sleep, tries=tries,
-        healthz_endpoint=get_api_server_readyz_endpoint())
+    # Puppet runs this script on every kubernetes manifest apply. When the
+    # configuration matches the last successful update, kubeadm and the
+    # health checks are skipped and only the configmaps are synced.
+    applied_config_hash = get_applied_config_hash(cluster_cfg, kubelet_cfg, cluster_host_addr)
+    if _read_file_content(applied_config_hash_file) == applied_config_hash and \
+            all(os.path.isfile(os.path.join(K8S_MANIFESTS_DIR, 'kube-{}.yaml'.format(component)))
+                for component in CONTROL_PLANE_SECTIONS):
+        LOG.debug('Configuration already applied, syncing configmaps only.')
+        update_kubelet_configmap(kubelet_latest_config_file, is_controller_active)
+        if patch_kubeadmin_configmap(cluster_cfg, is_controller_active) != 0:
+            LOG.error('Updating kubeadm-config configmap.')
+            return 3
+        LOG.debug("Successfully Updated.")
+        return 0
 
-    # Check kube-apiserver health, then backup and restore
-    if automatic_recovery:
-        if not is_k8s_apiserver_healthy:
-            LOG.debug('kube-apiserver is not responding, intializing restore.')
-            restore_rc = restore_k8s_control_plane_config(
-                cluster_config_bak_file, cluster_host_addr,
-                tries=tries, try_sleep=try_sleep, timeout=timeout)
-            if restore_rc == 2:
-                LOG.error("kube-apiserver has failed to start using backup configuration.")
-                return 2
-            if restore_rc == 1:
-                return 1
+    # The hash is written back once the update finished successfully
+    _remove_file(applied_config_hash_file)
 
-    # Run mandatory tasks after the update proccess has finished
-    post_k8s_updating_tasks(post_k8s_tasks)
+    # -----------------------------------------------------------------------------
+    # Detect the control-plane components whose configuration changed
+    # -----------------------------------------------------------------------------
+    # Only the components whose configuration changed since the last
+    # successful update get a new manifest, the others are not restarted.
+    # The fingerprint of a changed component is dropped before its manifest
+    # is written, so an interrupted update is retried on the next run.
+    fingerprints = load_control_plane_fingerprints(fingerprints_file)
+    new_fingerprints = {
+        component: get_control_plane_fingerprint(cluster_cfg, cluster_host_addr, component)
+        for component in CONTROL_PLANE_SECTIONS}
+    changed_components = [
+        component for component, fingerprint in new_fingerprints.items()
+        if fingerprints.get(component) != fingerprint or
+        not os.path.isfile(get_control_plane_manifest(component))]
+    LOG.debug('Control-plane components to update: %s', changed_components)
+    for component in changed_components:
+        fingerprints.pop(component, None)
+    save_control_plane_fingerprints(fingerprints_file, fingerprints)
 
     # -----------------------------------------------------------------------------
-    # Update k8s kube-controller-manager
+    # Update k8s kube-apiserver
     # -----------------------------------------------------------------------------
-    update_k8s_control_plane_components(
-        cluster_config_file, cluster_host_addr, target_component='controller-manager')
+    is_k8s_apiserver_updated = False
+    if 'apiserver' in changed_components:
+        # Wait for kube-apiserver to be up before executing next steps
+        is_k8s_apiserver_healthy = update_and_check_k8s_control_plane_component(
+            cluster_config_file, cluster_host_addr, 'apiserver',
+            tries=tries, try_sleep=try_sleep, timeout=timeout)
 
-    # Wait for controller-manager to be up
-    is_k8s_component_healthy = k8s_health_check(
-        timeout=timeout, try_sleep=try_sleep, tries=tries,
-        healthz_endpoint=CONTROLLER_MANAGER_HEALTHZ_ENDPOINT)
+        # Check kube-apiserver health, then backup and restore
+        if automatic_recovery:
+            if not is_k8s_apiserver_healthy:
+                LOG.debug('kube-apiserver is not responding, intializing restore.')
+                restore_rc = restore_k8s_control_plane_manifests(
+                    manifests_snapshot_dir, ['apiserver'],
+                    tries=tries, try_sleep=try_sleep, timeout=timeout)
+                # No last-known-good manifest or it did not come back up,
+                # fall back to the backup configuration
+                if restore_rc in (0, 2):
+                    restore_rc = restore_k8s_control_plane_config(
+                        cluster_config_bak_file, cluster_host_addr,
+                        tries=tries, try_sleep=try_sleep, timeout=timeout,
+                        fingerprints_file=fingerprints_file)
+                if restore_rc == 2:
+                    LOG.error("kube-apiserver has failed to start using backup configuration.")
+                    return 2
+                if restore_rc == 1:
+                    return 1
+
+        if is_k8s_apiserver_healthy:
+            fingerprints['apiserver'] = new_fingerprints['apiserver']
+            save_control_plane_fingerprints(fingerprints_file, fingerprints)
+            is_k8s_apiserver_updated = True
 
-    # Check kube-controller-manager health, then backup and restore
-    if automatic_recovery:
-        if not is_k8s_component_healthy:
-            LOG.debug('kube-controller-manager is not responding, intializing restore.')
-            restore_rc = restore_k8s_control_plane_config(
-                cluster_config_bak_file, cluster_host_addr,
-                tries=tries, try_sleep=try_sleep, timeout=timeout)
+    # Run mandatory tasks after the update proccess has finished
+    post_k8s_updating_tasks(post_k8s_tasks)
 
-            if restore_rc == 2:
-                msg = "kube-controller-manager has failed to start " +\
-                      "using backup configuration."
-                LOG.error(msg)
-                return 2
-            if restore_rc == 1:
-                return 1
+    # The last-known-good manifest is saved once the post tasks edited it
+    if is_k8s_apiserver_updated:
+        snapshot_control_plane_manifest(manifests_snapshot_dir, 'apiserver')
 
     # -----------------------------------------------------------------------------
-    # Update k8s kube-scheduler
+    # Update k8s kube-controller-manager and kube-scheduler
     # -----------------------------------------------------------------------------
-    update_k8s_control_plane_components(
-        cluster_config_file, cluster_host_addr, target_component='scheduler')
-
-    # Wait for scheduler to be up
-    LOG.debug('Waiting for kube-scheduler be online.')
-    is_k8s_component_healthy = k8s_health_check(
-        timeout=timeout, try_sleep=try_sleep, tries=tries,
-        healthz_endpoint=SCHEDULER_HEALTHZ_ENDPOINT)
-
-    # Check kube-scheduler health, then backup and restore
-    if automatic_recovery:
-        if not is_k8s_component_healthy:
-            LOG.debug('kube-scheduler is not responding, intializing restore.')
+    # Both components only depend on kube-apiserver, their manifests are
+    # generated and their pods restarted concurrently.
+    target_components = [component for component in ('controller-manager', 'scheduler')
+                         if component in changed_components]
+    components_health = update_and_check_k8s_control_plane_components(
+        cluster_config_file, cluster_host_addr, target_components,
+        tries=tries, try_sleep=try_sleep, timeout=timeout)
+
+    for component, is_k8s_component_healthy in components_health.items():
+        if is_k8s_component_healthy:
+            fingerprints[component] = new_fingerprints[component]
+            snapshot_control_plane_manifest(manifests_snapshot_dir, component)
+    if components_health:
+        save_control_plane_fingerprints(fingerprints_file, fingerprints)
+
+    # Check kube-controller-manager and kube-scheduler health, then backup
+    # and restore
+    failed_components = [component for component, is_k8s_component_healthy
+                         in components_health.items() if not is_k8s_component_healthy]
+    if automatic_recovery and failed_components:
+        components = ', '.join('kube-' + component for component in failed_components)
+        LOG.debug('%s not responding, intializing restore.', components)
+        restore_rc = restore_k8s_control_plane_manifests(
+            manifests_snapshot_dir, failed_components,
+            tries=tries, try_sleep=try_sleep, timeout=timeout)
+        # No last-known-good manifests or they did not come back up, fall
+        # back to the backup configuration
+        if restore_rc in (0, 2):
             restore_rc = restore_k8s_control_plane_config(
                 cluster_config_bak_file, cluster_host_addr,
-                tries=tries, try_sleep=try_sleep, timeout=timeout)
-            if restore_rc == 2:
-                LOG.error("kube-scheduler has failed to start using backup configuration.")
-                return 2
-            if restore_rc == 1:
-                return 1
+                tries=tries, try_sleep=try_sleep, timeout=timeout,
+                fingerprints_file=fingerprints_file)
+        if restore_rc == 2:
+            LOG.error("%s failed to start using backup configuration.", components)
+            return 2
+        if restore_rc == 1:
+            return 1
 
     # -----------------------------------------------------------------------------
     # Update Kubelet
     # -----------------------------------------------------------------------------
     LOG.debug('Starting the kubelet update')
 
-    # Building kubelet_cfg from service-parameters (hieradata)
-    kubelet_cfg = get_kubelet_cfg_from_service_parameters(service_params)
-
     # Generates kubeadmin config file with KubeletConfiguration
     rc = generates_kubeadm_config_file(
         kubeadm_config_file=kubeadm_kubelet_config_file,
@@ -1562,14 +2469,28 @@ def main():
     if rc != 0:
         return 3
 
+    # Only the parameters that differ from the running configuration are
+    # applied. kubeadm regenerates the whole kubelet configuration only if
+    # parameters were removed or added.
+    kubelet_changes, needs_kubeadm = get_kubelet_config_changes(
+        kubelet_cfg, kubelet_latest_config_file, kubeadm_kubelet_config_bak_file)
+
     # Updating Kubelet
-    if update_k8s_kubelet(kubeadm_kubelet_config_file, kubelet_error_log) != 0:
-        is_k8s_component_healthy = False
+    if not kubelet_changes and not needs_kubeadm:
+        LOG.debug('Kubelet configuration unchanged, skipping kubelet update.')
+        is_k8s_component_healthy = True
     else:
-        LOG.debug('Waiting for kubelet be online.')
-        is_k8s_component_healthy = k8s_health_check(
-            timeout=timeout, try_sleep=try_sleep, tries=tries,
-            healthz_endpoint=KUBELET_HEALTHZ_ENDPOINT)
+        if needs_kubeadm:
+            rc = update_k8s_kubelet(kubeadm_kubelet_config_file, kubelet_error_log)
+        else:
+            rc = apply_kubelet_config_changes(kubelet_latest_config_file, kubelet_changes)
+        if rc != 0:
+            is_k8s_component_healthy = False
+        else:
+            LOG.debug('Waiting for kubelet be online.')
+            is_k8s_component_healthy = k8s_health_check(
+                timeout=timeout, try_sleep=try_sleep, tries=tries,
+                healthz_endpoint=KUBELET_HEALTHZ_ENDPOINT)
 
     if not is_k8s_component_healthy:
         if not automatic_recovery:
@@ -1589,20 +2510,13 @@ def main():
         return 2
 
     LOG.debug("Check all k8s control-plane components are up and running.")
-    is_k8s_apiserver_healthy = k8s_health_check(
+    health = k8s_health_check_all(
         timeout=timeout, try_sleep=try_sleep, tries=tries,
-        healthz_endpoint=get_api_server_readyz_endpoint())
-    is_k8s_controller_manager_healthy = k8s_health_check(
-        timeout=timeout, try_sleep=try_sleep, tries=tries,
-        healthz_endpoint=CONTROLLER_MANAGER_HEALTHZ_ENDPOINT)
-    is_k8s_scheduler_healthy = k8s_health_check(
-        timeout=timeout, try_sleep=try_sleep, tries=tries,
-        healthz_endpoint=SCHEDULER_HEALTHZ_ENDPOINT)
-    is_k8s_kubelet_healthy = k8s_health_check(
-        timeout=timeout, try_sleep=try_sleep, tries=tries,
-        healthz_endpoint=KUBELET_HEALTHZ_ENDPOINT)
-    if not (is_k8s_apiserver_healthy and is_k8s_controller_manager_healthy and
-            is_k8s_scheduler_healthy and is_k8s_kubelet_healthy):
+        healthz_endpoints=[get_api_server_readyz_endpoint(),
+                           CONTROLLER_MANAGER_HEALTHZ_ENDPOINT,
+                           SCHEDULER_HEALTHZ_ENDPOINT,
+                           KUBELET_HEALTHZ_ENDPOINT])
+    if not all(health.values()):
         LOG.error('One or more k8s control-plane components are not healthy.')
         return 3
 
@@ -1656,9 +2570,22 @@ def main():
         LOG.error('Updating kubeadm-config configmap.')
         return 3
 
+    try:
+        _write_file_content(applied_config_hash_file, applied_config_hash)
+    except Exception as e:
+        LOG.error('Saving applied configuration hash: %s', e)
+
     LOG.debug("Successfully Updated.")
     return 0
 
 
 if __name__ == "__main__":
-    sys.exit(main())
+    main_rc = None
+    try:
+        main_rc = main()
+    finally:
+        running = Deadline.join_workers()
+        if running:
+            LOG.warning('%s timed out k8s API calls still running at exit.', running)
+        Timeline.save(main_rc)
+    sys.exit(main_rc)
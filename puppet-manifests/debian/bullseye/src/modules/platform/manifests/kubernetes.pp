@@ -2584,8 +2584,6 @@ class platform::kubernetes::kubeadm::dual_stack::ipv4::runtime {
   include ::platform::network::cluster_service::ipv4::params
   include ::platform::network::cluster_host::ipv4::params
   if $::personality == 'controller' {
-    $restart_wait = '5'
-
     $pod_prim_network = $::platform::network::cluster_pod::params::subnet_network
     $pod_prim_prefixlen = $::platform::network::cluster_pod::params::subnet_prefixlen
     $pod_prim_subnet = "${pod_prim_network}/${pod_prim_prefixlen}"
@@ -2618,7 +2616,9 @@ class platform::kubernetes::kubeadm::dual_stack::ipv4::runtime {
 
     exec { 'update kubeadm pod and service secondary IPv6 subnets':
       path      => '/usr/bin:/usr/sbin:/bin:/usr/local/bin',
-      command   => "dual-stack-kubeadm.py ${pod_prim_subnet} ${svc_prim_subnet} ${pod_sec_subnet} ${svc_sec_subnet} ${restart_wait} ${cluster_host_addr}",
+      command   => "dual-stack-reconfig.py --kubeadm --pod_prim_subnet ${pod_prim_subnet} --pod_sec_subnet ${pod_sec_subnet} --svc_prim_subnet ${svc_prim_subnet} --svc_sec_subnet ${svc_sec_subnet} --advertise_address ${cluster_host_addr}",
+      # Above the fetches and patches and the restarts of the static pods
+      timeout   => 600,
       logoutput => true,
     }
   }
@@ -2633,8 +2633,6 @@ class platform::kubernetes::kubeadm::dual_stack::ipv6::runtime {
   include ::platform::network::cluster_service::ipv6::params
   include ::platform::network::cluster_host::ipv6::params
   if $::personality == 'controller' {
-    $restart_wait = '5'
-
     $pod_prim_network = $::platform::network::cluster_pod::params::subnet_network
     $pod_prim_prefixlen = $::platform::network::cluster_pod::params::subnet_prefixlen
     $pod_prim_subnet = "${pod_prim_network}/${pod_prim_prefixlen}"
@@ -2667,14 +2665,18 @@ class platform::kubernetes::kubeadm::dual_stack::ipv6::runtime {
 
     exec { 'update kubeadm pod and service secondary IPv6 subnets':
       path      => '/usr/bin:/usr/sbin:/bin:/usr/local/bin',
-      command   => "dual-stack-kubeadm.py ${pod_prim_subnet} ${svc_prim_subnet} ${pod_sec_subnet} ${svc_sec_subnet} ${restart_wait} ${cluster_host_addr}",
+      command   => "dual-stack-reconfig.py --kubeadm --pod_prim_subnet ${pod_prim_subnet} --pod_sec_subnet ${pod_sec_subnet} --svc_prim_subnet ${svc_prim_subnet} --svc_sec_subnet ${svc_sec_subnet} --advertise_address ${cluster_host_addr}",
+      # Above the fetches and patches and the restarts of the static pods
+      timeout   => 600,
       logoutput => true,
     }
   }
   # lint:endignore:140chars
 }
 
-class platform::kubernetes::dual_stack::ipv4::runtime {
+class platform::kubernetes::dual_stack::ipv4::runtime (
+  $rollout_timeout = 600,
+) {
   # lint:ignore:140chars
   # adds/removes secondary IPv4 subnets to pod and service
   include ::platform::network::cluster_pod::params
@@ -2686,7 +2688,6 @@ class platform::kubernetes::dual_stack::ipv4::runtime {
   $protocol = 'ipv4'
   $def_pool_filename = "/tmp/def_pool_${protocol}.yaml"
   $kubeconfig = '--kubeconfig=/etc/kubernetes/admin.conf'
-  $restart_wait = '5'
 
   $pod_prim_network = $::platform::network::cluster_pod::params::subnet_network
   $pod_prim_prefixlen = $::platform::network::cluster_pod::params::subnet_prefixlen
@@ -2716,14 +2717,13 @@ class platform::kubernetes::dual_stack::ipv4::runtime {
     $svc_sec_subnet = 'undef'
   }
 
-  exec { 'update kube-proxy pod secondary IPv6 subnet':
+  # kube-proxy, calico and multus are updated together and restarted concurrently.
+  # The rollouts are watched up to rollout_timeout seconds, after the objects are
+  # fetched and patched (at most a few minutes with the retries).
+  exec { "update kube-proxy, calico and multus pod secondary ${protocol} subnet":
     path      => '/usr/bin:/usr/sbin:/bin:/usr/local/bin',
-    command   => "dual-stack-kubeproxy.py ${pod_prim_subnet} ${pod_sec_subnet} ${restart_wait}",
-    logoutput => true,
-  }
-  -> exec { 'update calico node pod secondary IPv6 subnet':
-    path      => '/usr/bin:/usr/sbin:/bin:/usr/local/bin',
-    command   => "dual-stack-calico.py ${protocol} ${state} ${c0_addr} ${restart_wait}",
+    command   => "dual-stack-reconfig.py --kubeproxy --calico --multus --protocol ${protocol} --state ${state} --c0_address ${c0_addr} --pod_prim_subnet ${pod_prim_subnet} --pod_sec_subnet ${pod_sec_subnet} --timeout ${rollout_timeout}",
+    timeout   => $rollout_timeout + 300,
     logoutput => true,
   }
   if $state == true {
@@ -2747,15 +2747,12 @@ class platform::kubernetes::dual_stack::ipv4::runtime {
       onlyif    => "kubectl ${kubeconfig} get ippools.crd.projectcalico.org default-${protocol}-ippool ",
     }
   }
-  exec { 'update multus to support IPv4':
-    path      => '/usr/bin:/usr/sbin:/bin:/usr/local/bin',
-    command   => "dual-stack-multus.py ${protocol} ${state} ${restart_wait}",
-    logoutput => true,
-  }
   # lint:endignore:140chars
 }
 
-class platform::kubernetes::dual_stack::ipv6::runtime {
+class platform::kubernetes::dual_stack::ipv6::runtime (
+  $rollout_timeout = 600,
+) {
   # lint:ignore:140chars
   # adds/removes secondary IPv6 subnets to pod and service
   include ::platform::network::cluster_pod::params
@@ -2767,7 +2764,6 @@ class platform::kubernetes::dual_stack::ipv6::runtime {
   $protocol = 'ipv6'
   $def_pool_filename = "/tmp/def_pool_${protocol}.yaml"
   $kubeconfig = '--kubeconfig=/etc/kubernetes/admin.conf'
-  $restart_wait = '10'
 
   $pod_prim_network = $::platform::network::cluster_pod::params::subnet_network
   $pod_prim_prefixlen = $::platform::network::cluster_pod::params::subnet_prefixlen
@@ -2797,14 +2793,13 @@ class platform::kubernetes::dual_stack::ipv6::runtime {
     $svc_sec_subnet = 'undef'
   }
 
-  exec { 'update kube-proxy pod secondary IPv6 subnet':
+  # kube-proxy, calico and multus are updated together and restarted concurrently.
+  # The rollouts are watched up to rollout_timeout seconds, after the objects are
+  # fetched and patched (at most a few minutes with the retries).
+  exec { "update kube-proxy, calico and multus pod secondary ${protocol} subnet":
     path      => '/usr/bin:/usr/sbin:/bin:/usr/local/bin',
-    command   => "dual-stack-kubeproxy.py ${pod_prim_subnet} ${pod_sec_subnet} ${restart_wait}",
-    logoutput => true,
-  }
-  -> exec { 'update calico node pod secondary IPv6 subnet':
-    path      => '/usr/bin:/usr/sbin:/bin:/usr/local/bin',
-    command   => "dual-stack-calico.py ${protocol} ${state} ${c0_addr} ${restart_wait}",
+    command   => "dual-stack-reconfig.py --kubeproxy --calico --multus --protocol ${protocol} --state ${state} --c0_address ${c0_addr} --pod_prim_subnet ${pod_prim_subnet} --pod_sec_subnet ${pod_sec_subnet} --timeout ${rollout_timeout}",
+    timeout   => $rollout_timeout + 300,
     logoutput => true,
   }
   if $state == true {
@@ -2828,10 +2823,5 @@ class platform::kubernetes::dual_stack::ipv6::runtime {
       onlyif    => "kubectl ${kubeconfig} get ippools.crd.projectcalico.org default-${protocol}-ippool "
     }
   }
-  exec { 'update multus to support IPv6':
-    path      => '/usr/bin:/usr/sbin:/bin:/usr/local/bin',
-    command   => "dual-stack-multus.py ${protocol} ${state} ${restart_wait}",
-    logoutput => true,
-  }
   # lint:endignore:140chars
 }
@@ -1,6 +1,6 @@
 #!/usr/bin/python3
 #
-# Copyright (c) 2024 Wind River Systems, Inc.
+# Copyright (c) 2024, 2026 Wind River Systems, Inc.
 #
 # SPDX-License-Identifier: Apache-2.0
 #
@@ -9,28 +9,12 @@
 import sys
 import subprocess
 import time
-import yaml
 import netaddr
 
-
-filename = "/etc/default/kubelet"
+import k8s_patch
 
 
-def get_yaml_data(cmd, attempts=15):
-    data = dict()
-    for i in range(0, attempts):
-        res = subprocess.run(cmd, check=False, stdout=subprocess.PIPE)
-        if res.returncode != 0:
-            if i == attempts:
-                print(f"An error occurred getting data, attempt={i}: {res}")
-                sys.exit(1)
-            else:
-                time.sleep(5)
-        else:
-            print("yaml data was collected")
-            data = yaml.load(res.stdout, Loader=yaml.Loader)
-            break
-    return data
+filename = "/etc/default/kubelet"
 
 
 def is_valid_ip(address):
@@ -67,20 +51,20 @@ if __name__ == "__main__":
         print(f"Error: restart_wait='{sys.argv[3]}' cannot be converted to an integer.")
         sys.exit(1)
 
-    kubectl_config = ''
-    if sys.argv[4]:
-        kubectl_config = f"--kubeconfig={sys.argv[4]}"
-    else:
-        print(f"Error: invalid kubectl config='{kubectl_config}'")
+    kubeconfig = sys.argv[4]
+    if not kubeconfig:
+        print(f"Error: invalid kubectl config='{kubeconfig}'")
         sys.exit(1)
 
-    print(f"dual-stack-kubelet {node_ip} {node_ip_secondary} {wait} {kubectl_config}")
+    print(f"dual-stack-kubelet {node_ip} {node_ip_secondary} {wait} {kubeconfig}")
 
-    # execute get to test availability of kube-api server
-    print("execute: kubectl -n kube-system get configmap kubeadm-config -o yaml")
-    command = ["kubectl", kubectl_config, "-n", "kube-system",
-               "get", "configmap", "kubeadm-config", "-o", "yaml"]
-    get_yaml_data(command, 20)
+    # get kubeadm-config to test availability of kube-api server
+    try:
+        k8s_patch.get_object("configmap", "kubeadm-config", "kube-system",
+                             kubeconfig=kubeconfig, timeout=100)
+    except k8s_patch.K8sFetchError as ex:
+        print(f"Error: {ex}")
+        sys.exit(1)
 
     try:
         # Open the file for reading
@@ -0,0 +1,226 @@
+#
+# Copyright (c) 2026 Wind River Systems, Inc.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+''' Fetches and minimal patches of kubernetes objects, shared by the
+dual-stack scripts.
+
+Objects are read once per process: fetches are cached, retried with
+exponential backoff and jitter within a total deadline, and fail with a
+K8sFetchError telling why. The changes are computed against the current
+object and only the fields that differ are sent, as a strategic merge
+patch (or a JSON patch), so an object that already has the wanted
+configuration is not touched and its pods are not restarted. Requests go
+straight to the API through a pooled client of the kubernetes python
+package, or through kubectl if it is not available.
+'''
+
+import copy
+from datetime import datetime
+from datetime import timezone
+import json
+import random
+import subprocess
+import threading
+import time
+
+KUBECONFIG = "/etc/kubernetes/admin.conf"
+
+# Seconds to keep retrying a fetch, and bounds of the delay between tries
+FETCH_TIMEOUT = 60
+FETCH_MIN_SLEEP = 0.5
+FETCH_MAX_SLEEP = 8
+
+# kind -> (kubernetes client API class, read method, patch method)
+KINDS = {
+    "configmap": ("CoreV1Api", "read_namespaced_config_map", "patch_namespaced_config_map"),
+    "daemonset": ("AppsV1Api", "read_namespaced_daemon_set", "patch_namespaced_daemon_set"),
+}
+
+_api_clients = dict()
+_api_clients_lock = threading.Lock()
+_objects = dict()
+_objects_lock = threading.Lock()
+
+
+class K8sPatchError(Exception):
+    pass
+
+
+class K8sFetchError(Exception):
+    """An object could not be fetched.
+    not_found is set if the API reported that the object does not exist,
+    which is not retried; otherwise reason is the last error, after
+    attempts tries.
+    """
+
+    def __init__(self, kind, name, namespace, reason, attempts, not_found=False):
+        super(K8sFetchError, self).__init__(
+            f"get {kind}/{name} -n {namespace} failed after {attempts} attempt(s): {reason}")
+        self.kind = kind
+        self.name = name
+        self.namespace = namespace
+        self.reason = reason
+        self.attempts = attempts
+        self.not_found = not_found
+
+
+def get_api_client(kubeconfig=KUBECONFIG):
+    """Returns the API client of a kubeconfig, shared by all the requests of
+    the process. None if the kubernetes python client can't be used."""
+    with _api_clients_lock:
+        if kubeconfig not in _api_clients:
+            try:
+                from kubernetes import config  # pylint: disable=import-error
+                _api_clients[kubeconfig] = config.new_client_from_config(
+                    config_file=kubeconfig)
+            except Exception as ex:
+                print(f"kubernetes client not available, using kubectl: {ex}")
+                _api_clients[kubeconfig] = None
+        return _api_clients[kubeconfig]
+
+
+def _backoff_delays():
+    """Auxiliary generator of retry delays: exponential backoff with jitter,
+    starting at FETCH_MIN_SLEEP and capped at FETCH_MAX_SLEEP."""
+    delay = FETCH_MIN_SLEEP
+    while True:
+        yield random.uniform(delay / 2, delay)
+        delay = min(delay * 2, FETCH_MAX_SLEEP)
+
+
+def _fetch_once(kind, name, namespace, kubeconfig):
+    """Auxiliary function to read an object once.
+    Return (object, None) or (None, (reason, not_found)).
+    """
+    api_client = get_api_client(kubeconfig)
+    if api_client is not None:
+        from kubernetes import client  # pylint: disable=import-error
+        api_class, method, _ = KINDS[kind]
+        try:
+            obj = getattr(getattr(client, api_class)(api_client), method)(name, namespace)
+        except Exception as ex:
+            return None, (str(ex).strip(), getattr(ex, "status", None) == 404)
+        return api_client.sanitize_for_serialization(obj), None
+
+    cmd = ["kubectl", f"--kubeconfig={kubeconfig}", "-n", namespace,
+           "get", kind, name, "-o", "json"]
+    res = subprocess.run(cmd, check=False, capture_output=True)
+    if res.returncode != 0:
+        reason = res.stderr.decode().strip()
+        return None, (reason, "(NotFound)" in reason)
+    return json.loads(res.stdout), None
+
+
+def get_object(kind, name, namespace, kubeconfig=KUBECONFIG, timeout=FETCH_TIMEOUT):
+    """Returns an object as a dict, as 'kubectl get -o json' shows it.
+    The object is fetched once per process and each call returns its own
+    copy; patch_object drops the patched object from the cache.
+    Raise:
+     - K8sFetchError, the object does not exist or could not be fetched
+       within timeout seconds.
+    """
+    key = (kubeconfig, kind, namespace, name)
+    with _objects_lock:
+        if key in _objects:
+            return copy.deepcopy(_objects[key])
+
+    deadline = time.monotonic() + timeout
+    delays = _backoff_delays()
+    attempts = 0
+    while True:
+        attempts += 1
+        obj, error = _fetch_once(kind, name, namespace, kubeconfig)
+        if error is None:
+            break
+        reason, not_found = error
+        delay = next(delays)
+        if not_found or time.monotonic() + delay > deadline:
+            raise K8sFetchError(kind, name, namespace, reason, attempts, not_found)
+        print(f"get {kind}/{name} failed, attempt={attempts}: {reason}")
+        time.sleep(delay)
+
+    with _objects_lock:
+        _objects[key] = obj
+    return copy.deepcopy(obj)
+
+
+def configmap_data_patch(configmap, data):
+    """Returns the patch setting data keys of a configmap, or None if they
+    already have these values."""
+    current = configmap.get("data") or dict()
+    changed = {key: value for key, value in data.items() if current.get(key) != value}
+    if not changed:
+        return None
+    return {"data": changed}
+
+
+def _env_patch(current_env, desired_env):
+    current = {env["name"]: env for env in current_env or []}
+    desired = {env["name"]: env for env in desired_env or []}
+    patch = [env for name, env in desired.items() if current.get(name) != env]
+    patch += [{"name": name, "$patch": "delete"} for name in current if name not in desired]
+    return patch
+
+
+def pod_template_env_patch(current, desired):
+    """Returns the patch changing the container environment variables of a
+    workload (e.g. a DaemonSet) from the current object to the desired one,
+    or None if they are the same. Containers and variables are matched by
+    name, unchanged ones are left out of the patch."""
+    desired_containers = {container["name"]: container
+                          for container in desired["spec"]["template"]["spec"]["containers"]}
+    containers = list()
+    for container in current["spec"]["template"]["spec"]["containers"]:
+        desired_container = desired_containers.get(container["name"], container)
+        env = _env_patch(container.get("env"), desired_container.get("env"))
+        if env:
+            containers.append({"name": container["name"], "env": env})
+    if not containers:
+        return None
+    return {"spec": {"template": {"spec": {"containers": containers}}}}
+
+
+def restart_patch():
+    """Returns the patch restarting the pods of a workload, as done by
+    'kubectl rollout restart'."""
+    restarted_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return {"spec": {"template": {"metadata": {"annotations": {
+        "kubectl.kubernetes.io/restartedAt": restarted_at}}}}}
+
+
+def patch_object(kind, name, namespace, patch, kubeconfig=KUBECONFIG):
+    """Sends a patch to an object: a dict is sent as a strategic merge
+    patch, a list as a JSON patch (RFC 6902).
+    Return:
+     - True, the object was patched.
+     - False, the patch is empty, nothing was sent.
+    Raise:
+     - K8sPatchError, the patch failed.
+    """
+    if not patch:
+        return False
+
+    with _objects_lock:
+        _objects.pop((kubeconfig, kind, namespace, name), None)
+
+    api_client = get_api_client(kubeconfig)
+    if api_client is not None:
+        from kubernetes import client  # pylint: disable=import-error
+        api_class, _, method = KINDS[kind]
+        try:
+            getattr(getattr(client, api_class)(api_client), method)(name, namespace, patch)
+        except Exception as ex:
+            raise K8sPatchError(f"patch {kind}/{name} failed: {ex}")
+        print(f"patched {kind}/{name}")
+        return True
+
+    patch_type = "json" if isinstance(patch, list) else "strategic"
+    cmd = ["kubectl", f"--kubeconfig={kubeconfig}", "-n", namespace,
+           "patch", kind, name, "--type", patch_type, "-p", json.dumps(patch)]
+    res = subprocess.run(cmd, check=False, capture_output=True)
+    if res.returncode != 0:
+        raise K8sPatchError(f"patch {kind}/{name} failed: {res.stderr.decode().strip()}")
+    print(f"patched {kind}/{name}")
+    return True
@@ -5,14 +5,43 @@ Reads desired state from the role-bindings service parameter,
 compares against current Keystone groups and role assignments,
 creates missing resources, and removes stale ones.
 
+By default Keystone is authoritative: the actual state is the role
+assignments of the managed groups, so stale grants are removed even if
+they were not made by the previously applied bindings (restore, manual
+change). The managed groups are the desired ones and the ones this tool
+recorded: the groups of the last digest and the groups named by the
+previously applied bindings. Other groups, even user_ ones, are never
+changed. With --mode applied, only the difference with the previously
+applied bindings (APPLIED_FILE) is reconciled. A digest of the bindings
+and of the managed groups assignments is kept (DIGEST_FILE): when
+neither changed since the last run, the run ends after listing the
+assignments of the recorded groups.
+
+The Keystone resources are fetched once per run with list requests (see
+KeystoneIndex): one per resource type, and one per managed group for the
+role assignments, which Keystone filters by group. The number of
+requests does not grow with the number of bindings checked, only with
+the number of managed groups and the changes made. The changes are
+made concurrently, through a bounded thread pool sharing the keystone
+session: groups are created first, then the roles are granted and
+revoked, then the stale groups are deleted.
+
 Usage:
-    reconcile_oidc_role_bindings.py '<role_bindings_string>'
+    reconcile_oidc_role_bindings.py [--mode keystone|applied] '<role_bindings_string>'
     reconcile_oidc_role_bindings.py ''  # empty = remove all managed bindings
 """
 
+import argparse
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import itertools
+import json
 import subprocess
 import sys
 import logging
+import threading
+import time
 import urllib3
 
 from keystoneauth1.identity import v3 as identity  # pylint: disable=import-error
@@ -27,6 +56,32 @@ logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
 RC_FILE = '/etc/platform/openrc'
 APPLIED_FILE = '/etc/platform/.rolebindings.applied'
+DIGEST_FILE = '/etc/platform/.rolebindings.digest'
+
+# Concurrent Keystone requests, below the connection pool size of the
+# keystoneauth session (10)
+MAX_WORKERS = 8
+# Tries of an operation failing with a transient error, and the base delay
+# between them (multiplied by the try number)
+OPERATION_TRIES = 3
+OPERATION_RETRY_SLEEP = 1
+
+TRANSIENT_ERRORS = (
+    ks_exceptions.ConnectionError,
+    ks_exceptions.ServiceUnavailable,
+    ks_exceptions.BadGateway,
+    ks_exceptions.GatewayTimeout,
+)
+
+# A Keystone change of the reconciliation: func(*args)
+Operation = namedtuple('Operation', ['description', 'func', 'args'])
+# The result of an operation: the value returned by func, or the error
+# raised by its last try
+OperationResult = namedtuple('OperationResult', ['operation', 'value', 'error'])
+
+
+class ReconcileError(Exception):
+    pass
 
 
 def get_keystone_credentials():
@@ -108,81 +163,155 @@ def parse_desired_bindings(bindings_str):
     return entries
 
 
-def find_group(keystone, group_name, domain_name='Default'):
-    """Find a group by name in a domain. Returns group object or None."""
-    try:
-        domain = keystone.domains.find(name=domain_name)
-        groups = keystone.groups.list(domain=domain, name=group_name)
-        return groups[0] if groups else None
-    except (ks_exceptions.NotFound, IndexError):
-        return None
-
-
-def find_role(keystone, role_name):
-    """Find a role by name. Returns role object or None."""
-    try:
-        return keystone.roles.find(name=role_name)
-    except ks_exceptions.NotFound:
-        return None
-
-
-def find_project(keystone, project_name, domain_name='Default'):
-    """Find a project by name. Returns project object or None."""
-    try:
-        domain = keystone.domains.find(name=domain_name)
-        return keystone.projects.find(name=project_name, domain_id=domain.id)
-    except ks_exceptions.NotFound:
-        return None
-
-
-def create_group(keystone, group_name, domain_name='Default'):
+def bindings_state(entries):
+    """Group parsed bindings by Keystone group:
+    {group_name: {'roles': set, 'domain', 'project', 'type'}}."""
+    state = {}
+    for entry in entries:
+        gn = entry['group_name']
+        if gn not in state:
+            state[gn] = {
+                'roles': set(),
+                'domain': entry['domain'],
+                'project': entry['project'],
+                'type': entry['type'],
+            }
+        state[gn]['roles'].add(entry['role'])
+    return state
+
+
+def list_group_assignments(keystone, group_ids, max_workers=MAX_WORKERS):
+    """List the project role assignments of groups. Keystone filters role
+    assignments by a single group: the groups are listed with one request
+    each, concurrently, at most max_workers at a time.
+    Returns a set of (group id, role id, project id).
+    """
+    def _list(group_id):
+        return [(group_id, assignment.role['id'], assignment.scope['project']['id'])
+                for assignment in keystone.role_assignments.list(group=group_id)
+                if 'project' in getattr(assignment, 'scope', {})]
+
+    if not group_ids:
+        return set()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(group_ids))) as executor:
+        return set(itertools.chain.from_iterable(executor.map(_list, sorted(group_ids))))
+
+
+def assignments_etag(assignments):
+    """Digest of a set of role assignments."""
+    return hashlib.sha256(
+        '\n'.join(sorted(':'.join(a) for a in assignments)).encode()).hexdigest()
+
+
+class KeystoneIndex(object):
+    """In-memory indexes of the Keystone resources used by the bindings.
+
+    Fetched once per run with list requests: the domains, the roles,
+    the projects and the managed groups (the groups named by the bindings
+    in their domain and the recorded group_ids) of the domains of the
+    bindings, and the project role assignments of these groups.
+    Reconciliation then looks resources up here and keeps the indexes up
+    to date with the changes it makes, instead of querying Keystone for
+    every check.
+    """
+
+    def __init__(self, keystone, states, group_ids=()):
+        self.keystone = keystone
+        # protects the indexes updated by concurrent operations
+        self.lock = threading.Lock()
+        # a group name is only managed in the domain of its bindings
+        group_keys = {(s['domain'], gn) for state in states for gn, s in state.items()}
+        domain_names = {domain_name for domain_name, _ in group_keys}
+
+        self.domains = {d.name: d for d in keystone.domains.list()}
+        self.roles = {r.name: r for r in keystone.roles.list()}
+        self.projects = {}
+        self.groups = {}
+        for domain_name in domain_names:
+            domain = self.domains.get(domain_name)
+            if domain is None:
+                continue
+            for project in keystone.projects.list(domain=domain):
+                self.projects[(domain_name, project.name)] = project
+            for group in keystone.groups.list(domain=domain):
+                if (domain_name, group.name) in group_keys or group.id in group_ids:
+                    self.groups[(domain_name, group.name)] = group
+
+        # (group id, role id, project id)
+        self.assignments = list_group_assignments(
+            keystone, {group.id for group in self.groups.values()})
+
+    def find_group(self, group_name, domain_name='Default'):
+        """Find a group by name in a domain. Returns group object or None."""
+        return self.groups.get((domain_name, group_name))
+
+    def find_role(self, role_name):
+        """Find a role by name. Returns role object or None."""
+        return self.roles.get(role_name)
+
+    def find_project(self, project_name, domain_name='Default'):
+        """Find a project by name. Returns project object or None."""
+        return self.projects.get((domain_name, project_name))
+
+    def has_role_assignment(self, group, role, project):
+        """Check if a role assignment exists."""
+        return (group.id, role.id, project.id) in self.assignments
+
+
+def create_group(index, group_name, domain_name='Default'):
     """Create a group if it doesn't exist. Returns group object."""
-    group = find_group(keystone, group_name, domain_name)
+    group = index.find_group(group_name, domain_name)
     if group:
         LOG.info("Group '%s' already exists", group_name)
         return group
 
-    domain = keystone.domains.find(name=domain_name)
-    group = keystone.groups.create(name=group_name, domain=domain)
-    LOG.info("Created group '%s'", group_name)
+    domain = index.domains.get(domain_name)
+    if domain is None:
+        raise ValueError(f"Domain '{domain_name}' not found")
+    try:
+        group = index.keystone.groups.create(name=group_name, domain=domain)
+        LOG.info("Created group '%s'", group_name)
+    except ks_exceptions.Conflict:
+        # created by a previous try whose response was lost
+        groups = index.keystone.groups.list(domain=domain, name=group_name)
+        if not groups:
+            raise ReconcileError(f"Group '{group_name}' conflicts but was not found")
+        group = groups[0]
+        LOG.info("Group '%s' already exists", group_name)
+    with index.lock:
+        index.groups[(domain_name, group_name)] = group
     return group
 
 
-def has_role_assignment(keystone, group, role, project):
-    """Check if a role assignment exists."""
-    assignments = keystone.role_assignments.list(
-        group=group, project=project, role=role
-    )
-    return len(assignments) > 0
-
-
-def assign_role(keystone, group_name, project_name, domain_name, role_name):
+def assign_role(index, group_name, project_name, domain_name, role_name):
     """Assign a role to a group on a project."""
-    group = find_group(keystone, group_name, domain_name)
-    role = find_role(keystone, role_name)
-    project = find_project(keystone, project_name, domain_name)
+    group = index.find_group(group_name, domain_name)
+    role = index.find_role(role_name)
+    project = index.find_project(project_name, domain_name)
 
     if not all([group, role, project]):
         LOG.error("Cannot assign role: group=%s role=%s project=%s",
                   group, role, project)
         return False
 
-    if has_role_assignment(keystone, group, role, project):
+    if index.has_role_assignment(group, role, project):
         LOG.info("Role '%s' already assigned to group '%s'",
                  role_name, group_name)
         return True
 
-    keystone.roles.grant(role, group=group, project=project)
+    index.keystone.roles.grant(role, group=group, project=project)
+    with index.lock:
+        index.assignments.add((group.id, role.id, project.id))
     LOG.info("Assigned role '%s' to group '%s' on project '%s'",
              role_name, group_name, project_name)
     return True
 
 
-def remove_role(keystone, group_name, project_name, domain_name, role_name):
+def remove_role(index, group_name, project_name, domain_name, role_name):
     """Remove a role assignment from a group."""
-    group = find_group(keystone, group_name, domain_name)
-    role = find_role(keystone, role_name)
-    project = find_project(keystone, project_name, domain_name)
+    group = index.find_group(group_name, domain_name)
+    role = index.find_role(role_name)
+    project = index.find_project(project_name, domain_name)
 
     if not all([group, role, project]):
         LOG.warning("Cannot remove role (resource not found): "
@@ -190,103 +319,274 @@ def remove_role(keystone, group_name, project_name, domain_name, role_name):
                     group_name, role_name, project_name)
         return False
 
+    if not index.has_role_assignment(group, role, project):
+        LOG.info("Role '%s' was not assigned to group '%s'",
+                 role_name, group_name)
+        return True
+
     try:
-        keystone.roles.revoke(role, group=group, project=project)
+        index.keystone.roles.revoke(role, group=group, project=project)
         LOG.info("Removed role '%s' from group '%s' on project '%s'",
                  role_name, group_name, project_name)
     except ks_exceptions.NotFound:
         LOG.info("Role '%s' was not assigned to group '%s'",
                  role_name, group_name)
+    with index.lock:
+        index.assignments.discard((group.id, role.id, project.id))
     return True
 
 
-def delete_group(keystone, group_name, domain_name='Default'):
+def delete_group(index, group_name, domain_name='Default'):
     """Delete a group."""
-    group = find_group(keystone, group_name, domain_name)
+    group = index.find_group(group_name, domain_name)
     if not group:
         LOG.info("Group '%s' does not exist, nothing to delete", group_name)
         return True
 
-    keystone.groups.delete(group)
+    try:
+        index.keystone.groups.delete(group)
+    except ks_exceptions.NotFound:
+        # deleted by a previous try whose response was lost
+        pass
+    with index.lock:
+        index.groups.pop((domain_name, group_name), None)
+        index.assignments = {a for a in index.assignments if a[0] != group.id}
     LOG.info("Deleted group '%s'", group_name)
     return True
 
 
-def reconcile(bindings_str):
-    """Main reconciliation logic."""
-    keystone = create_keystone_client()
-    desired = parse_desired_bindings(bindings_str)
+def revoke_assignment(index, assignment):
+    """Revoke a role assignment (group id, role id, project id) found in
+    Keystone."""
+    group_id, role_id, project_id = assignment
+    try:
+        index.keystone.roles.revoke(role_id, group=group_id, project=project_id)
+    except ks_exceptions.NotFound:
+        pass
+    with index.lock:
+        index.assignments.discard(assignment)
+    return True
 
-    # Build desired state: {group_name: {'roles': set, ...}}
-    desired_state = {}
-    for entry in desired:
-        gn = entry['group_name']
-        if gn not in desired_state:
-            desired_state[gn] = {
-                'roles': set(),
-                'domain': entry['domain'],
-                'project': entry['project'],
-                'type': entry['type'],
-            }
-        desired_state[gn]['roles'].add(entry['role'])
 
-    # --- CREATE MISSING ---
+def run_operation(operation):
+    """Run an operation, retrying it on transient Keystone errors.
+    Returns an OperationResult, an unexpected error only fails this
+    operation.
+    """
+    for attempt in range(1, OPERATION_TRIES + 1):
+        try:
+            return OperationResult(operation, operation.func(*operation.args), None)
+        except TRANSIENT_ERRORS as e:
+            if attempt == OPERATION_TRIES:
+                return OperationResult(operation, None, e)
+            LOG.warning("%s failed (attempt %d/%d), retrying: %s",
+                        operation.description, attempt, OPERATION_TRIES, e)
+            time.sleep(OPERATION_RETRY_SLEEP * attempt)
+        except (ValueError, ReconcileError, ks_exceptions.ClientException) as e:
+            return OperationResult(operation, None, e)
+        except Exception as e:  # pylint: disable=broad-except
+            LOG.exception("%s failed unexpectedly", operation.description)
+            return OperationResult(operation, None, e)
+
+
+def run_operations(operations, max_workers=MAX_WORKERS):
+    """Run independent operations concurrently, at most max_workers at a
+    time. Returns the OperationResult of each operation, in order.
+    """
+    if not operations:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(operations))) as executor:
+        results = list(executor.map(run_operation, operations))
+    for result in results:
+        if result.error is not None:
+            LOG.error("%s failed: %s", result.operation.description, result.error)
+    return results
+
+
+def plan_operations(index, desired_state, previous_state):
+    """Compute the operations turning the previous state into the desired
+    one, as the list of the phases to run in order: group creations,
+    role grants and revokes, group deletions. The operations of a phase
+    are independent of each other.
+    """
+    creates = []
+    changes = []
+    deletes = []
     for group_name, state in desired_state.items():
-        create_group(keystone, group_name, state['domain'])
+        creates.append(Operation(f"Create group '{group_name}'", create_group,
+                                 (index, group_name, state['domain'])))
         for role in state['roles']:
-            assign_role(keystone, group_name, state['project'],
-                        state['domain'], role)
-
-    # --- REMOVE STALE ---
-    try:
-        with open(APPLIED_FILE, 'r') as f:
-            previous_bindings = f.read().strip()
-    except FileNotFoundError:
-        previous_bindings = ''
-
-    previous = parse_desired_bindings(previous_bindings)
-    previous_state = {}
-    for entry in previous:
-        gn = entry['group_name']
-        if gn not in previous_state:
-            previous_state[gn] = {
-                'roles': set(),
-                'domain': entry['domain'],
-                'project': entry['project'],
-                'type': entry['type'],
-            }
-        previous_state[gn]['roles'].add(entry['role'])
+            changes.append(Operation(
+                f"Assign role '{role}' to group '{group_name}'", assign_role,
+                (index, group_name, state['project'], state['domain'], role)))
 
     for group_name, prev_state in previous_state.items():
         if group_name not in desired_state:
-            for role in prev_state['roles']:
-                remove_role(keystone, group_name, prev_state['project'],
-                            prev_state['domain'], role)
-            delete_group(keystone, group_name, prev_state['domain'])
+            stale_roles = prev_state['roles']
+            deletes.append(Operation(f"Delete group '{group_name}'", delete_group,
+                                     (index, group_name, prev_state['domain'])))
         else:
             stale_roles = (prev_state['roles'] -
                            desired_state[group_name]['roles'])
-            for role in stale_roles:
-                remove_role(keystone, group_name, prev_state['project'],
-                            prev_state['domain'], role)
+        for role in stale_roles:
+            changes.append(Operation(
+                f"Remove role '{role}' from group '{group_name}'", remove_role,
+                (index, group_name, prev_state['project'], prev_state['domain'], role)))
+    return [creates, changes, deletes]
+
+
+def plan_keystone_operations(index, desired_state, previous_state):
+    """Compute the operations turning the actual Keystone state of the
+    managed groups into the desired one, in the phases of plan_operations.
+
+    All the project role assignments of the managed user_ groups are
+    managed. The groups named by the bindings (%group) may have
+    assignments made by others, only their assignments on the projects
+    the desired or previous bindings give them are managed. The managed
+    groups that are not desired, all recorded by a previous run, are
+    deleted with their assignments.
+    """
+    desired = set()
+    managed_projects = {}
+    for state in (desired_state, previous_state):
+        for group_name, s in state.items():
+            managed_projects.setdefault((s['domain'], group_name), set()).add(
+                (s['domain'], s['project']))
+    for group_name, s in desired_state.items():
+        for role in s['roles']:
+            desired.add((s['domain'], group_name, (s['domain'], s['project']), role))
+
+    group_keys = {group.id: key for key, group in index.groups.items()}
+    role_names = {role.id: name for name, role in index.roles.items()}
+    project_keys = {project.id: key for key, project in index.projects.items()}
+    # actual binding -> its (group id, role id, project id) assignment
+    actual = {}
+    for assignment in index.assignments:
+        group_id, role_id, project_id = assignment
+        group_key = group_keys[group_id]
+        project_key = project_keys.get(project_id, project_id)
+        if (not group_key[1].startswith('user_') and
+                project_key not in managed_projects.get(group_key, ())):
+            continue
+        actual[group_key + (project_key, role_names.get(role_id, role_id))] = assignment
+
+    desired_groups = {(s['domain'], group_name) for group_name, s in desired_state.items()}
+    deleted = set(index.groups) - desired_groups
+
+    creates = [Operation(f"Create group '{group_name}'", create_group,
+                         (index, group_name, s['domain']))
+               for group_name, s in desired_state.items()
+               if not index.find_group(group_name, s['domain'])]
+    changes = [Operation(f"Assign role '{role}' to group '{group_name}'", assign_role,
+                         (index, group_name, project[1], domain, role))
+               for domain, group_name, project, role in sorted(desired - set(actual))]
+    changes += [Operation(f"Remove role '{binding[3]}' from group '{binding[1]}'",
+                          revoke_assignment, (index, assignment))
+                for binding, assignment in sorted(actual.items(), key=str)
+                if binding not in desired and binding[:2] not in deleted]
+    deletes = [Operation(f"Delete group '{group_name}'", delete_group,
+                         (index, group_name, domain))
+               for domain, group_name in sorted(deleted)]
+    return [creates, changes, deletes]
+
+
+def bindings_digest(bindings_str):
+    """Digest of a role-bindings string."""
+    return hashlib.sha256((bindings_str or '').encode()).hexdigest()
+
+
+def read_digest():
+    """Read the digest of the last Keystone-authoritative run, or None."""
+    try:
+        with open(DIGEST_FILE, 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def is_unchanged(keystone, bindings_str, digest):
+    """Check that neither the bindings nor the role assignments of the
+    groups recorded by the last run (digest) changed since. Only the
+    assignments of these groups are listed."""
+    if not digest or digest.get('bindings') != bindings_digest(bindings_str):
+        return False
+    assignments = list_group_assignments(keystone, set(digest.get('groups', [])))
+    return assignments_etag(assignments) == digest.get('assignments')
+
+
+def write_digest(index, bindings_str):
+    """Record the bindings and the resulting managed groups assignments."""
+    digest = {
+        'bindings': bindings_digest(bindings_str),
+        'groups': sorted(group.id for group in index.groups.values()),
+        'assignments': assignments_etag(index.assignments),
+    }
+    with open(DIGEST_FILE, 'w') as f:
+        json.dump(digest, f)
+
+
+def reconcile(bindings_str, mode='keystone'):
+    """Main reconciliation logic.
+    mode is 'keystone' to reconcile the actual Keystone state, or 'applied'
+    to reconcile the difference with the previously applied bindings.
+    """
+    keystone = create_keystone_client()
+    digest = read_digest() if mode == 'keystone' else None
+    if mode == 'keystone' and is_unchanged(keystone, bindings_str, digest):
+        LOG.info("Role bindings and Keystone assignments unchanged, "
+                 "nothing to reconcile")
+        return
+
+    desired_state = bindings_state(parse_desired_bindings(bindings_str))
+
+    try:
+        with open(APPLIED_FILE, 'r') as f:
+            previous_bindings = f.read().strip()
+    except FileNotFoundError:
+        previous_bindings = ''
+    previous_state = bindings_state(parse_desired_bindings(previous_bindings))
+
+    # The groups of the last digest are managed too, the ones no longer in
+    # the bindings are deleted
+    recorded_group_ids = set(digest.get('groups', [])) if digest else set()
+    index = KeystoneIndex(keystone, [desired_state, previous_state], recorded_group_ids)
+    if mode == 'keystone':
+        phases = plan_keystone_operations(index, desired_state, previous_state)
+    else:
+        phases = plan_operations(index, desired_state, previous_state)
+
+    # --- CREATE MISSING, REMOVE STALE ---
+    # Each phase completes before the next one starts, so a group exists
+    # before any grant to it and its roles are revoked before it is deleted.
+    failed = []
+    for phase in phases:
+        failed += [result for result in run_operations(phase) if result.error is not None]
+    if failed:
+        raise ReconcileError(f"{len(failed)} operation(s) failed")
 
     # --- SAVE CURRENT STATE ---
     with open(APPLIED_FILE, 'w') as f:
         f.write(bindings_str if bindings_str else '')
+    if mode == 'keystone':
+        write_digest(index, bindings_str)
 
     LOG.info("Reconciliation complete. Desired groups: %s",
              list(desired_state.keys()) if desired_state else '(none)')
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: reconcile_oidc_role_bindings.py '<bindings_string>'")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description='Reconcile OIDC role bindings in Keystone.')
+    parser.add_argument('bindings', help="role-bindings string, '' removes all")
+    parser.add_argument('--mode', choices=('keystone', 'applied'), default='keystone',
+                        help='diff the bindings against the Keystone assignments of '
+                             'the managed groups (default), or against the '
+                             'previously applied bindings')
+    args = parser.parse_args()
 
-    bindings_str = sys.argv[1]
     try:
-        reconcile(bindings_str)
-    except (ValueError, IOError, OSError,
+        reconcile(args.bindings, args.mode)
+    except (ValueError, IOError, OSError, ReconcileError,
             ks_exceptions.ClientException,
             subprocess.TimeoutExpired,
             subprocess.SubprocessError) as e:
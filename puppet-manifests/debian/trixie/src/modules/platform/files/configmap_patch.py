@@ -0,0 +1,144 @@
+#
+# Copyright (c) 2026 Wind River Systems, Inc.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+# This script applies a list of edits to a yaml file containing a
+# kubernetes configmap, e.g. the apiServer.certSANs of the kubeadm-config
+# configmap or the imageGC, evictionHard and cgroupDriver parameters of the
+# kubelet-config configmap.
+# The file and each edited embedded document are loaded and dumped once,
+# whatever the number of edits, and the file is only overwritten if the
+# edits changed its content. The script then exits with RC_UNCHANGED, so
+# the caller can skip patching the configmap.
+
+import argparse
+import sys
+
+import k8s_yaml
+
+# Exit status when the edits did not change the configmap
+RC_UNCHANGED = 3
+
+# The following are kubernetes evictionHard default settings, see reference:
+# kubernetes/pkg/kubelet/apis/config/v1beta1/defaults_linux.go .
+# All four parameters require explicit definition if we want to modify a
+# subset of the values.
+EVICTION_HARD_DEFAULT = {
+    'memory.available': '100Mi',
+    'nodefs.available': '10%',
+    'nodefs.inodesFree': '5%',
+    'imagefs.available': '15%'
+}
+
+# Values of the kubelet-config edits that are not given, when at least one
+# of them is.
+KUBELET_EDIT_DEFAULTS = {
+    'image_gc_low_threshold_percent': 75,
+    'image_gc_high_threshold_percent': 79,
+    'eviction_hard_imagefs_available': '2Gi',
+    'cgroup_driver': 'cgroupfs',
+}
+
+
+def set_certsans(cluster_config, certsans):
+    cluster_config['apiServer']['certSANs'] = \
+        [item.strip() for item in certsans.split(',')]
+
+
+def set_image_gc_low_threshold_percent(kubelet_config, value):
+    kubelet_config['imageGCLowThresholdPercent'] = value
+
+
+def set_image_gc_high_threshold_percent(kubelet_config, value):
+    kubelet_config['imageGCHighThresholdPercent'] = value
+
+
+def set_eviction_hard_imagefs_available(kubelet_config, value):
+    eviction_hard = dict(EVICTION_HARD_DEFAULT)
+    eviction_hard['imagefs.available'] = value
+    kubelet_config['evictionHard'] = eviction_hard
+
+
+def set_cgroup_driver(kubelet_config, value):
+    if value:
+        kubelet_config['cgroupDriver'] = value
+
+
+# Edit operations: argument -> (edited configmap document, edit function)
+EDITS = {
+    'certsans': ('ClusterConfiguration', set_certsans),
+    'image_gc_low_threshold_percent': ('kubelet', set_image_gc_low_threshold_percent),
+    'image_gc_high_threshold_percent': ('kubelet', set_image_gc_high_threshold_percent),
+    'eviction_hard_imagefs_available': ('kubelet', set_eviction_hard_imagefs_available),
+    'cgroup_driver': ('kubelet', set_cgroup_driver),
+}
+
+
+def get_edits(args):
+    """Returns the requested edits grouped by configmap document, as
+    {document: [(edit function, value)]}."""
+    values = {name: getattr(args, name) for name in EDITS
+              if getattr(args, name) is not None}
+    if any(EDITS[name][0] == 'kubelet' for name in values):
+        for name, value in KUBELET_EDIT_DEFAULTS.items():
+            values.setdefault(name, value)
+
+    edits = {}
+    for name, (document, edit) in EDITS.items():
+        if name in values:
+            edits.setdefault(document, []).append((edit, values[name]))
+    return edits
+
+
+def patch_configmap(configmap_file, edits):
+    """Applies the edits to the configmap file.
+    Return:
+     - True, the configmap file was updated.
+     - False, the edits did not change the configmap.
+    """
+    with open(configmap_file, 'r') as f:
+        content = f.read()
+    configmap = k8s_yaml.load(content, roundtrip=True)
+
+    changed = False
+    for document_key, document_edits in edits.items():
+        # The documents are single strings in the configmap, we need to
+        # parse them in order to modify them correctly.
+        document = k8s_yaml.get_configmap_document(configmap, document_key, roundtrip=True)
+        for edit, value in document_edits:
+            edit(document, value)
+        if k8s_yaml.dump(document, roundtrip=True) != configmap['data'][document_key]:
+            k8s_yaml.set_configmap_document(configmap, document_key, document, roundtrip=True)
+            changed = True
+
+    if changed:
+        k8s_yaml.dump_file(configmap, configmap_file, roundtrip=True)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--configmap_file', required=True)
+    parser.add_argument('--certsans',
+                        help='Set apiServer.certSANs (comma separated list)')
+    parser.add_argument('--image_gc_low_threshold_percent', type=int)
+    parser.add_argument('--image_gc_high_threshold_percent', type=int)
+    parser.add_argument('--eviction_hard_imagefs_available')
+    parser.add_argument('--cgroup_driver',
+                        help='Set cgroupDriver (systemd or cgroupfs)')
+    args = parser.parse_args()
+
+    edits = get_edits(args)
+    if not edits:
+        parser.error('no edit requested')
+
+    if not patch_configmap(args.configmap_file, edits):
+        print("%s is already up to date" % args.configmap_file)
+        return RC_UNCHANGED
+    print("Updated %s" % args.configmap_file)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+#
+# Copyright (c) 2026 Wind River Systems, Inc.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+''' YAML helpers shared by the kubernetes and platform scripts.
+
+Plain data is loaded and dumped with PyYAML, using the libyaml C loader
+and dumper when available. Round-trip loading, which keeps the comments
+and key order, uses ruamel.yaml and is only imported when needed, so the
+scripts that don't modify configuration files in place don't pay for it.
+
+Parsed documents are cached by content hash and every load returns its
+own copy, so the same kubeadm or kubelet document embedded in several
+configmaps, or read several times, is only parsed once per process.
+
+Large hieradata files can be reduced to the few top-level entries a
+script needs before parsing them, see filter_top_level.
+'''
+
+import copy
+import hashlib
+import io
+import re
+import threading
+
+import yaml
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeDumper
+    from yaml import SafeLoader
+
+# Top-level key of a block mapping: "key:", "'key':" or '"key":'
+TOP_LEVEL_KEY_RE = re.compile(
+    r"""^(['"]?)([^\s'"#{}\[\]?&*!|>%@`,-][^'"]*?)\1:(\s|$)""")
+# Alias node ("*anchor"), it may refer to an anchor of a dropped entry
+ALIAS_RE = re.compile(r"""(^|[\s\[{,])\*[^\s\[\]{},]+""")
+
+_parse_cache = {}
+_parse_cache_lock = threading.Lock()
+_roundtrip = {}
+
+
+def _get_roundtrip_yaml():
+    """Auxiliary function to get the shared ruamel.yaml round-trip instance."""
+    rt_yaml = _roundtrip.get('yaml')
+    if rt_yaml is None:
+        from ruamel.yaml import YAML
+        rt_yaml = YAML(typ='rt')
+        rt_yaml.default_flow_style = False
+        _roundtrip['yaml'] = rt_yaml
+    return rt_yaml
+
+
+def _cached_load(text, roundtrip):
+    """Auxiliary function to parse a document, or copy its cached parse."""
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    key = (roundtrip, hashlib.sha256(text.encode('utf-8')).hexdigest())
+    with _parse_cache_lock:
+        if key not in _parse_cache:
+            if roundtrip:
+                _parse_cache[key] = _get_roundtrip_yaml().load(text)
+            else:
+                _parse_cache[key] = yaml.load(text, Loader=SafeLoader)
+        return copy.deepcopy(_parse_cache[key])
+
+
+def load(text, roundtrip=False):
+    """Parse a YAML document.
+    With roundtrip the document keeps its comments and key order when
+    dumped again, otherwise plain python objects are returned.
+    """
+    return _cached_load(text, roundtrip)
+
+
+def load_all(text):
+    """Parse all the non-empty documents of a YAML stream."""
+    return [doc for doc in yaml.load_all(text, Loader=SafeLoader) if doc]
+
+
+def load_file(file_path, roundtrip=False):
+    """Parse a YAML file, see load."""
+    with open(file_path, 'r') as f:
+        return load(f.read(), roundtrip=roundtrip)
+
+
+def dump(data, roundtrip=False):
+    """Serialize a document to a YAML string in block style.
+    roundtrip must be set for documents loaded with roundtrip.
+    """
+    if roundtrip:
+        stream = io.StringIO()
+        _get_roundtrip_yaml().dump(data, stream)
+        return stream.getvalue()
+    return yaml.dump(data, Dumper=SafeDumper, default_flow_style=False)
+
+
+def dump_file(data, file_path, roundtrip=False):
+    """Serialize a document to a YAML file, see dump."""
+    content = dump(data, roundtrip=roundtrip)
+    with open(file_path, 'w') as f:
+        f.write(content)
+
+
+def get_configmap_document(configmap, key, roundtrip=False):
+    """Parse a YAML document embedded in a configmap, e.g. the kubeadm
+    ClusterConfiguration or the kubelet configuration.
+    configmap is either the configmap object of the k8s python client or
+    the configmap loaded from its YAML representation.
+    """
+    data = configmap['data'] if isinstance(configmap, dict) else configmap.data
+    return load(data[key], roundtrip=roundtrip)
+
+
+def set_configmap_document(configmap, key, document, roundtrip=False):
+    """Serialize a document and embed it in a configmap loaded from its
+    YAML representation. Round-trip documents are embedded as literal
+    blocks, so the configmap stays readable.
+    """
+    content = dump(document, roundtrip=roundtrip)
+    if roundtrip:
+        from ruamel.yaml.scalarstring import PreservedScalarString
+        content = PreservedScalarString(content)
+    configmap['data'][key] = content
+    return content
+
+
+def filter_top_level(text, keep):
+    """Keep the top-level entries of a YAML block mapping whose key
+    satisfies keep(key), without parsing the document. Comment lines at
+    the top level are dropped.
+    Return:
+     - str, the kept entries, empty if there are none.
+     - None, the document is not a plain block mapping that can be split
+       by its top-level lines (flow style, several documents, aliases in
+       the kept entries...) and must be parsed as a whole.
+    A line of a block scalar that looks like an alias also returns None,
+    which only costs a full parse. Tags are not checked, the kept entries
+    may still fail to load: the callers then parse the whole document.
+    """
+    lines = []
+    # whether the current entry is kept, None before the first entry
+    kept = None
+    for index, line in enumerate(text.splitlines(True)):
+        if index == 0 and line.rstrip() == '---':
+            continue
+        if line.startswith(('---', '...')):
+            return None
+        if not line.strip():
+            # blank lines are part of block scalars
+            if kept:
+                lines.append(line)
+            continue
+        if line[0] == '#':
+            continue
+        if line[0] in ' \t-':
+            # continuation of the current entry, indentless sequences
+            # included
+            if kept is None:
+                return None
+            if kept:
+                lines.append(line)
+            continue
+        match = TOP_LEVEL_KEY_RE.match(line)
+        if not match:
+            return None
+        kept = bool(keep(match.group(2)))
+        if kept:
+            lines.append(line)
+    if any(ALIAS_RE.search(line) for line in lines):
+        return None
+    return ''.join(lines)
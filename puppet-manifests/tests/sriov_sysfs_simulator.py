@@ -0,0 +1,258 @@
+#
+# Copyright (c) 2026 Wind River Systems, Inc.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+NETDEV_DRIVERS = ("iavf", "ixgbevf", "i40evf", "mlx5_core")
+VFS_PER_SLOT = 8
+
+
+def pf_addr(index):
+    return f"0000:{index + 0x10:02x}:00.0"
+
+
+def pf_netdev(index):
+    return f"enp{index + 0x10}s0f0"
+
+
+def vf_addr(pf_index, vf_index):
+    slot = 2 + vf_index // VFS_PER_SLOT
+    return f"0000:{pf_index + 0x10:02x}:{slot:02x}.{vf_index % VFS_PER_SLOT}"
+
+
+def sriov_config(num_pfs, num_vfs, up_requirement=False):
+    """
+    Build a sriov_config hieradata entry for num_pfs PFs with num_vfs VFs
+    each. The VFs are spread over iavf, vfio-pci and no driver, every
+    other VF has a max_tx_rate and every fourth iavf VF sets channels.
+    """
+    configs = {}
+    for pf_index in range(num_pfs):
+        vf_config = {}
+        for vf_index in range(num_vfs):
+            addr = vf_addr(pf_index, vf_index)
+            details = {'addr': addr}
+            if vf_index % 4 in (0, 1):
+                details['driver'] = 'iavf'
+                if vf_index % 8 == 0:
+                    details['vf_channels'] = 2
+            elif vf_index % 4 == 2:
+                details['driver'] = 'vfio-pci'
+            else:
+                details['driver'] = None
+            if vf_index % 2 == 0:
+                details['vfnumber'] = vf_index
+                details['max_tx_rate'] = 1000
+            vf_config[addr] = details
+
+        configs[f'sriov{pf_index}'] = {
+            'addr': pf_addr(pf_index),
+            'num_vfs': num_vfs,
+            'port_name': pf_netdev(pf_index),
+            'up_requirement': up_requirement,
+            'vf_config': vf_config,
+        }
+    return configs
+
+
+class _ModuleProxy():
+    """
+    Stand-in for a module imported by the simulated module: the given
+    attributes are replaced, the others are those of the real module.
+    """
+
+    def __init__(self, module, **overrides):
+        self._module = module
+        self.__dict__.update(overrides)
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+
+class SriovSysfsSimulator():
+    """
+    Simulated /sys/class/net and /sys/bus/pci/devices tree for parse_sriov.
+
+    The tree lives in a temporary directory with num_pfs PFs, all with
+    sriov_numvfs set to 0. While active:
+    - writing sriov_numvfs sleeps numvfs_latency seconds and creates the
+      VF PCI devices and virtfn links,
+    - 'dpdk-devbind.py --bind' sleeps bind_latency seconds and binds the
+      VFs, creating a netdev for netdev drivers,
+    - 'ip link set dev X up' sets IFF_UP on X,
+    - every other command succeeds immediately.
+
+    Subprocess spawns and sysfs operations (open, listdir, readlink,
+    isdir, isfile under the simulated tree) are counted. Only the
+    module's own references to these functions are replaced, the rest of
+    the process keeps the real ones.
+    """
+
+    def __init__(self, module, num_pfs, numvfs_latency=0.0, bind_latency=0.0):
+        self.module = module
+        self.num_pfs = num_pfs
+        self.numvfs_latency = numvfs_latency
+        self.bind_latency = bind_latency
+        self.root = None
+        self.net = None
+        self.pci = None
+        self.spawns = 0
+        self.sysfs_ops = 0
+        self.commands = []
+        self._lock = threading.Lock()
+        self._patchers = []
+        self._stdout_backup = None
+        self.output = io.StringIO()
+
+    def __enter__(self):
+        self.root = tempfile.mkdtemp(prefix='sriov_sysfs_')
+        self.net = os.path.join(self.root, 'class', 'net')
+        self.pci = os.path.join(self.root, 'bus', 'pci', 'devices')
+        os.makedirs(self.net)
+        os.makedirs(self.pci)
+        for index in range(self.num_pfs):
+            self._add_pf(index)
+
+        self._patchers = [
+            patch.object(self.module, 'SYSFS_NET', self.net),
+            patch.object(self.module, 'SYSFS_PCI', self.pci),
+            patch.object(self.module, 'UP_WAIT_TIMEOUT', 0),
+            patch.object(self.module, '_write_int_to_file', self._write_int_to_file),
+            patch.object(self.module, '_open_link_monitor', return_value=None),
+            patch.object(self.module, 'time', _ModuleProxy(time, sleep=self._sleep)),
+            patch.object(self.module, 'subprocess', _ModuleProxy(subprocess, run=self._run)),
+            patch.object(self.module, 'open', self._counted(open), create=True),
+            patch.object(self.module, 'os', _ModuleProxy(
+                os,
+                listdir=self._counted(os.listdir),
+                readlink=self._counted(os.readlink),
+                path=_ModuleProxy(os.path,
+                                  isdir=self._counted(os.path.isdir),
+                                  isfile=self._counted(os.path.isfile)))),
+        ]
+        for patcher in self._patchers:
+            patcher.start()
+        self.module.SriovTopology.invalidate()
+
+        self._stdout_backup = sys.stdout
+        sys.stdout = self.output
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        sys.stdout = self._stdout_backup
+        for patcher in reversed(self._patchers):
+            patcher.stop()
+        self.module.SriovTopology.invalidate()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def reset_counters(self):
+        with self._lock:
+            self.spawns = 0
+            self.sysfs_ops = 0
+            self.commands = []
+
+    # Simulated tree, built without going through the counted functions
+
+    @staticmethod
+    def _write_file(path, value):
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(f'{value}\n')
+
+    def _add_device(self, addr):
+        dev_dir = os.path.join(self.pci, addr)
+        os.makedirs(dev_dir, exist_ok=True)
+        return dev_dir
+
+    def _add_netdev(self, ifname, dev_dir, flags=0x1002):
+        net_dir = os.path.join(self.net, ifname)
+        os.makedirs(net_dir, exist_ok=True)
+        if not os.path.lexists(os.path.join(net_dir, 'device')):
+            os.symlink(dev_dir, os.path.join(net_dir, 'device'))
+        os.makedirs(os.path.join(dev_dir, 'net', ifname), exist_ok=True)
+        self._write_file(os.path.join(net_dir, 'flags'), f'{flags:#06x}')
+        self._write_file(os.path.join(net_dir, 'operstate'), 'down')
+
+    def _add_pf(self, index):
+        dev_dir = self._add_device(pf_addr(index))
+        self._write_file(os.path.join(dev_dir, 'sriov_numvfs'), 0)
+        self._add_netdev(pf_netdev(index), dev_dir)
+
+    def _set_numvfs(self, pf_index, num_vfs):
+        dev_dir = os.path.join(self.pci, pf_addr(pf_index))
+        for entry in os.scandir(dev_dir):
+            if entry.name.startswith('virtfn'):
+                vf_dir = os.path.normpath(
+                    os.path.join(dev_dir, os.readlink(entry.path)))
+                os.unlink(entry.path)
+                shutil.rmtree(vf_dir, ignore_errors=True)
+        for entry in os.scandir(self.net):
+            if entry.name.startswith(f'{pf_netdev(pf_index)}v'):
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+        for vf_index in range(num_vfs):
+            addr = vf_addr(pf_index, vf_index)
+            self._add_device(addr)
+            os.symlink(f'../{addr}', os.path.join(dev_dir, f'virtfn{vf_index}'))
+
+    def _bind(self, driver, addrs):
+        for addr in addrs:
+            dev_dir = os.path.join(self.pci, addr)
+            driver_link = os.path.join(dev_dir, 'driver')
+            if os.path.lexists(driver_link):
+                os.unlink(driver_link)
+            os.symlink(f'../../../drivers/{driver}', driver_link)
+            if driver in NETDEV_DRIVERS:
+                pf_index = int(addr.split(':')[1], 16) - 0x10
+                slot, function = addr.split(':')[2].split('.')
+                vf_index = (int(slot, 16) - 2) * VFS_PER_SLOT + int(function)
+                self._add_netdev(f'{pf_netdev(pf_index)}v{vf_index}', dev_dir)
+
+    # Replacements for the functions parse_sriov uses
+
+    def _counted(self, func):
+        def wrapper(path, *args, **kwargs):
+            if str(path).startswith(self.root):
+                with self._lock:
+                    self.sysfs_ops += 1
+            return func(path, *args, **kwargs)
+        return wrapper
+
+    @staticmethod
+    def _sleep(_seconds):
+        # Retry sleeps of the script are not part of the simulated cost
+        pass
+
+    def _write_int_to_file(self, path, value):
+        with self._lock:
+            self.sysfs_ops += 1
+        if os.path.basename(path) == 'sriov_numvfs':
+            time.sleep(self.numvfs_latency)
+            pf_index = int(os.path.basename(os.path.dirname(path)).split(':')[1], 16) - 0x10
+            self._set_numvfs(pf_index, value)
+        self._write_file(path, value)
+        return True
+
+    def _run(self, command, *_args, **_kwargs):
+        with self._lock:
+            self.spawns += 1
+            self.commands.append(command)
+
+        if command[0].endswith('dpdk-devbind.py') and command[1].startswith('--bind='):
+            time.sleep(self.bind_latency)
+            self._bind(command[1][len('--bind='):], command[2:])
+        elif command[:3] == ['ip', 'link', 'set'] and command[-1] == 'up':
+            self._write_file(os.path.join(self.net, command[4], 'flags'), '0x1003')
+
+        return MagicMock(returncode=0, stdout='', stderr='')
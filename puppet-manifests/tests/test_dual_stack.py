@@ -0,0 +1,229 @@
+#
+# Copyright (c) 2026 Wind River Systems, Inc.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+# dual_stack imports its helper modules as installed, next to it
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'debian', 'bullseye', 'src')
+sys.path.insert(0, os.path.join(SRC_DIR, 'modules', 'platform', 'files'))
+sys.path.insert(0, os.path.join(SRC_DIR, 'bin'))
+
+import dual_stack  # noqa: E402  pylint: disable=wrong-import-position
+
+CALICO_CNI_NETWORK_CONFIG = """{
+  "name": "k8s-pod-network",
+  "cniVersion": "0.3.1",
+  "plugins": [
+    {
+      "type": "calico",
+      "log_level": "info",
+      "datastore_type": "kubernetes",
+      "mtu": __CNI_MTU__,
+      "ipam": {
+          "type": "calico-ipam",
+          "assign_ipv4": "true",
+          "assign_ipv6": "false"
+      },
+      "kubernetes": {
+          "kubeconfig": "__KUBECONFIG_FILEPATH__"
+      }
+    },
+    {
+      "type": "portmap",
+      "snat": true,
+      "capabilities": {"portMappings": true}
+    }
+  ]
+}"""
+
+KUBE_PROXY_CONFIGMAP = {
+    'data': {'config.conf': 'kind: KubeProxyConfiguration\nclusterCIDR: 172.16.0.0/16\n'},
+}
+
+
+class FakeRollout(object):
+
+    def __init__(self, name, duration, events, required=True):
+        self.name = name
+        self.duration = duration
+        self.events = events
+        self.required = required
+
+    def __str__(self):
+        return self.name
+
+    def wait(self, deadline):
+        self.events.append(('wait', self.name))
+        time.sleep(self.duration)
+        return time.monotonic() <= deadline
+
+
+class TestDualStack(unittest.TestCase):
+
+    def test_plan_kubeproxy(self):
+        with patch.object(dual_stack.k8s_patch, 'get_object', return_value=KUBE_PROXY_CONFIGMAP):
+            self.assertEqual(dual_stack.plan_kubeproxy('172.16.0.0/16', None), [])
+            patches = dual_stack.plan_kubeproxy('172.16.0.0/16', 'fd00::/64')
+        self.assertEqual([(p.kind, p.name) for p in patches],
+                         [('configmap', 'kube-proxy'), ('daemonset', 'kube-proxy')])
+        self.assertIn('clusterCIDR: 172.16.0.0/16,fd00::/64',
+                      patches[0].patch['data']['config.conf'])
+
+    def test_fetch_error(self):
+        error = dual_stack.k8s_patch.K8sFetchError(
+            'configmap', 'kube-proxy', 'kube-system', 'connection refused', 3)
+        with patch.object(dual_stack.k8s_patch, 'get_object', side_effect=error):
+            self.assertRaises(dual_stack.DualStackError,
+                              dual_stack.plan_kubeproxy, '172.16.0.0/16', None)
+
+    def test_set_calico_node_env(self):
+        daemonset = {'spec': {'template': {'spec': {'containers': [{
+            'name': 'calico-node',
+            'env': [{'name': 'IP', 'value': 'autodetect'},
+                    {'name': 'IP6', 'value': 'none'}]}]}}}}
+        dual_stack.set_calico_node_env(daemonset, 'ipv6', 'true', 'fd00::2')
+        env = daemonset['spec']['template']['spec']['containers'][0]['env']
+        self.assertEqual(env, [{'name': 'IP', 'value': 'autodetect'},
+                               {'name': 'IP6', 'value': 'autodetect'},
+                               {'name': 'IP6_AUTODETECTION_METHOD',
+                                'value': 'can-reach=fd00::2'}])
+
+        dual_stack.set_calico_node_env(daemonset, 'ipv6', 'false', None)
+        env = daemonset['spec']['template']['spec']['containers'][0]['env']
+        self.assertEqual(env, [{'name': 'IP', 'value': 'autodetect'},
+                               {'name': 'IP6', 'value': 'none'}])
+
+    def test_assign_ip_data(self):
+        configmap = {'data': {'cni_network_config': CALICO_CNI_NETWORK_CONFIG,
+                              'typha_service_name': 'none'}}
+        keys = ('cni_network_config',)
+        self.assertEqual(dual_stack.assign_ip_data(configmap, 'ipv4', 'true', keys), {})
+
+        data = dual_stack.assign_ip_data(configmap, 'ipv6', 'true', keys)
+        self.assertEqual(list(data), ['cni_network_config'])
+        self.assertIn('"mtu": __CNI_MTU__,', data['cni_network_config'])
+        self.assertIn('"kubeconfig": "__KUBECONFIG_FILEPATH__"', data['cni_network_config'])
+        cni_config = dual_stack.load_cni_config(data['cni_network_config'])
+        self.assertEqual(cni_config['plugins'][0]['ipam'],
+                         {'type': 'calico-ipam', 'assign_ipv4': 'true', 'assign_ipv6': 'true'})
+        self.assertEqual(cni_config['plugins'][1], {'type': 'portmap', 'snat': True,
+                                                    'capabilities': {'portMappings': True}})
+
+        # the edited configuration is stable
+        configmap['data'].update(data)
+        self.assertEqual(dual_stack.assign_ip_data(configmap, 'ipv6', 'true', keys), {})
+
+    def test_assign_ip_data_multus(self):
+        configmap = {'data': {'cni-conf.json': json.dumps({
+            'name': 'multus-cni-network', 'type': 'multus',
+            'delegates': [{'type': 'calico',
+                           'ipam': {'type': 'calico-ipam', 'assign_ipv6': 'true'}}]})}}
+        data = dual_stack.assign_ip_data(configmap, 'ipv6', 'false')
+        cni_config = json.loads(data['cni-conf.json'])
+        self.assertEqual(cni_config['delegates'][0]['ipam']['assign_ipv6'], 'false')
+
+    def test_apply_patches_rollouts(self):
+        patches = [dual_stack.Patch('configmap', 'kube-proxy', {'data': {'a': '1'}}),
+                   dual_stack.Patch('daemonset', 'kube-proxy', {'spec': {}})]
+        with patch.object(dual_stack.k8s_patch, 'patch_object', return_value=True):
+            rollouts = dual_stack.apply_patches(patches)
+        self.assertEqual([str(rollout) for rollout in rollouts], ['daemonset/kube-proxy'])
+
+        with patch.object(dual_stack.k8s_patch, 'patch_object',
+                          side_effect=dual_stack.k8s_patch.K8sPatchError('denied')):
+            self.assertRaises(dual_stack.DualStackError, dual_stack.apply_patches, patches)
+
+    def test_wait_rollouts_concurrently(self):
+        events = []
+        rollouts = [FakeRollout(name, 0.2, events)
+                    for name in ('kube-proxy', 'calico-node', 'kube-multus-ds-amd64')]
+        start = time.monotonic()
+        self.assertTrue(dual_stack.wait_rollouts(rollouts, timeout=5))
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(len(events), 3)
+
+        self.assertFalse(dual_stack.wait_rollouts(
+            [FakeRollout('calico-node', 0.2, events)], timeout=0.1))
+        self.assertTrue(dual_stack.wait_rollouts([], timeout=0))
+
+    def test_wait_rollouts_not_required(self):
+        events = []
+        # a DaemonSet still rolling out is only reported
+        self.assertTrue(dual_stack.wait_rollouts(
+            [FakeRollout('calico-node', 0.2, events, required=False),
+             FakeRollout('kube-apiserver', 0, events)], timeout=0.1))
+        self.assertFalse(dual_stack.DaemonSetRollout.required)
+        self.assertTrue(dual_stack.StaticPodRollout.required)
+
+    def test_daemonset_rollout_deadline(self):
+        rollout = dual_stack.DaemonSetRollout('calico-node')
+        daemonset = {'status': {'desiredNumberScheduled': 4}}
+        with patch.object(dual_stack, 'get_object', return_value=daemonset):
+            self.assertEqual(rollout.nodes(), 4)
+        with patch.object(dual_stack, 'get_object',
+                          side_effect=dual_stack.DualStackError('timeout')):
+            self.assertEqual(rollout.nodes(), 0)
+
+        # the rollout gets a share per node, within the overall deadline
+        deadlines = []
+
+        def run(cmd, **kwargs):
+            deadlines.append(int(cmd[-1][len('--timeout='):-1]))
+            return subprocess.CompletedProcess(cmd, 0)
+
+        with patch.object(rollout, 'nodes', return_value=4), \
+                patch.object(dual_stack.subprocess, 'run', side_effect=run):
+            self.assertTrue(rollout.wait(time.monotonic() + 3600))
+            self.assertTrue(rollout.wait(time.monotonic() + 10))
+        expected = dual_stack.ROLLOUT_TIMEOUT + 4 * dual_stack.ROLLOUT_NODE_TIMEOUT
+        self.assertTrue(expected - 1 <= deadlines[0] <= expected)
+        self.assertTrue(deadlines[1] <= 10)
+
+    def test_reconfigure_order(self):
+        events = []
+        lock = threading.Lock()
+
+        def planner(name):
+            def plan():
+                with lock:
+                    events.append(('plan', name))
+                return [dual_stack.Patch('daemonset', name, {'spec': {}})]
+            return plan
+
+        def apply_patches(patches):
+            with lock:
+                events.append(('patch', patches[0].name))
+            return [FakeRollout(patches[0].name, 0, events)]
+
+        def update_control_plane(advertise_address):
+            events.append(('control-plane', advertise_address))
+            return [FakeRollout('kube-apiserver', 0, events)]
+
+        with patch.object(dual_stack, 'apply_patches', side_effect=apply_patches), \
+                patch.object(dual_stack, 'update_control_plane',
+                             side_effect=update_control_plane):
+            self.assertTrue(dual_stack.reconfigure(
+                {'kubeproxy': planner('kube-proxy'), 'calico': planner('calico-node')},
+                advertise_address='192.168.206.2'))
+
+        kinds = [event[0] for event in events]
+        # the control-plane is updated after all the patches, before any wait
+        self.assertEqual(kinds[4], 'control-plane')
+        self.assertEqual(sorted(kinds[:4]), ['patch', 'patch', 'plan', 'plan'])
+        self.assertEqual(sorted(events[5:]), [('wait', 'calico-node'),
+                                              ('wait', 'kube-apiserver'),
+                                              ('wait', 'kube-proxy')])
+
+
+if __name__ == '__main__':
+    unittest.main()
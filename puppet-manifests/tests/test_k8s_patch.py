@@ -0,0 +1,140 @@
+#
+# Copyright (c) 2026 Wind River Systems, Inc.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+
+import copy
+import json
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import debian.bullseye.src.bin.k8s_patch as k8s_patch
+
+
+def calico_node(env):
+    return {
+        'kind': 'DaemonSet',
+        'metadata': {'name': 'calico-node', 'namespace': 'kube-system'},
+        'spec': {'template': {'spec': {'containers': [
+            {'name': 'calico-node', 'image': 'calico/node', 'env': env},
+            {'name': 'sidecar', 'image': 'sidecar'},
+        ]}}},
+    }
+
+
+class TestK8sPatch(unittest.TestCase):
+
+    def setUp(self):
+        k8s_patch._objects.clear()
+
+    def test_configmap_data_patch(self):
+        configmap = {'data': {'a': '1', 'b': '2'}}
+        self.assertIsNone(k8s_patch.configmap_data_patch(configmap, {'a': '1'}))
+        self.assertEqual(k8s_patch.configmap_data_patch(configmap, {'a': '1', 'b': '3'}),
+                         {'data': {'b': '3'}})
+
+    def test_pod_template_env_patch(self):
+        current = calico_node([
+            {'name': 'IP', 'value': 'autodetect'},
+            {'name': 'IP6', 'value': 'none'},
+            {'name': 'IP_AUTODETECTION_METHOD', 'value': 'can-reach=10.0.0.2'},
+        ])
+        self.assertIsNone(k8s_patch.pod_template_env_patch(current, copy.deepcopy(current)))
+
+        desired = calico_node([
+            {'name': 'IP', 'value': 'none'},
+            {'name': 'IP6', 'value': 'none'},
+            {'name': 'IP6_AUTODETECTION_METHOD', 'value': 'can-reach=fd00::2'},
+        ])
+        self.assertEqual(
+            k8s_patch.pod_template_env_patch(current, desired),
+            {'spec': {'template': {'spec': {'containers': [{
+                'name': 'calico-node',
+                'env': [
+                    {'name': 'IP', 'value': 'none'},
+                    {'name': 'IP6_AUTODETECTION_METHOD', 'value': 'can-reach=fd00::2'},
+                    {'name': 'IP_AUTODETECTION_METHOD', '$patch': 'delete'},
+                ]}]}}}})
+
+    def test_empty_patch_is_not_sent(self):
+        with patch.object(k8s_patch, 'get_api_client') as get_api_client, \
+                patch.object(k8s_patch.subprocess, 'run') as run:
+            self.assertFalse(k8s_patch.patch_object('daemonset', 'calico-node',
+                                                    'kube-system', None))
+        get_api_client.assert_not_called()
+        run.assert_not_called()
+
+    def test_kubectl_fallback(self):
+        with patch.object(k8s_patch, 'get_api_client', return_value=None), \
+                patch.object(k8s_patch.subprocess, 'run',
+                             return_value=MagicMock(returncode=0)) as run:
+            self.assertTrue(k8s_patch.patch_object(
+                'configmap', 'kube-proxy', 'kube-system', {'data': {'a': '1'}}))
+            self.assertTrue(k8s_patch.patch_object(
+                'configmap', 'kube-proxy', 'kube-system',
+                [{'op': 'replace', 'path': '/data/a', 'value': '1'}]))
+        self.assertEqual(run.call_args_list[0][0][0][-4:],
+                         ['--type', 'strategic', '-p', '{"data": {"a": "1"}}'])
+        self.assertEqual(run.call_args_list[1][0][0][-3], 'json')
+
+    def test_kubectl_fallback_error(self):
+        with patch.object(k8s_patch, 'get_api_client', return_value=None), \
+                patch.object(k8s_patch.subprocess, 'run',
+                             return_value=MagicMock(returncode=1, stderr=b'not found')):
+            self.assertRaises(k8s_patch.K8sPatchError, k8s_patch.patch_object,
+                              'configmap', 'kube-proxy', 'kube-system', {'data': {}})
+
+    def test_get_object_is_fetched_once(self):
+        configmap = {'metadata': {'name': 'kube-proxy'}, 'data': {'a': '1'}}
+        with patch.object(k8s_patch, 'get_api_client', return_value=None), \
+                patch.object(k8s_patch.subprocess, 'run', return_value=MagicMock(
+                    returncode=0, stdout=json.dumps(configmap).encode())) as run:
+            first = k8s_patch.get_object('configmap', 'kube-proxy', 'kube-system')
+            first['data']['a'] = '2'
+            second = k8s_patch.get_object('configmap', 'kube-proxy', 'kube-system')
+            self.assertEqual(run.call_count, 1)
+            self.assertEqual(second, configmap)
+
+            # a patched object is fetched again
+            k8s_patch.patch_object('configmap', 'kube-proxy', 'kube-system', {'data': {'a': '2'}})
+            k8s_patch.get_object('configmap', 'kube-proxy', 'kube-system')
+        self.assertEqual(run.call_count, 3)
+
+    def test_get_object_retries(self):
+        error = MagicMock(returncode=1, stderr=b'connection refused')
+        success = MagicMock(returncode=0, stdout=b'{"data": {}}')
+        with patch.object(k8s_patch, 'get_api_client', return_value=None), \
+                patch.object(k8s_patch.subprocess, 'run',
+                             side_effect=[error, error, success]) as run, \
+                patch.object(k8s_patch.time, 'sleep') as sleep:
+            self.assertEqual(k8s_patch.get_object('configmap', 'calico-config', 'kube-system'),
+                             {'data': {}})
+        self.assertEqual(run.call_count, 3)
+        delays = [call[0][0] for call in sleep.call_args_list]
+        self.assertTrue(k8s_patch.FETCH_MIN_SLEEP / 2 <= delays[0] <= k8s_patch.FETCH_MIN_SLEEP)
+        self.assertTrue(k8s_patch.FETCH_MIN_SLEEP <= delays[1] <= 2 * k8s_patch.FETCH_MIN_SLEEP)
+
+    def test_get_object_errors(self):
+        with patch.object(k8s_patch, 'get_api_client', return_value=None), \
+                patch.object(k8s_patch.subprocess, 'run', return_value=MagicMock(
+                    returncode=1, stderr=b'Error from server (NotFound): not found')) as run:
+            with self.assertRaises(k8s_patch.K8sFetchError) as cm:
+                k8s_patch.get_object('configmap', 'multus-daemon-config', 'kube-system')
+        self.assertTrue(cm.exception.not_found)
+        self.assertEqual(run.call_count, 1)
+
+        with patch.object(k8s_patch, 'get_api_client', return_value=None), \
+                patch.object(k8s_patch.subprocess, 'run', return_value=MagicMock(
+                    returncode=1, stderr=b'connection refused')), \
+                patch.object(k8s_patch.time, 'sleep'):
+            with self.assertRaises(k8s_patch.K8sFetchError) as cm:
+                k8s_patch.get_object('configmap', 'kube-proxy', 'kube-system', timeout=0)
+        self.assertFalse(cm.exception.not_found)
+        self.assertEqual(cm.exception.reason, 'connection refused')
+        self.assertEqual(cm.exception.attempts, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
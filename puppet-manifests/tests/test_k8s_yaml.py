@@ -0,0 +1,107 @@
+#
+# Copyright (c) 2026 Wind River Systems, Inc.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import debian.bullseye.src.modules.platform.files.k8s_yaml as k8s_yaml
+
+CLUSTER_CONFIGURATION = """apiVersion: kubeadm.k8s.io/v1beta3
+kind: ClusterConfiguration
+networking:
+  podSubnet: 172.16.0.0/16
+  serviceSubnet: 10.96.0.0/12
+"""
+
+KUBEADM_CONFIGMAP = {
+    'apiVersion': 'v1',
+    'kind': 'ConfigMap',
+    'metadata': {'name': 'kubeadm-config', 'namespace': 'kube-system'},
+    'data': {'ClusterConfiguration': CLUSTER_CONFIGURATION},
+}
+
+
+class TestK8sYaml(unittest.TestCase):
+
+    def setUp(self):
+        k8s_yaml._parse_cache.clear()
+
+    def test_load_is_parsed_once(self):
+        with patch.object(k8s_yaml.yaml, 'load', wraps=k8s_yaml.yaml.load) as load:
+            first = k8s_yaml.load(CLUSTER_CONFIGURATION)
+            second = k8s_yaml.load(CLUSTER_CONFIGURATION.encode('utf-8'))
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(first, second)
+
+    def test_load_returns_copies(self):
+        first = k8s_yaml.load(CLUSTER_CONFIGURATION)
+        first['networking']['podSubnet'] = 'fd00::/64'
+        second = k8s_yaml.load(CLUSTER_CONFIGURATION)
+        self.assertEqual(second['networking']['podSubnet'], '172.16.0.0/16')
+
+    def test_load_all_skips_empty_documents(self):
+        docs = k8s_yaml.load_all('---\nkind: A\n---\n---\nkind: B\n')
+        self.assertEqual(docs, [{'kind': 'A'}, {'kind': 'B'}])
+
+    def test_configmap_document(self):
+        configmap = k8s_yaml.load(k8s_yaml.dump(KUBEADM_CONFIGMAP))
+        cluster_cfg = k8s_yaml.get_configmap_document(configmap, 'ClusterConfiguration')
+        self.assertEqual(cluster_cfg['kind'], 'ClusterConfiguration')
+
+        cluster_cfg['networking']['podSubnet'] = '172.16.0.0/16,fd00::/64'
+        content = k8s_yaml.set_configmap_document(
+            configmap, 'ClusterConfiguration', cluster_cfg)
+        self.assertEqual(configmap['data']['ClusterConfiguration'], content)
+        self.assertEqual(k8s_yaml.load(content), cluster_cfg)
+
+    def test_dump_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'configmap.yaml')
+            k8s_yaml.dump_file(KUBEADM_CONFIGMAP, file_path)
+            self.assertEqual(k8s_yaml.load_file(file_path), KUBEADM_CONFIGMAP)
+
+    def test_filter_top_level(self):
+        text = ("---\n"
+                "platform::params::hostname: controller-0\n"
+                "platform::kubernetes::params:\n"
+                "  apiserver:\n"
+                "  - a\n"
+                "\n"
+                "# unrelated entries are never parsed\n"
+                "'platform::unrelated::object': !!python/object:os.path {}\n"
+                "platform::kubernetes::kubelet: |\n"
+                "  line\n"
+                "list:\n"
+                "- not kept\n")
+        self.assertEqual(
+            k8s_yaml.filter_top_level(text, lambda key: key.startswith('platform::kubernetes::')),
+            "platform::kubernetes::params:\n"
+            "  apiserver:\n"
+            "  - a\n"
+            "\n"
+            "platform::kubernetes::kubelet: |\n"
+            "  line\n")
+        self.assertEqual(k8s_yaml.filter_top_level(text, lambda key: False), '')
+
+    def test_filter_top_level_not_a_block_mapping(self):
+        for text in ("{a: 1}\n", "- a\n", "a: 1\n---\nb: 2\n", "&anchor a: 1\n"):
+            self.assertIsNone(k8s_yaml.filter_top_level(text, lambda key: True), msg=text)
+
+    def test_filter_top_level_aliases(self):
+        # the alias of a kept entry may refer to a dropped anchor
+        for text in ("a: &x\n  k: 1\nb: *x\n", "a: &x 1\nb:\n- *x\n", "b: [1, *x]\n"):
+            self.assertIsNone(k8s_yaml.filter_top_level(text, lambda key: key == 'b'),
+                              msg=text)
+        # anchors and aliases of dropped entries don't matter
+        self.assertEqual(
+            k8s_yaml.filter_top_level("a: &x 1\nb: 2 * 3\nc: *x\n", lambda key: key == 'b'),
+            "b: 2 * 3\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
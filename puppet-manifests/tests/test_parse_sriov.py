@@ -7,7 +7,6 @@
 import io
 import json
 import os
-import debian.bullseye.src.bin.parse_sriov as parse_sriov
 import sys
 import tempfile
 import unittest
@@ -15,6 +14,13 @@ import yaml
 from unittest.mock import patch
 from unittest.mock import MagicMock
 
+# parse_sriov imports k8s_yaml as installed, next to it
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'debian', 'bullseye',
+                                'src', 'modules', 'platform', 'files'))
+
+# pylint: disable=wrong-import-position
+import debian.bullseye.src.bin.parse_sriov as parse_sriov  # noqa: E402
+
 
 def valid_python_format_config():
     return {
@@ -124,6 +130,9 @@ class MockHelper:
 
     def __enter__(self):
 
+        # Never reuse a sysfs index built by a previous test
+        parse_sriov.SriovTopology.invalidate()
+
         # For stdout
         self._stdout_backup = sys.stdout
         self._stringio = io.StringIO()
@@ -139,6 +148,7 @@ class MockHelper:
     def __exit__(self, exc_type, exc_value, traceback):
         # Restore stdout
         sys.stdout = self._stdout_backup
+        parse_sriov.SriovTopology.invalidate()
 
         # Stop subprocess patcher
         if self.subprocess_patcher:
@@ -713,6 +723,39 @@ class TestMainFunction(unittest.TestCase):
             os.remove(temp_filename)
 
 
+#####################################################################
+# Tests for the key-scoped YAML loader
+class TestLoadYamlConfig(unittest.TestCase):
+
+    HIERADATA = (
+        "---\n"
+        "platform::params::hostname: controller-0\n"
+        "platform::network::interfaces::sriov::sriov_config:\n"
+        "  sriov0:\n"
+        "    addr: '0000:07:00.0'\n"
+        "    num_vfs: 2\n"
+        "\n"
+        "# unrelated entries are never parsed\n"
+        "platform::unrelated::object: !!python/object:os.path {}\n")
+
+    def test_load_yaml_config_only_parses_sriov_entry(self):
+        data = parse_sriov._load_yaml_config(self.HIERADATA)  # pylint: disable=protected-access
+
+        self.assertEqual(data, {
+            'platform::network::interfaces::sriov::sriov_config': {
+                'sriov0': {'addr': '0000:07:00.0', 'num_vfs': 2}}})
+
+    def test_load_yaml_config_fallback_to_whole_document(self):
+        text = ("base: &pf\n"
+                "  num_vfs: 2\n"
+                "platform::network::interfaces::sriov::sriov_config:\n"
+                "  sriov0: *pf\n")
+
+        data = parse_sriov._load_yaml_config(text)  # pylint: disable=protected-access
+
+        self.assertEqual(data, yaml.safe_load(text))
+
+
 #####################################################################
 # Tests for enable_sriov_from_data / enable_sriov_from_configs
 class TestEnableSriovFunctions(unittest.TestCase):
@@ -909,72 +952,165 @@ class TestEnableSriovSkipWhenAlreadyConfigured(unittest.TestCase):
         )
 
 
+class FakeSysfs():
+    """
+    Minimal /sys/class/net and /sys/bus/pci/devices tree in a temporary
+    directory, with SYSFS_NET and SYSFS_PCI pointed at it.
+    """
+
+    def __init__(self):
+        self._tmpdir = None
+        self._patchers = []
+        self.net = None
+        self.pci = None
+
+    def __enter__(self):
+        # pylint: disable=consider-using-with
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.net = os.path.join(self._tmpdir.name, 'class', 'net')
+        self.pci = os.path.join(self._tmpdir.name, 'bus', 'pci', 'devices')
+        os.makedirs(self.net)
+        os.makedirs(self.pci)
+        self._patchers = [
+            patch('debian.bullseye.src.bin.parse_sriov.SYSFS_NET', self.net),
+            patch('debian.bullseye.src.bin.parse_sriov.SYSFS_PCI', self.pci)]
+        for patcher in self._patchers:
+            patcher.start()
+        parse_sriov.SriovTopology.invalidate()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for patcher in self._patchers:
+            patcher.stop()
+        parse_sriov.SriovTopology.invalidate()
+        self._tmpdir.cleanup()
+
+    def _write(self, path, value):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f'{value}\n')
+
+    def add_device(self, pci_addr, netdev=None, driver=None):
+        dev_dir = os.path.join(self.pci, pci_addr)
+        os.makedirs(dev_dir, exist_ok=True)
+        if driver:
+            os.symlink(f'../../../drivers/{driver}',
+                       os.path.join(dev_dir, 'driver'))
+        if netdev:
+            net_dir = os.path.join(self.net, netdev)
+            os.makedirs(net_dir)
+            os.symlink(dev_dir, os.path.join(net_dir, 'device'))
+            os.makedirs(os.path.join(dev_dir, 'net', netdev))
+        return dev_dir
+
+    def add_pf(self, pci_addr, netdev, numvfs=0, vfs=None):
+        dev_dir = self.add_device(pci_addr, netdev)
+        self._write(os.path.join(dev_dir, 'sriov_numvfs'), numvfs)
+        for index, (vf_addr, vf_netdev, vf_driver) in enumerate(vfs or []):
+            self.add_device(vf_addr, vf_netdev, vf_driver)
+            os.symlink(f'../{vf_addr}', os.path.join(dev_dir, f'virtfn{index}'))
+        return dev_dir
+
+    def read_numvfs(self, pci_addr):
+        path = os.path.join(self.pci, pci_addr, 'sriov_numvfs')
+        with open(path, 'r', encoding='utf-8') as f:
+            return int(f.read())
+
+
+#####################################################################
+# Tests for SriovTopology
+class TestSriovTopology(unittest.TestCase):
+
+    def test_topology_index(self):
+        with FakeSysfs() as sysfs, MockHelper(stdout='') as mock_helper:
+            sysfs.add_pf('0000:0d:00.0', 'enp13s0f0', numvfs=2, vfs=[
+                ('0000:0d:02.0', 'enp13s0f0v0', 'iavf'),
+                ('0000:0d:02.1', None, 'vfio-pci')])
+            sysfs.add_device('0000:00:1f.6', 'eno1')
+            os.makedirs(os.path.join(sysfs.net, 'lo'))
+
+            topology = parse_sriov.SriovTopology.get()
+
+            self.assertIs(topology, parse_sriov.SriovTopology.get())
+            self.assertEqual(topology.get_netdevs('0000:0d:00.0'), ['enp13s0f0'])
+            self.assertEqual(topology.pf_to_vfs,
+                             {'0000:0d:00.0': ['0000:0d:02.0', '0000:0d:02.1']})
+            self.assertEqual(topology.numvfs, {'0000:0d:00.0': 2})
+            self.assertNotIn('lo', topology.netdev_to_pci)
+
+            # pylint: disable=protected-access
+            self.assertEqual(parse_sriov._get_vf_netdev('0000:0d:02.0'), 'enp13s0f0v0')
+            self.assertIsNone(parse_sriov._get_vf_netdev('0000:0d:02.1'))
+            self.assertEqual(parse_sriov._get_pf_netdevs('0000:0d:00.0'), ['enp13s0f0'])
+
+        self.assertEqual(mock_helper.get_output(), [])
+
+    def test_sriov_bind_skips_already_bound_vfs(self):
+        with FakeSysfs() as sysfs, MockHelper(stdout='') as mock_helper:
+            sysfs.add_pf('0000:0d:00.0', 'enp13s0f0', numvfs=2, vfs=[
+                ('0000:0d:02.0', 'enp13s0f0v0', 'iavf'),
+                ('0000:0d:02.1', None, None)])
+
+            result = parse_sriov.sriov_bind('iavf', ['0000:0d:02.0', '0000:0d:02.1'])
+
+        self.assertTrue(result)
+        self.assertEqual(
+            mock_helper.get_called_commands(),
+            [['/usr/sbin/modprobe', 'iavf'],
+             ['/usr/share/starlingx/scripts/dpdk-devbind.py', '--bind=iavf',
+              '0000:0d:02.1']])
+        self.assertIn('sriov_vf_bind driver: iavf - already bound VFs:0000:0d:02.0',
+                      mock_helper.get_output())
+
+    def test_sriov_bind_rereads_stale_driver(self):
+        with FakeSysfs() as sysfs, MockHelper(stdout='') as mock_helper:
+            sysfs.add_pf('0000:0d:00.0', 'enp13s0f0', numvfs=1, vfs=[
+                ('0000:0d:02.0', 'enp13s0f0v0', 'iavf')])
+            parse_sriov.SriovTopology.get()
+            # unbound after the index was built
+            os.unlink(os.path.join(sysfs.pci, '0000:0d:02.0', 'driver'))
+
+            result = parse_sriov.sriov_bind('iavf', ['0000:0d:02.0'])
+
+        self.assertTrue(result)
+        self.assertEqual(
+            mock_helper.get_called_commands(),
+            [['/usr/sbin/modprobe', 'iavf'],
+             ['/usr/share/starlingx/scripts/dpdk-devbind.py', '--bind=iavf',
+              '0000:0d:02.0']])
+
+    def test_reset_orphaned_scan_error(self):
+        with FakeSysfs(), MockHelper(stdout='') as mock_helper, \
+                patch('debian.bullseye.src.bin.parse_sriov.os.listdir',
+                      side_effect=OSError('I/O error')):
+            self.assertFalse(parse_sriov.reset_orphaned_sriov_vfs({}))
+
+        self.assertIn('ERROR: reset_orphaned_sriov_vfs: I/O error',
+                      mock_helper.get_output())
+
+
 #####################################################################
 # Tests for reset_orphaned_sriov_vfs
 class TestResetOrphanedSriovVfs(unittest.TestCase):
 
-    @patch('sys.stdout', new_callable=io.StringIO)
-    @patch('debian.bullseye.src.bin.parse_sriov.os.path.isdir', return_value=True)
-    @patch('debian.bullseye.src.bin.parse_sriov.os.listdir',
-           return_value=['enp13s0f0', 'enp13s0f2', 'lo'])
-    @patch('debian.bullseye.src.bin.parse_sriov.os.path.isfile')
-    @patch('debian.bullseye.src.bin.parse_sriov._read_int_from_file')
-    @patch('debian.bullseye.src.bin.parse_sriov.os.readlink')
-    @patch('debian.bullseye.src.bin.parse_sriov._write_int_to_file',
-           return_value=True)
-    def test_resets_orphaned_vfs(  # pylint: disable=too-many-arguments
-            self, mock_write, mock_readlink,
-            mock_read, mock_isfile,
-            _mock_listdir, _mock_isdir,
-            mock_stdout):
+    def test_resets_orphaned_vfs(self):
         """VFs on a PF not in config should be reset to 0."""
-        def isfile_side_effect(path):
-            return 'sriov_numvfs' in path and 'lo' not in path
-
-        def read_side_effect(path):
-            if 'enp13s0f0' in path:
-                return 1
-            if 'enp13s0f2' in path:
-                return 0
-            return None
+        with FakeSysfs() as sysfs, MockHelper(stdout='') as mock_helper:
+            sysfs.add_pf('0000:0d:00.0', 'enp13s0f0', numvfs=1)
+            sysfs.add_pf('0000:0d:00.2', 'enp13s0f2', numvfs=0)
+            os.makedirs(os.path.join(sysfs.net, 'lo'))
 
-        def readlink_side_effect(path):
-            if 'enp13s0f0' in path:
-                return '../../../0000:0d:00.0'
-            if 'enp13s0f2' in path:
-                return '../../../0000:0d:00.2'
-            return ''
+            result = parse_sriov.reset_orphaned_sriov_vfs({})
 
-        mock_isfile.side_effect = isfile_side_effect
-        mock_read.side_effect = read_side_effect
-        mock_readlink.side_effect = readlink_side_effect
+            self.assertTrue(result)
+            # Only enp13s0f0 has VFs > 0 and is not in config
+            self.assertEqual(sysfs.read_numvfs('0000:0d:00.0'), 0)
+            self.assertEqual(sysfs.read_numvfs('0000:0d:00.2'), 0)
 
-        result = parse_sriov.reset_orphaned_sriov_vfs({})
-
-        self.assertTrue(result)
-        # Only enp13s0f0 has VFs > 0 and is not in config
-        mock_write.assert_called_once_with(
-            '/sys/class/net/enp13s0f0/device/sriov_numvfs', 0)
         self.assertIn("Resetting orphaned SR-IOV VFs on PF 0000:0d:00.0",
-                      mock_stdout.getvalue())
+                      mock_helper.get_output_str())
+        self.assertNotIn("0000:0d:00.2", mock_helper.get_output_str())
 
-    @patch('sys.stdout', new_callable=io.StringIO)
-    @patch('debian.bullseye.src.bin.parse_sriov.os.path.isdir', return_value=True)
-    @patch('debian.bullseye.src.bin.parse_sriov.os.listdir',
-           return_value=['enp13s0f0'])
-    @patch('debian.bullseye.src.bin.parse_sriov.os.path.isfile',
-           return_value=True)
-    @patch('debian.bullseye.src.bin.parse_sriov._read_int_from_file',
-           return_value=32)
-    @patch('debian.bullseye.src.bin.parse_sriov.os.readlink',
-           return_value='../../../0000:0d:00.0')
-    @patch('debian.bullseye.src.bin.parse_sriov._write_int_to_file',
-           return_value=True)
-    def test_skips_configured_pf(  # pylint: disable=too-many-arguments
-            self, mock_write, _mock_readlink,
-            _mock_read, _mock_isfile,
-            _mock_listdir, _mock_isdir,
-            mock_stdout):
+    def test_skips_configured_pf(self):
         """PFs that are in the config should NOT be reset."""
         sriov_configs = {
             'sriov0': {
@@ -986,45 +1122,126 @@ class TestResetOrphanedSriovVfs(unittest.TestCase):
             }
         }
 
-        result = parse_sriov.reset_orphaned_sriov_vfs(sriov_configs)
+        with FakeSysfs() as sysfs, MockHelper(stdout='') as mock_helper:
+            sysfs.add_pf('0000:0d:00.0', 'enp13s0f0', numvfs=32)
 
-        self.assertTrue(result)
-        mock_write.assert_not_called()
-        self.assertEqual(mock_stdout.getvalue(), "")
+            result = parse_sriov.reset_orphaned_sriov_vfs(sriov_configs)
+
+            self.assertTrue(result)
+            self.assertEqual(sysfs.read_numvfs('0000:0d:00.0'), 32)
 
-    @patch('sys.stdout', new_callable=io.StringIO)
-    @patch('debian.bullseye.src.bin.parse_sriov.os.path.isdir',
-           return_value=False)
-    def test_no_sysfs_net_dir(self, _mock_isdir, mock_stdout):
+        self.assertEqual(mock_helper.get_output_str(), "")
+
+    def test_no_sysfs_net_dir(self):
         """When /sys/class/net doesn't exist, return True (no-op)."""
-        result = parse_sriov.reset_orphaned_sriov_vfs({})
+        with patch('debian.bullseye.src.bin.parse_sriov.SYSFS_NET',
+                   '/nonexistent/class/net'), \
+             MockHelper(stdout='') as mock_helper:
+            result = parse_sriov.reset_orphaned_sriov_vfs({})
 
         self.assertTrue(result)
-        self.assertEqual(mock_stdout.getvalue(), "")
+        self.assertEqual(mock_helper.get_output_str(), "")
 
-    @patch('sys.stdout', new_callable=io.StringIO)
-    @patch('debian.bullseye.src.bin.parse_sriov.os.path.isdir', return_value=True)
-    @patch('debian.bullseye.src.bin.parse_sriov.os.listdir',
-           return_value=['enp13s0f0'])
-    @patch('debian.bullseye.src.bin.parse_sriov.os.path.isfile',
-           return_value=True)
-    @patch('debian.bullseye.src.bin.parse_sriov._read_int_from_file',
-           return_value=1)
-    @patch('debian.bullseye.src.bin.parse_sriov.os.readlink',
-           return_value='../../../0000:0d:00.0')
-    @patch('debian.bullseye.src.bin.parse_sriov._write_int_to_file',
-           return_value=False)
-    def test_write_failure_returns_false(  # pylint: disable=too-many-arguments
-            self, _mock_write,
-            _mock_readlink, _mock_read,
-            _mock_isfile, _mock_listdir,
-            _mock_isdir, mock_stdout):
+    def test_write_failure_returns_false(self):
         """When writing 0 to sriov_numvfs fails, return False."""
-        result = parse_sriov.reset_orphaned_sriov_vfs({})
+        with FakeSysfs() as sysfs, \
+             patch('debian.bullseye.src.bin.parse_sriov._write_int_to_file',
+                   return_value=False), \
+             MockHelper(stdout='') as mock_helper:
+            sysfs.add_pf('0000:0d:00.0', 'enp13s0f0', numvfs=1)
+
+            result = parse_sriov.reset_orphaned_sriov_vfs({})
 
         self.assertFalse(result)
         self.assertIn("ERROR: Failed to reset sriov_numvfs",
-                      mock_stdout.getvalue())
+                      mock_helper.get_output_str())
+
+
+#####################################################################
+# Tests for _bring_up_netdevs / _iface_is_up
+class TestBringUpNetdevs(unittest.TestCase):
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.sysfs_patcher = patch(
+            'debian.bullseye.src.bin.parse_sriov.SYSFS_NET', self.tmpdir.name)
+        self.sysfs_patcher.start()
+
+    def tearDown(self):
+        self.sysfs_patcher.stop()
+        self.tmpdir.cleanup()
+
+    def _add_iface(self, ifname, flags, operstate='down'):
+        path = os.path.join(self.tmpdir.name, ifname)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'flags'), 'w', encoding='utf-8') as f:
+            f.write(f'{flags:#06x}\n')
+        with open(os.path.join(path, 'operstate'), 'w', encoding='utf-8') as f:
+            f.write(f'{operstate}\n')
+
+    def test_iface_is_up_reads_sysfs_flags(self):
+        self._add_iface('eth0', 0x1003, 'up')
+        self._add_iface('eth1', 0x1002)
+
+        with MockHelper(stdout='') as mock_helper:
+            self.assertTrue(parse_sriov._iface_is_up('eth0'))  # pylint: disable=protected-access
+            self.assertFalse(parse_sriov._iface_is_up('eth1'))  # pylint: disable=protected-access
+            self.assertFalse(parse_sriov._iface_is_up('eth2'))  # pylint: disable=protected-access
+
+        self.assertEqual(mock_helper.get_called_commands(), [])
+
+    def test_bring_up_skips_interfaces_already_up(self):
+        self._add_iface('eth0', 0x1003, 'up')
+
+        with patch('debian.bullseye.src.bin.parse_sriov._open_link_monitor') as mock_monitor, \
+             MockHelper(stdout='') as mock_helper:
+            result = parse_sriov._bring_up_netdevs(['eth0'])  # pylint: disable=protected-access
+
+        self.assertTrue(result)
+        mock_monitor.assert_not_called()
+        self.assertEqual(mock_helper.get_called_commands(), [])
+
+    def test_bring_up_waits_for_link_events(self):
+        self._add_iface('eth0', 0x1002)
+        self._add_iface('eth1', 0x1002)
+        events = []
+
+        def link_event(_sock, _timeout):
+            # Each notification brings one more interface up
+            ifname = ['eth0', 'eth1'][len(events)]
+            events.append(ifname)
+            self._add_iface(ifname, 0x1003, 'up')
+
+        with patch('debian.bullseye.src.bin.parse_sriov._open_link_monitor',
+                   return_value=None), \
+             patch('debian.bullseye.src.bin.parse_sriov._wait_for_link_event',
+                   side_effect=link_event), \
+             MockHelper(stdout='') as mock_helper:
+            result = parse_sriov._bring_up_netdevs(  # pylint: disable=protected-access
+                ['eth0', 'eth1'])
+
+        self.assertTrue(result)
+        self.assertEqual(events, ['eth0', 'eth1'])
+        self.assertEqual(
+            sorted(mock_helper.get_called_commands()),
+            [['ip', 'link', 'set', 'dev', 'eth0', 'up'],
+             ['ip', 'link', 'set', 'dev', 'eth1', 'up']])
+        self.assertEqual(mock_helper.get_output(), [])
+
+    def test_bring_up_timeout_reports_operstate(self):
+        self._add_iface('eth0', 0x1002, 'lowerlayerdown')
+
+        with patch('debian.bullseye.src.bin.parse_sriov._open_link_monitor',
+                   return_value=None), \
+             patch('debian.bullseye.src.bin.parse_sriov.UP_WAIT_TIMEOUT', 0), \
+             MockHelper(stdout='') as mock_helper:
+            result = parse_sriov._bring_up_netdevs(['eth0'])  # pylint: disable=protected-access
+
+        self.assertFalse(result)
+        self.assertIn("ERROR: Interface 'eth0' did not go up in the allotted time "
+                      "(operstate: lowerlayerdown)",
+                      mock_helper.get_output_str())
 
 
 class TestParseAndProcessWithOrphanReset(unittest.TestCase):
@@ -0,0 +1,105 @@
+#
+# Copyright (c) 2026 Wind River Systems, Inc.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+
+import os
+import sys
+import time
+import unittest
+
+# parse_sriov imports k8s_yaml as installed, next to it
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'debian', 'bullseye',
+                                'src', 'modules', 'platform', 'files'))
+
+# pylint: disable=wrong-import-position
+import debian.bullseye.src.bin.parse_sriov as parse_sriov  # noqa: E402
+from tests.sriov_sysfs_simulator import SriovSysfsSimulator  # noqa: E402
+from tests.sriov_sysfs_simulator import sriov_config  # noqa: E402
+
+PF_COUNTS = (1, 8, 32)
+VFS_PER_PF = 64
+
+# Simulated kernel latencies in seconds, e.g.:
+#   SRIOV_BENCH_NUMVFS_LATENCY=0.5 SRIOV_BENCH_BIND_LATENCY=0.2 \
+#       python -m unittest tests.test_parse_sriov_benchmark
+NUMVFS_LATENCY = float(os.environ.get('SRIOV_BENCH_NUMVFS_LATENCY', '0'))
+BIND_LATENCY = float(os.environ.get('SRIOV_BENCH_BIND_LATENCY', '0'))
+# Set to print the measures of each phase
+REPORT = bool(os.environ.get('SRIOV_BENCH_REPORT'))
+
+
+def expected_vfs_spawns(num_pfs, num_vfs):
+    """
+    Subprocess spawns of the VF phase for sriov_config(num_pfs, num_vfs):
+    modprobe iavf, modprobe + 2 parameter writes for vfio-pci, one
+    dpdk-devbind per 15 VFs of a driver, one 'ip link' per rate limited
+    VF and one ethtool per VF with channels.
+    """
+    iavf = num_pfs * num_vfs // 2
+    vfio = num_pfs * num_vfs // 4
+    devbind = -(-iavf // 15) + -(-vfio // 15)
+    rates = num_pfs * num_vfs // 2
+    channels = num_pfs * num_vfs // 8
+    return 1 + 3 + devbind + rates + channels
+
+
+class TestSriovBenchmark(unittest.TestCase):
+    """
+    End-to-end cost of the SR-IOV hot path against a simulated sysfs.
+
+    The spawn counts are exact and the sysfs operations are bounded per
+    VF, so a change that adds a fork or a sysfs walk per VF fails here.
+    With SRIOV_BENCH_REPORT set, the measures are printed at the end.
+    """
+
+    report = []
+
+    @classmethod
+    def tearDownClass(cls):
+        if not REPORT:
+            return
+        print(f"\n{'phase':<8} {'PFs':>4} {'VFs':>6} {'spawns':>7} "
+              f"{'sysfs ops':>10} {'wall (s)':>9}")
+        for row in cls.report:
+            print(f"{row[0]:<8} {row[1]:>4} {row[2]:>6} {row[3]:>7} "
+                  f"{row[4]:>10} {row[5]:>9.3f}")
+
+    def _run_phase(self, sim, phase, num_pfs, func, *args):
+        sim.reset_counters()
+        start = time.monotonic()
+        result = func(*args)
+        elapsed = time.monotonic() - start
+        self.report.append((phase, num_pfs, num_pfs * VFS_PER_PF,
+                            sim.spawns, sim.sysfs_ops, elapsed))
+        return result
+
+    def test_enable_and_configure_vfs(self):
+        for num_pfs in PF_COUNTS:
+            configs = sriov_config(num_pfs, VFS_PER_PF)
+            data = {parse_sriov.SRIOV_CONFIG_KEY: configs}
+            num_vfs = num_pfs * VFS_PER_PF
+
+            with self.subTest(num_pfs=num_pfs), \
+                 SriovSysfsSimulator(parse_sriov, num_pfs,
+                                     numvfs_latency=NUMVFS_LATENCY,
+                                     bind_latency=BIND_LATENCY) as sim:
+                ok = self._run_phase(sim, 'enable', num_pfs,
+                                     parse_sriov.enable_sriov_from_configs,
+                                     configs)
+                self.assertTrue(ok, sim.output.getvalue())
+                self.assertEqual(sim.spawns, 0)
+                self.assertLessEqual(sim.sysfs_ops, 4 * num_pfs)
+
+                ok, _ = self._run_phase(sim, 'vfs', num_pfs,
+                                        parse_sriov.parse_and_process_sriov_config,
+                                        data)
+                self.assertTrue(ok, sim.output.getvalue())
+                self.assertEqual(sim.spawns,
+                                 expected_vfs_spawns(num_pfs, VFS_PER_PF))
+                self.assertLessEqual(sim.sysfs_ops, 6 * num_vfs + 16 * num_pfs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,300 @@
+#
+# Copyright (c) 2026 Wind River Systems, Inc.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import debian.bullseye.src.bin.reconcile_oidc_role_bindings as rorb
+
+
+class Resource(object):
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def __repr__(self):
+        return f"<{self.name}>"
+
+
+class FakeKeystone(object):
+    """In-memory Keystone, counting the requests made to it."""
+
+    def __init__(self, projects=('admin',), roles=('admin', 'member', 'reader')):
+        self.requests = []
+        self._next_id = 0
+        self.default = self._resource(name='Default')
+        self.project_list = [self._resource(name=name, domain_id=self.default.id)
+                             for name in projects]
+        self.role_list = [self._resource(name=name) for name in roles]
+        self.group_list = []
+        # (group id, role id, project id)
+        self.assignment_set = set()
+
+        self.domains = Resource(list=self._request(lambda: [self.default]))
+        self.roles = Resource(list=self._request(lambda: list(self.role_list)),
+                              grant=self._request(self._grant),
+                              revoke=self._request(self._revoke))
+        self.projects = Resource(list=self._request(
+            lambda domain: [p for p in self.project_list if p.domain_id == domain.id]))
+        self.groups = Resource(list=self._request(self._list_groups),
+                               create=self._request(self._create_group),
+                               delete=self._request(self._delete_group))
+        self.role_assignments = Resource(list=self._request(self._list_assignments))
+
+    def _resource(self, **kwargs):
+        self._next_id += 1
+        return Resource(id=f"id{self._next_id}", **kwargs)
+
+    def _request(self, func):
+        def request(*args, **kwargs):
+            self.requests.append(func)
+            return func(*args, **kwargs)
+        return request
+
+    def _list_groups(self, domain, name=None):
+        return [g for g in self.group_list
+                if g.domain_id == domain.id and name in (None, g.name)]
+
+    def _create_group(self, name, domain):
+        group = self._resource(name=name, domain_id=domain.id)
+        self.group_list.append(group)
+        return group
+
+    def _delete_group(self, group):
+        self.group_list.remove(group)
+        self.assignment_set = {a for a in self.assignment_set if a[0] != group.id}
+
+    @staticmethod
+    def _assignment(role, group, project):
+        # like keystoneclient, resources or their ids
+        return tuple(getattr(r, 'id', r) for r in (group, role, project))
+
+    def _grant(self, role, group, project):
+        self.assignment_set.add(self._assignment(role, group, project))
+
+    def _revoke(self, role, group, project):
+        self.assignment_set.remove(self._assignment(role, group, project))
+
+    def _list_assignments(self, group):
+        # Keystone filters the role assignments by a single group
+        return [Resource(name='assignment', group={'id': g}, role={'id': r},
+                         scope={'project': {'id': p}})
+                for g, r, p in self.assignment_set if g == getattr(group, 'id', group)]
+
+    def bindings(self):
+        """The current group role assignments, by names."""
+        names = {r.id: r.name for r in self.group_list + self.role_list + self.project_list}
+        return {(names[g], names[r], names[p]) for g, r, p in self.assignment_set}
+
+
+class TestReconcileOidcRoleBindings(unittest.TestCase):
+
+    def setUp(self):
+        self.keystone = FakeKeystone(projects=('admin', 'services'))
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.applied_file = os.path.join(tmp_dir.name, '.rolebindings.applied')
+        self.digest_file = os.path.join(tmp_dir.name, '.rolebindings.digest')
+        for target, value in (('APPLIED_FILE', self.applied_file),
+                              ('DIGEST_FILE', self.digest_file),
+                              ('create_keystone_client', lambda: self.keystone)):
+            patcher = patch.object(rorb, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_parse_desired_bindings(self):
+        entries = rorb.parse_desired_bindings('alice:reader;%ops:Default,services,admin')
+        self.assertEqual(entries, [
+            {'type': 'user', 'name': 'alice', 'group_name': 'user_alice',
+             'domain': 'Default', 'project': 'admin', 'role': 'reader'},
+            {'type': 'group', 'name': 'ops', 'group_name': 'ops',
+             'domain': 'Default', 'project': 'services', 'role': 'admin'}])
+
+    def test_reconcile(self):
+        rorb.reconcile('alice:reader;alice:member;%ops:services,admin')
+        self.assertEqual(self.keystone.bindings(), {
+            ('user_alice', 'reader', 'admin'),
+            ('user_alice', 'member', 'admin'),
+            ('ops', 'admin', 'services')})
+
+        rorb.reconcile('alice:reader')
+        self.assertEqual(self.keystone.bindings(), {('user_alice', 'reader', 'admin')})
+        self.assertEqual([g.name for g in self.keystone.group_list], ['user_alice'])
+
+        rorb.reconcile('')
+        self.assertEqual(self.keystone.bindings(), set())
+        self.assertEqual(self.keystone.group_list, [])
+
+    def test_reconcile_requests(self):
+        bindings = ';'.join(f'user{i}:reader' for i in range(100))
+        rorb.reconcile(bindings)
+        # bulk fetch (no group yet) + one group creation and one grant per
+        # binding
+        self.assertEqual(len(self.keystone.requests), 4 + 2 * 100)
+
+        # nothing changed, the digest check lists the assignments of the
+        # recorded groups
+        self.keystone.requests = []
+        rorb.reconcile(bindings)
+        self.assertEqual(self.keystone.requests, [self.keystone._list_assignments] * 100)
+
+        self.keystone.requests = []
+        rorb.reconcile(bindings, mode='applied')
+        self.assertEqual(len(self.keystone.requests), 4 + 100)
+
+    def test_reconcile_drift(self):
+        rorb.reconcile('alice:reader;%ops:services,admin')
+        group_ids = {g.name: g.id for g in self.keystone.group_list}
+        role_ids = {r.name: r.id for r in self.keystone.role_list}
+        project_ids = {p.name: p.id for p in self.keystone.project_list}
+
+        # changes made outside of the bindings, e.g. a restore
+        self.keystone.assignment_set.discard(
+            (group_ids['user_alice'], role_ids['reader'], project_ids['admin']))
+        self.keystone.assignment_set.add(
+            (group_ids['user_alice'], role_ids['admin'], project_ids['admin']))
+        self.keystone.assignment_set.add(
+            (group_ids['ops'], role_ids['member'], project_ids['services']))
+        # not managed: a project the bindings don't give to a %group
+        self.keystone.assignment_set.add(
+            (group_ids['ops'], role_ids['reader'], project_ids['admin']))
+        # not managed: a user_ group this tool did not record
+        bob = self.keystone._create_group('user_bob', self.keystone.default)
+        self.keystone.assignment_set.add((bob.id, role_ids['admin'], project_ids['admin']))
+
+        self.keystone.requests = []
+        rorb.reconcile('alice:reader;%ops:services,admin')
+        self.assertEqual(self.keystone.bindings(), {
+            ('user_alice', 'reader', 'admin'),
+            ('ops', 'admin', 'services'),
+            ('ops', 'reader', 'admin'),
+            ('user_bob', 'admin', 'admin')})
+        self.assertEqual(sorted(g.name for g in self.keystone.group_list),
+                         ['ops', 'user_alice', 'user_bob'])
+        # digest check + bulk fetch of the 2 recorded groups + grant,
+        # 2 revokes
+        self.assertEqual(len(self.keystone.requests), 2 + (4 + 2) + 3)
+
+        # the drift was not seen from the previously applied bindings
+        self.keystone.assignment_set.add(
+            (group_ids['user_alice'], role_ids['admin'], project_ids['admin']))
+        rorb.reconcile('alice:reader;%ops:services,admin', mode='applied')
+        self.assertIn(('user_alice', 'admin', 'admin'), self.keystone.bindings())
+
+    def test_reconcile_recorded_groups(self):
+        rorb.reconcile('alice:reader;bob:reader')
+        # the bindings were lost, the groups of the digest are still deleted
+        os.remove(self.applied_file)
+        rorb.reconcile('alice:reader')
+        self.assertEqual([g.name for g in self.keystone.group_list], ['user_alice'])
+
+        # the groups of the applied bindings are deleted without a digest
+        rorb.reconcile('alice:reader;carol:reader')
+        os.remove(self.digest_file)
+        rorb.reconcile('alice:reader')
+        self.assertEqual([g.name for g in self.keystone.group_list], ['user_alice'])
+
+    def test_reconcile_group_domains(self):
+        other = self.keystone._resource(name='Other')
+        self.keystone.domains.list = self.keystone._request(
+            lambda: [self.keystone.default, other])
+        self.keystone.project_list.append(self.keystone._resource(name='proj',
+                                                                  domain_id=other.id))
+        # not managed: a group with the name of a %group of another domain
+        ops = self.keystone._create_group('ops', self.keystone.default)
+        role_ids = {r.name: r.id for r in self.keystone.role_list}
+        project_ids = {p.name: p.id for p in self.keystone.project_list}
+        self.keystone.assignment_set.add((ops.id, role_ids['member'], project_ids['admin']))
+
+        for _ in range(2):
+            rorb.reconcile('alice:reader;%ops:Other,proj,member')
+            self.assertEqual(self.keystone.bindings(), {
+                ('user_alice', 'reader', 'admin'),
+                ('ops', 'member', 'admin'),
+                ('ops', 'member', 'proj')})
+            self.assertEqual({(g.name, g.domain_id) for g in self.keystone.group_list},
+                             {('ops', other.id), ('ops', self.keystone.default.id),
+                              ('user_alice', self.keystone.default.id)})
+
+        rorb.reconcile('alice:reader')
+        self.assertEqual(self.keystone.bindings(), {
+            ('user_alice', 'reader', 'admin'),
+            ('ops', 'member', 'admin')})
+        self.assertIn(ops, self.keystone.group_list)
+
+    def test_groups_created_before_grants(self):
+        rorb.reconcile(';'.join(f'user{i}:reader;user{i}:member' for i in range(20)))
+        requests = self.keystone.requests
+        creates = [i for i, r in enumerate(requests) if r == self.keystone._create_group]
+        grants = [i for i, r in enumerate(requests) if r == self.keystone._grant]
+        self.assertEqual((len(creates), len(grants)), (20, 40))
+        self.assertLess(max(creates), min(grants))
+
+    def test_run_operation_retries(self):
+        def operation(*outcomes):
+            outcomes = list(outcomes)
+
+            def func():
+                outcome = outcomes.pop(0)
+                if isinstance(outcome, Exception):
+                    raise outcome
+                return outcome
+            return rorb.Operation('operation', func, ())
+
+        busy = rorb.ks_exceptions.ServiceUnavailable('busy')
+        forbidden = rorb.ks_exceptions.ClientException('forbidden')
+        with patch.object(rorb.time, 'sleep') as sleep:
+            result = rorb.run_operation(operation(busy, busy, True))
+            self.assertEqual((result.value, result.error), (True, None))
+            self.assertEqual(sleep.call_count, 2)
+
+            # transient errors are retried up to OPERATION_TRIES times
+            result = rorb.run_operation(operation(*[busy] * rorb.OPERATION_TRIES))
+            self.assertIs(result.error, busy)
+            self.assertEqual(sleep.call_count, 2 + rorb.OPERATION_TRIES - 1)
+
+            # other errors are not retried
+            result = rorb.run_operation(operation(forbidden))
+            self.assertIs(result.error, forbidden)
+            self.assertEqual(sleep.call_count, 2 + rorb.OPERATION_TRIES - 1)
+
+            # unexpected errors only fail their operation
+            unexpected = KeyError('id')
+            result = rorb.run_operation(operation(unexpected))
+            self.assertIs(result.error, unexpected)
+            self.assertEqual(sleep.call_count, 2 + rorb.OPERATION_TRIES - 1)
+
+    def test_create_group_conflict(self):
+        index = rorb.KeystoneIndex(self.keystone, [])
+        conflict = rorb.ks_exceptions.Conflict('exists')
+
+        # created by a lost try: the existing group is used
+        group = self.keystone._create_group('user_alice', self.keystone.default)
+        with patch.object(self.keystone.groups, 'create', side_effect=conflict):
+            self.assertIs(rorb.create_group(index, 'user_alice'), group)
+
+            # a conflict with a group that can't be found fails the operation
+            result = rorb.run_operation(rorb.Operation(
+                'create', rorb.create_group, (index, 'user_bob')))
+        self.assertIsInstance(result.error, rorb.ReconcileError)
+
+    def test_failed_operation(self):
+        def grant(role, group, project):
+            if group.name == 'user_bob':
+                raise rorb.ks_exceptions.ClientException('forbidden')
+            self.keystone._grant(role, group, project)
+
+        self.keystone.roles.grant = grant
+        self.assertRaises(rorb.ReconcileError, rorb.reconcile, 'alice:reader;bob:reader')
+        # the other operations are done, the bindings are not recorded
+        self.assertEqual(self.keystone.bindings(), {('user_alice', 'reader', 'admin')})
+        self.assertFalse(os.path.exists(self.applied_file))
+
+
+if __name__ == '__main__':
+    unittest.main()